@@ -24,35 +24,88 @@ def trailing_zeros(a: int):
     return i
 
 
+# ext_gcd takes Lehmer steps while the smaller number has this many bits
+LEHMER_MIN_BITS = 4096
+# bits of the leading parts a Lehmer step runs Euclid on
+_LEHMER_DIGITS = 128
+# from this many bits of modulus on, inverse is faster by ext_gcd than pow
+INVERSE_LEHMER_BITS = 6144
+
+try:
+    pow(2, -1, 3)
+    _pow_inverse = True
+except ValueError:
+    # before Python 3.8
+    _pow_inverse = False
+
+
 def ext_gcd(a: int, b: int):
     """Extended Euclid Algorithm.
 
-    Returns (d, x, y), where d = gcd(a, b) = a*x + b*y.
+    Returns (d, x, y), where d = gcd(a, b) = a*x + b*y, d >= 0.
+    While the numbers are long, Lehmer's method takes the quotients of many
+    steps at once from their leading bits, and applies them with a few
+    multiplications. Only the cofactor x is kept, y is solved at the end.
     """
-    # maintain matrix x, y; z, w
-    if a > b:
-        x = 1
-        y = 0
-        z = 0
-        w = 1
-    else:
-        x = 0
-        y = 1
-        z = 1
-        w = 0
-        a, b = b, a
-
-    if b < 0:
-        q, r = divmod(a, b)
-        x = x - q * z
-        y = y - q * w
-        a = r
+    if a < 0 or b < 0:
+        d, x, y = ext_gcd(abs(a), abs(b))
+        return d, -x if a < 0 else x, -y if b < 0 else y
+    if a < b:
+        d, y, x = ext_gcd(b, a)
+        return d, x, y
+    a0, b0 = a, b
+    # a = ua*a0 + (...)*b0, b = ub*a0 + (...)*b0
+    ua, ub = 1, 0
+    while b.bit_length() >= LEHMER_MIN_BITS:
+        a, b, ua, ub = _lehmer_step(a, b, ua, ub)
     while b != 0:
         q, r = divmod(a, b)
-        x, z = z, x - q * z
-        y, w = w, y - q * w
         a, b = b, r
-    return (a, x, y)
+        ua, ub = ub, ua - q * ub
+    if b0 == 0:
+        return (a, ua, 0)
+    return (a, ua, (a - a0 * ua) // b0)
+
+
+def _lehmer_step(a: int, b: int, ua: int, ub: int):
+    """Euclid steps of a >= b > 0 taken from their leading bits."""
+    n = a.bit_length() - _LEHMER_DIGITS
+    x, y = a >> n, b >> n
+    # (x, y) is (A*x0 + B*y0, C*x0 + D*y0) of the leading parts x0, y0
+    A, B, C, D = 1, 0, 0, 1
+    while y != 0:
+        q, r = divmod(x, y)
+        C1, D1 = A - q * C, B - q * D
+        # the remainder of a and b is 2^n*r + C1*(a mod 2^n) + D1*(b mod 2^n),
+        # and the one before 2^n*y + ...; the signs of C1 and D1 differ, so q
+        # is their quotient too while the low bits cannot make it negative or
+        # not smaller than the one before
+        if r < abs(C1) or r < abs(D1) or y - r < abs(C1 - C) or y - r < abs(D1 - D):
+            break
+        A, B, C, D = C, D, C1, D1
+        x, y = y, r
+    if B == 0:
+        # not even the first quotient is known, divide in full
+        q, r = divmod(a, b)
+        return b, r, ub, ua - q * ub
+    return A * a + B * b, C * a + D * b, A * ua + B * ub, C * ua + D * ub
+
+
+def inverse(a: int, m: int):
+    """a^{-1} mod m, by pow where the interpreter has it and it is faster,
+    otherwise by ext_gcd. Raise ValueError if gcd(a, m) != 1."""
+    if m == 0:
+        raise ZeroDivisionError("modulus is zero")
+    if _pow_inverse and abs(m).bit_length() < INVERSE_LEHMER_BITS:
+        try:
+            return pow(a, -1, m)
+        except ValueError:
+            d = math.gcd(a, m)
+    else:
+        d, x, _ = ext_gcd(a % m, m)
+        if d == 1:
+            return x % m
+    raise ValueError("gcd({},{}) == {} is not 1, not invertible".format(a, m, d))
 
 
 def binary_gcd(a: int, b: int):
@@ -84,8 +137,8 @@ def intlen(a: int):
     return math.floor(math.log2(a)) + 1
 
 
-def fixedrandbits(k: int, require_odd=False):
-    x = random.getrandbits(k - 1)
+def fixedrandbits(k: int, require_odd=False, rng=random):
+    x = rng.getrandbits(k - 1)
     x |= 1 << (k - 1)
     if require_odd:
         x |= 1
@@ -119,3 +172,15 @@ if __name__ == "__main__":
         if not isperfectsuqare(i * i):
             raise RuntimeError(f"square {i}**2 error")
     print("perfect square test passed!")
+    for _ in range(300):
+        bits = random.choice((64, 1000, 5000, 10000))
+        a, b = random.getrandbits(bits), random.getrandbits(random.randint(1, bits))
+        g = random.getrandbits(random.choice((1, 300, 5000)))
+        for x, y in ((a * g, b * g), (-a, b), (b, -a), (a, 0), (0, b)):
+            d, s, t = ext_gcd(x, y)
+            if d != math.gcd(x, y) or x * s + y * t != d:
+                raise RuntimeError(f"ext_gcd({x}, {y}) error")
+        m = b | 1
+        if math.gcd(a, m) == 1 and inverse(a, m) * a % m != 1 % m:
+            raise RuntimeError(f"inverse({a}, {m}) error")
+    print("ext_gcd test passed!")
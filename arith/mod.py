@@ -19,14 +19,16 @@ class Mod:
     Operator +, -, *, /, //, ** are defined. / and // are equivalent.
     a/b (mod n) is defined only if a % gcd(b, n) == 0.
       And the modulus of the result is n//gcd(b,n).
+    A Mod is immutable like int, being hashable: a += b binds a new Mod.
     """
 
+    __slots__ = ("value", "modulus")
+
     def __init__(self, value: int, modulus: int):
         if modulus == 0:
             raise ZeroDivisionError("modulus is zero")
         self.value = value % modulus
         self.modulus = modulus
-        pass
 
     def __repr__(self):
         return "{} (mod {})".format(self.value, self.modulus)
@@ -41,7 +43,9 @@ class Mod:
 
     def _convert(self, other):
         """Convert other to int with type checking"""
-        if isinstance(other, Mod):
+        if type(other) is int:
+            return other
+        elif isinstance(other, Mod):
             if self.modulus == 0 or other.modulus == 0:
                 raise ZeroDivisionError("modulus is zero")
             elif self.modulus == other.modulus:
@@ -72,51 +76,54 @@ class Mod:
         return hash((self.value, self.modulus))
 
     def __bool__(self):
-        return bool(value)
+        return self.value != 0
 
     def __pos__(self):
-        return Mod(self.value, self.modulus)
+        return _new(self.value, self.modulus)
 
     def __neg__(self):
-        return Mod(-self.value, self.modulus)
+        return _new(-self.value % self.modulus, self.modulus)
 
     def __add__(self, other):
         converted = self._convert(other)
         if converted is NotImplemented:
             return NotImplemented
         else:
-            return Mod(self.value + converted, self.modulus)
+            return _new((self.value + converted) % self.modulus, self.modulus)
 
     __radd__ = __add__
 
     def __sub__(self, other):
-        return self + (-other)
+        converted = self._convert(other)
+        if converted is NotImplemented:
+            return NotImplemented
+        else:
+            return _new((self.value - converted) % self.modulus, self.modulus)
 
     def __rsub__(self, other):
-        return (-self) + other
+        converted = self._convert(other)
+        if converted is NotImplemented:
+            return NotImplemented
+        else:
+            return _new((converted - self.value) % self.modulus, self.modulus)
 
     def __mul__(self, other):
         converted = self._convert(other)
         if converted is NotImplemented:
             return NotImplemented
         else:
-            return Mod(self.value * converted, self.modulus)
+            return _new(self.value * converted % self.modulus, self.modulus)
 
     __rmul__ = __mul__
 
+    def square(self):
+        return _new(self.value * self.value % self.modulus, self.modulus)
+
     def invertible(self):
         return math.gcd(self.value, self.modulus) == 1
 
     def inv(self):
-        d, x, _ = basic.ext_gcd(self.value, self.modulus)
-        if d != 1:
-            raise ValueError(
-                "gcd({},{}) == {} is not 1, not invertible".format(
-                    self.value, self.modulus, d
-                )
-            )
-        else:
-            return Mod(x, self.modulus)
+        return _new(basic.inverse(self.value, self.modulus), self.modulus)
 
     def __truediv__(self, other):
         """Return t: Mod such that self == int(other)*t. Note that the modulus of t may differ."""
@@ -151,7 +158,7 @@ class Mod:
     __rfloordiv__ = __rtruediv__
 
     def __pow__(self, other: int):
-        return Mod(pow(self.value, other, self.modulus), self.modulus)
+        return _new(pow(self.value, other, self.modulus), self.modulus)
 
     def jacobi(self):
         """Calculate jacobi(value / modulus), return -1, 0, or 1.
@@ -188,9 +195,9 @@ class Mod:
     def half(self):
         if self.modulus & 1 == 1:
             if self.value & 1 == 1:
-                return Mod((self.value + self.modulus) >> 1, self.modulus)
+                return _new((self.value + self.modulus) >> 1, self.modulus)
             else:
-                return Mod(self.value >> 1, self.modulus)
+                return _new(self.value >> 1, self.modulus)
         else:
             if self.value & 1 == 1:
                 raise ValueError(
@@ -200,6 +207,189 @@ class Mod:
                 return Mod(self.value >> 1, self.modulus >> 1)
 
 
+def _new(value, modulus, _alloc=object.__new__):
+    """Mod of a value already in [0, modulus), without the checks of Mod()."""
+    m = _alloc(Mod)
+    m.value = value
+    m.modulus = modulus
+    return m
+
+
+# from this many bits of modulus on, a Barrett reduction beats the % of CPython
+BARRETT_MIN_BITS = 4096
+# bits beyond modulus^2 a Barrett reduction still takes, for small multiples
+_BARRETT_SLACK = 16
+
+
+class ModContext:
+    """Arithmetic under one fixed modulus, for long chains of operations.
+
+    The methods work on ints in [0, modulus) and return them, so a chain
+    costs one multiplication and one reduction per product and nothing
+    else. Calling the context makes ModElem elements sharing it, with the
+    operators of Mod. For moduli of BARRETT_MIN_BITS bits and more, products
+    are reduced the Barrett way with a constant precomputed here.
+    """
+
+    __slots__ = ("modulus", "_k", "_mu", "_limit")
+
+    def __init__(self, modulus: int, barrett=None):
+        if modulus <= 0:
+            raise ValueError("modulus must be positive")
+        k = modulus.bit_length()
+        if barrett is None:
+            barrett = k >= BARRETT_MIN_BITS
+        self.modulus = modulus
+        self._k = k
+        self._limit = 2 * k + _BARRETT_SLACK
+        self._mu = (1 << self._limit) // modulus if barrett else None
+
+    def __repr__(self):
+        return "ModContext({})".format(self.modulus)
+
+    def __call__(self, value: int):
+        return ModElem(value % self.modulus, self)
+
+    def reduce(self, x: int):
+        """x mod modulus, for any x; cheapest for 0 <= x < modulus^2."""
+        n = self.modulus
+        mu = self._mu
+        if mu is None or x.bit_length() > self._limit:
+            return x % n
+        if x < 0:
+            r = self.reduce(-x)
+            return n - r if r else 0
+        k = self._k
+        r = x - (((x >> (k - 1)) * mu) >> (k + 1 + _BARRETT_SLACK)) * n
+        while r >= n:
+            r -= n
+        return r
+
+    def mul(self, a: int, b: int):
+        return self.reduce(a * b)
+
+    def square(self, a: int):
+        return self.reduce(a * a)
+
+    def add(self, a: int, b: int):
+        r = a + b
+        return r - self.modulus if r >= self.modulus else r
+
+    def sub(self, a: int, b: int):
+        r = a - b
+        return r + self.modulus if r < 0 else r
+
+    def half(self, a: int):
+        """a / 2, for an odd modulus."""
+        return (a + self.modulus) >> 1 if a & 1 else a >> 1
+
+    def pow(self, a: int, e: int):
+        return pow(a, e, self.modulus)
+
+    def inv(self, a: int):
+        return basic.inverse(a, self.modulus)
+
+    def crt(self, a: int, other, b: int, inv: int = None):
+        """The value mod self.modulus * other.modulus that is a mod
+        self.modulus and b mod other.modulus, other a ModContext.
+        inv is self.modulus^{-1} mod other.modulus, if precomputed."""
+        if inv is None:
+            inv = other.inv(self.modulus % other.modulus)
+        return a + self.modulus * other.reduce((b - a) * inv)
+
+
+class ModElem:
+    """Element of a ModContext, value in [0, modulus) with the context.
+
+    Operators are those of Mod, but the modulus is not copied into every
+    result and an int operand is reduced with the result, not first.
+    """
+
+    __slots__ = ("value", "ctx")
+
+    def __init__(self, value: int, ctx: ModContext):
+        # value is already reduced, see ModContext.__call__
+        self.value = value
+        self.ctx = ctx
+
+    @property
+    def modulus(self):
+        return self.ctx.modulus
+
+    def __repr__(self):
+        return "{} (mod {})".format(self.value, self.ctx.modulus)
+
+    __str__ = __repr__
+
+    def __int__(self):
+        return self.value
+
+    def _operand(self, other):
+        if type(other) is ModElem:
+            if other.ctx is not self.ctx and other.ctx.modulus != self.ctx.modulus:
+                raise ValueError("not the same modulus")
+            return other.value
+        elif isinstance(other, int):
+            return other
+        else:
+            return NotImplemented
+
+    def __eq__(self, other):
+        x = self._operand(other)
+        if x is NotImplemented:
+            return NotImplemented
+        return self.value == x % self.ctx.modulus
+
+    def __hash__(self):
+        return hash((self.value, self.ctx.modulus))
+
+    def __bool__(self):
+        return self.value != 0
+
+    def __neg__(self):
+        return ModElem(self.ctx.sub(0, self.value), self.ctx)
+
+    def __add__(self, other):
+        x = self._operand(other)
+        if x is NotImplemented:
+            return NotImplemented
+        return ModElem(self.ctx.reduce(self.value + x), self.ctx)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        x = self._operand(other)
+        if x is NotImplemented:
+            return NotImplemented
+        return ModElem(self.ctx.reduce(self.value - x), self.ctx)
+
+    def __rsub__(self, other):
+        x = self._operand(other)
+        if x is NotImplemented:
+            return NotImplemented
+        return ModElem(self.ctx.reduce(x - self.value), self.ctx)
+
+    def __mul__(self, other):
+        x = self._operand(other)
+        if x is NotImplemented:
+            return NotImplemented
+        return ModElem(self.ctx.reduce(self.value * x), self.ctx)
+
+    __rmul__ = __mul__
+
+    def __pow__(self, other: int):
+        return ModElem(pow(self.value, other, self.ctx.modulus), self.ctx)
+
+    def square(self):
+        return ModElem(self.ctx.square(self.value), self.ctx)
+
+    def half(self):
+        return ModElem(self.ctx.half(self.value), self.ctx)
+
+    def inv(self):
+        return ModElem(self.ctx.inv(self.value), self.ctx)
+
+
 def crt(m1: Mod, m2: Mod, n1inv: int = None):
     """Use CRT to get the same value in new modulus n1*n2.
     Precomputed ninv could be provided as m1.modulus^{-1} mod m2.modulus.
@@ -220,4 +410,7 @@ if __name__ == "__main__":
     a = a / 3
     print(a)
     print(f"jacobi(5, 3439601197)={Mod(5, 3439601197).jacobi()}")
+    ring = ModContext((1 << 4253) - 1)
+    x = ring(3) ** 1000 - 5
+    print(f"Barrett reduction: {x.square().value == x.value**2 % ring.modulus}")
     print("Tests passed!")
@@ -0,0 +1,196 @@
+"""Modular exponentiation faster than pow for special cases: fixed base,
+and products of several powers."""
+
+# defaults of FixedBase, a table of 4 * 63 residues
+COMB_WIDTH = 6
+COMB_TABLES = 4
+
+
+class FixedBase:
+    """base^e mod modulus for many e of at most bits bits, by the comb method
+    of Lim and Lee with precomputed tables.
+
+    The exponent is cut into width rows of a bits, and the columns of those
+    rows into tables blocks of b bits; table j holds the products of
+    base^(2^(i*a + j*b)) over every subset of rows i. An exponentiation then
+    takes b - 1 squarings and at most a multiplications, where pow takes
+    about bits squarings.
+
+    width -- teeth of the comb, each table has 2^width - 1 entries
+    tables -- number of tables; more of them take fewer squarings
+    Memory is tables * (2^width - 1) residues. width=6, tables=4 suit 256-bit
+    exponents; larger values are faster and take more memory and setup.
+    """
+
+    __slots__ = ("base", "modulus", "bits", "width", "tables", "_a", "_b", "_table")
+
+    def __init__(
+        self, base: int, modulus: int, bits: int, width=COMB_WIDTH, tables=COMB_TABLES
+    ):
+        if modulus <= 1:
+            raise ValueError("modulus must be greater than 1")
+        if bits <= 0 or width <= 0 or tables <= 0:
+            raise ValueError("bits, width and tables must be positive")
+        self.base = base % modulus
+        self.modulus = modulus
+        self.bits = bits
+        self.width = width
+        self.tables = tables
+        a = -(-bits // width)
+        b = -(-a // tables)
+        self._a = a
+        self._b = b
+        # the rows: base^(2^(i*a)) for i in range(width)
+        rows = [self.base]
+        for i in range(1, width):
+            rows.append(pow(rows[-1], 1 << a, modulus))
+        # table[0][u] is the product of rows[i] over bits i of u; table[0][0]
+        # is unused, kept so that u indexes it directly
+        first = [1] * (1 << width)
+        for i in range(width):
+            step = 1 << i
+            r = rows[i]
+            for u in range(step, step << 1):
+                first[u] = first[u - step] * r % modulus
+        self._table = [first]
+        for j in range(1, tables):
+            e = 1 << b
+            self._table.append([pow(x, e, modulus) for x in self._table[-1]])
+
+    def __repr__(self):
+        return "FixedBase({}, {}, {}, width={}, tables={})".format(
+            self.base, self.modulus, self.bits, self.width, self.tables
+        )
+
+    def pow(self, e: int):
+        """base^e mod modulus; exponents out of [0, 2^bits) go to pow."""
+        if e < 0 or e.bit_length() > self.bits:
+            return pow(self.base, e, self.modulus)
+        n = self.modulus
+        r = 1
+        for k, factors in enumerate(reversed(self._columns(e))):
+            if k:
+                r = r * r % n
+            for x in factors:
+                r = r * x % n
+        return r
+
+    __call__ = pow
+
+    def _columns(self, e: int):
+        """Table entries to multiply in for e, by column: the list at index k
+        is taken k squarings before the end. e is in [0, 2^bits)."""
+        a, b, w = self._a, self._b, self.width
+        # the rows of e, cut out once; bit k of u for column col is bit col
+        # of row k
+        rows = [(e >> (i * a)) & ((1 << a) - 1) for i in range(w)]
+        columns = []
+        for k in range(b):
+            factors = []
+            for j in range(self.tables):
+                col = j * b + k
+                if col >= a:
+                    break
+                u = 0
+                for i in range(w - 1, -1, -1):
+                    u = (u << 1) | ((rows[i] >> col) & 1)
+                if u:
+                    factors.append(self._table[j][u])
+            columns.append(factors)
+        return columns
+
+
+def _window_width(bits):
+    # sliding window of about bits / (width + 1) multiplications
+    for width, limit in ((1, 8), (2, 24), (3, 80), (4, 240), (5, 672)):
+        if bits <= limit:
+            return width
+    return 6
+
+
+def _windows(e, width):
+    """Sliding windows of e > 0, as (position of lowest bit, odd digit)."""
+    windows = []
+    pos = 0
+    while e:
+        if e & 1:
+            digit = e & ((1 << width) - 1)
+            windows.append((pos, digit))
+            e >>= width
+            pos += width
+        else:
+            # skip the zeros down to the next window
+            z = (e & -e).bit_length() - 1
+            e >>= z
+            pos += z
+    return windows
+
+
+def multi_pow(modulus: int, pairs):
+    """Product of base^e mod modulus over (base, e) in pairs, with one chain
+    of squarings shared by all of them (Straus's method, interleaved sliding
+    windows).
+
+    A base may be a FixedBase of the same modulus; its comb columns are then
+    multiplied in during the last squarings of the chain and cost no
+    squarings of their own. A single base that is not, if any, goes to pow,
+    whose chain in C is no longer than the shared one. Exponents must be
+    non-negative.
+    """
+    n = modulus
+    # squarings left in the chain -> factors to multiply in there
+    steps = {}
+    length = 0
+    variable = []
+    for base, e in pairs:
+        if e < 0:
+            raise ValueError("exponents must be non-negative")
+        if isinstance(base, FixedBase):
+            if base.modulus != n:
+                raise ValueError("not the same modulus")
+            if e.bit_length() <= base.bits:
+                for k, factors in enumerate(base._columns(e)):
+                    if factors:
+                        steps.setdefault(k, []).extend(factors)
+                        length = max(length, k + 1)
+                continue
+            base = base.base
+        if e:
+            variable.append((base % n, e))
+    tail = 1
+    if len(variable) == 1:
+        tail = pow(variable[0][0], variable[0][1], n)
+        variable = []
+    for base, e in variable:
+        width = _window_width(e.bit_length())
+        # odd powers base, base^3, ..., base^(2^width - 1)
+        table = [base]
+        if width > 1:
+            b2 = base * base % n
+            for _ in range((1 << (width - 1)) - 1):
+                table.append(table[-1] * b2 % n)
+        for pos, digit in _windows(e, width):
+            steps.setdefault(pos, []).append(table[digit >> 1])
+        length = max(length, e.bit_length())
+    r = 1
+    for k in range(length - 1, -1, -1):
+        if r != 1:
+            r = r * r % n
+        for x in steps.get(k, ()):
+            r = r * x % n
+    return r * tail % n
+
+if __name__ == "__main__":
+    import random
+
+    p = (1 << 521) - 1
+    for width, tables in ((1, 1), (4, 1), (3, 5), (6, 4), (8, 8)):
+        fb = FixedBase(3, p, 256, width, tables)
+        for e in (0, 1, 2, (1 << 256) - 1, random.getrandbits(256), 1 << 300):
+            assert fb.pow(e) == pow(3, e, p), (width, tables, e)
+            f = random.getrandbits(random.choice((1, 100, 256, 700)))
+            want = pow(3, e, p) * pow(7, f, p) % p
+            assert multi_pow(p, [(fb, e), (7, f)]) == want, (width, tables, e, f)
+            assert multi_pow(p, [(3, e), (7, f)]) == want, (e, f)
+            assert multi_pow(p, [(fb, e), (fb, f)]) == pow(3, e + f, p), (e, f)
+    print("Tests passed!")
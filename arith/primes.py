@@ -2,11 +2,10 @@
 
 import sys
 import os
-import random
 import math
 
 sys.path.append(os.path.dirname(sys.path[0])) # parent directory
-import common
+import drbg
 
 if "." not in __name__:
     import basic
@@ -32,10 +31,11 @@ def prime_sieve(n: int):
     return primes
 
 
-def isprime(n: int):
-    """Check for primality less than 2^32. Else redirect to Miller-Rabin."""
+def isprime(n: int, rng=None):
+    """Check for primality less than 2^32. Else redirect to Miller-Rabin,
+    with witnesses from rng if given, see miller_rabin_quick."""
     if n >= (1 << 32):
-        return miller_rabin_quick(n)
+        return miller_rabin_quick(n, rng=rng)
     elif n < 65536:
         l = -1
         r = len(prime_list16)
@@ -57,7 +57,9 @@ def isprime(n: int):
         return True
 
 
-def miller_rabin(w: int, iters=10):
+def miller_rabin(w: int, iters=10, rng=None):
+    if rng is None:
+        rng = drbg.get_rng()
     if w < 0:
         w = -w
     elif w < 2:
@@ -66,7 +68,7 @@ def miller_rabin(w: int, iters=10):
     a = basic.trailing_zeros(t)
     m = t >> a
     for _ in range(iters):
-        b = random.randint(2, w - 2)
+        b = rng.randint(2, w - 2)
         z = pow(b, m, w)
         if z == 1 or z == t:
             continue
@@ -81,9 +83,12 @@ def miller_rabin(w: int, iters=10):
     return True
 
 
-def miller_rabin_quick(w: int, iters=10):
+def miller_rabin_quick(w: int, iters=10, rng=None):
     """Miller-Rabin with chosen small primes as base, and do divisions first.
-    May not be fast."""
+    May not be fast.
+
+    rng -- random.Random to draw the bases from instead, for a search that
+           is reproducible from its rng alone"""
     global prime_list16
     if w < 0:
         w = -w
@@ -104,7 +109,7 @@ def miller_rabin_quick(w: int, iters=10):
     a = basic.trailing_zeros(t)
     m = t >> a
     for i in range(iters):
-        b = prime_list16[i]
+        b = prime_list16[i] if rng is None else rng.randint(2, w - 2)
         z = pow(b, m, w)
         if z == 1 or z == t:
             continue
@@ -140,41 +145,31 @@ def general_lucas_test(n: int):
         else:
             d = -d + 2
         j = mod.Mod(d, n).jacobi()
-    m = common.i2osp(n + 1)
-    # u[1] and v[1], where P=1
-    u = mod.Mod(1, n)
-    v = mod.Mod(1, n)
-    i = 0
-    mask = 0x80
-    # find the MSB
-    while mask & m[i] == 0:
-        mask >>= 1
-        if mask == 0:
-            mask = 0x80
-            i += 1
-    mask >>= 1
-    for i in range(i, len(m)):
-        while mask != 0:
-            # k -> 2k
-            u, v = u * v, (v * v + d * u * u).half()
-            # 2k -> 2k+1
-            if mask & m[i] != 0:
-                # u=(u+v)/2 is from P=1
-                u, v = (u + v).half(), (v + d * u).half()
-            mask >>= 1
-        mask = 0x80
+    # u[1] and v[1], where P=1; all of the chain is under modulus n
+    ring = mod.ModContext(n)
+    reduce, half = ring.reduce, ring.half
+    u = v = 1
+    # bits of n+1 after the MSB
+    for bit in bin(n + 1)[3:]:
+        # k -> 2k, v[2k] = (v[k]^2 + d*u[k]^2) / 2 reduced once
+        u, v = reduce(u * v), half(reduce(v * v + d * (u * u)))
+        # 2k -> 2k+1
+        if bit == "1":
+            # u=(u+v)/2 is from P=1
+            u, v = half(ring.add(u, v)), half(reduce(v + d * u))
     return u == 0
 
 
-def baillie_psw(n: int, iters=10, mriters=1):
+def baillie_psw(n: int, iters=10, mriters=1, rng=None):
     """Baillie-PSW primality test.
 
     n -- number to be tested
     iters -- iterations of trial division
-    mriters -- iterations of Miller-Rabin"""
+    mriters -- iterations of Miller-Rabin
+    rng -- as in isprime, for n too small for the test"""
     global prime_list16
     if n <= prime_list16[mriters - 1]:
-        return isprime(n)
+        return isprime(n, rng)
     for i in range(mriters, iters):
         if n < prime_list16[i]:
             return False
@@ -183,58 +178,66 @@ def baillie_psw(n: int, iters=10, mriters=1):
         elif n % prime_list16[i] == 0:
             return False
     if not miller_rabin_quick(n, 1):
-        # do a M-R on base 2
+        # do a M-R on base 2, never a random one: the test is built on it
         return False
     # Lucas pseudoprimes overlap little with Fermat pseudoprimes on base 2
     return general_lucas_test(n)
 
 
-def to_next_prime(a: int):
+def to_next_prime(a: int, rng=None):
+    """Least prime not below a; rng as in miller_rabin_quick."""
     if a <= 2:
         return 2
     a |= 1
-    while not miller_rabin_quick(a):
+    while not miller_rabin_quick(a, rng=rng):
         a += 2
     return a
 
 
-def random_prime(bitlen: int):
-    """Random prime based on miller_rabin and to_next_prime."""
+def random_prime(bitlen: int, rng=None):
+    """Random prime based on miller_rabin and to_next_prime.
+
+    rng -- random.Random to draw from, the drbg one of the thread if None"""
+    if rng is None:
+        rng = drbg.get_rng()
     if bitlen < 2:
         raise ValueError("random prime must be at least 2-bit long")
     elif bitlen == 2:
-        return random.randint(2, 3)
+        return rng.randint(2, 3)
     p = 2
     while basic.intlen(p) != bitlen:
-        p = basic.fixedrandbits(bitlen, True)
-        p = to_next_prime(p)
+        p = basic.fixedrandbits(bitlen, True, rng)
+        p = to_next_prime(p, rng)
     return p
 
 
-def st_random_prime(bitlen: int, factor=None):
+def st_random_prime(bitlen: int, factor=None, rng=None):
     """Shawe-Taylor prime construction.
 
     factor -- required factor of p-1.
-              intlen(factor) SHALL be less than (bitlen-5)/2."""
+              intlen(factor) SHALL be less than (bitlen-5)/2.
+    rng -- as in random_prime"""
+    if rng is None:
+        rng = drbg.get_rng()
     if bitlen < 2:
         raise ValueError("random prime must be at least 2-bit long")
     elif bitlen == 2:
-        return random.randint(2, 3)
+        return rng.randint(2, 3)
     elif bitlen < 33:
         # brute-force prime generation
         # prime density is about 1/log(n), i.e. 1.44/bitlen
         for i in range(bitlen << 2):
-            p = basic.fixedrandbits(bitlen, True)
-            if isprime(p):
+            p = basic.fixedrandbits(bitlen, True, rng)
+            if isprime(p, rng):
                 return p
         raise RuntimeError("didn't get a prime")
     elif factor is not None:
         if basic.intlen(factor) >= (bitlen - 5) >> 1:
             raise ValueError("required factor too large")
-        p0 = st_random_prime((bitlen + 3) >> 1)
+        p0 = st_random_prime((bitlen + 3) >> 1, rng=rng)
         # now p2 contains the factor
         p2 = (p0 + p0) * factor
-        t = basic.ceildiv(basic.fixedrandbits(bitlen, False), p2)
+        t = basic.ceildiv(basic.fixedrandbits(bitlen, False, rng), p2)
         for i in range(bitlen << 2):
             # first p>randint with p==1 mod p2
             # p0*t+1 works, but if t is odd, then it will never be prime
@@ -243,7 +246,7 @@ def st_random_prime(bitlen: int, factor=None):
                 # if t is too big, fall back to the smallest one
                 t = basic.ceildiv(1 << (bitlen - 1), p2)
                 p = p2 * t + 1
-            a = random.randint(2, p - 2)
+            a = rng.randint(2, p - 2)
             z = pow(a, (t + t) * factor, p)
             if math.gcd(z - 1, p) == 1 and pow(z, p0, p) == 1:
                 # proven prime with the help of p0
@@ -253,9 +256,9 @@ def st_random_prime(bitlen: int, factor=None):
         raise RuntimeError("didn't get a prime")
     else:
         # big prime based on smaller prime
-        p0 = st_random_prime((bitlen + 3) >> 1)
+        p0 = st_random_prime((bitlen + 3) >> 1, rng=rng)
         p2 = p0 + p0
-        t = basic.ceildiv(basic.fixedrandbits(bitlen, False), p2)
+        t = basic.ceildiv(basic.fixedrandbits(bitlen, False, rng), p2)
         for i in range(bitlen << 2):
             # first p>randint with p==1 mod p2
             # p0*t+1 works, but if t is odd, then it will never be prime
@@ -264,7 +267,7 @@ def st_random_prime(bitlen: int, factor=None):
                 # if t is too big, fall back to the smallest one
                 t = basic.ceildiv(1 << (bitlen - 1), p2)
                 p = p2 * t + 1
-            a = random.randint(2, p - 2)
+            a = rng.randint(2, p - 2)
             z = pow(a, t + t, p)
             if math.gcd(z - 1, p) == 1 and pow(z, p0, p) == 1:
                 # proven prime with the help of p0
@@ -89,6 +89,8 @@ Null = None
 class OID:
     """Object Identifier defined by ASN.1."""
 
+    __slots__ = ("identifier", "description")
+
     def __init__(self, identifier: str, description: str):
         self.identifier = identifier
         self.description = description
@@ -468,6 +470,8 @@ def wrap_context(octets, num):
 
 
 class AlgID:
+    __slots__ = ("oid", "param", "func")
+
     def __init__(self, oid, param, func):
         self.oid = oid
         self.param = param
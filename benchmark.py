@@ -0,0 +1,561 @@
+"""Benchmarks for cryptoPy.
+
+Run `python3 benchmark.py -h` for the list of benchmarks.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+import timeit
+import cryptohash
+import dsa
+import random
+from arith import basic, mod, power, primes
+
+
+def _fmt_rate(nbytes, seconds):
+    return f"{nbytes / seconds / 1e6:10.1f} MB/s"
+
+
+def bench_threads(alg="sha256", size=1 << 20, rounds=32, max_threads=None):
+    """Aggregate throughput when several threads hash large messages at once.
+
+    The C extension releases the GIL for long inputs, so the throughput should
+    scale with the number of threads up to the number of cores.
+    Return a list of (threads, seconds, MB/s).
+    """
+    func = getattr(cryptohash, alg)
+    if max_threads is None:
+        max_threads = os.cpu_count() or 1
+    message = os.urandom(size)
+    counts = []
+    n = 1
+    while n < max_threads:
+        counts.append(n)
+        n <<= 1
+    counts.append(max_threads)
+    results = []
+    for n in counts:
+        barrier = threading.Barrier(n + 1)
+
+        def worker():
+            barrier.wait()
+            for _ in range(rounds):
+                func(message)
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        total = n * rounds * size
+        results.append((n, elapsed, total / elapsed / 1e6))
+        print(
+            f"{alg} {n:3d} thread(s): {elapsed:8.3f} s {_fmt_rate(total, elapsed)}"
+        )
+    return results
+
+
+def bench_cpu(algs=("sha1", "sha256"), size=1 << 20, rounds=32):
+    """Throughput of each implementation selected by the CPU features.
+
+    Every detected feature is switched off in turn (sha, then avx2, ...), so
+    that the SHA-NI, SIMD and portable code paths are measured on one box.
+    Return a list of (features, alg, MB/s).
+    """
+    detected = cryptohash.cpu_features()
+    message = os.urandom(size)
+    enabled = dict.fromkeys(detected, True)
+    results = []
+    try:
+        for name in [None] + [n for n in ("sha", "avx2") if n in detected]:
+            if name is not None:
+                enabled[name] = False
+            cryptohash.set_cpu_features(**enabled)
+            label = ",".join(n for n, on in enabled.items() if on) or "none"
+            for alg in algs:
+                func = getattr(cryptohash, alg)
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    func(message)
+                elapsed = time.perf_counter() - start
+                results.append((label, alg, rounds * size / elapsed / 1e6))
+                rate = _fmt_rate(rounds * size, elapsed)
+                print(f"{alg:8s} [{label}]: {rate}")
+    finally:
+        cryptohash.set_cpu_features(**detected)
+    return results
+
+
+def bench_overhead(alg="sha256", sizes=(0, 32, 64), number=100000):
+    """Time per call of small messages through each entry point.
+
+    For short inputs the cost is mostly argument parsing and dispatch, so
+    the one-shot function, the ASN1_HashAlg call, a hash object and hashlib
+    are compared. Return a list of (entry point, size, ns per call).
+    """
+    func = getattr(cryptohash, alg)
+    asn1_alg = getattr(cryptohash, "alg_" + alg)
+    entries = [
+        ("cryptohash." + alg, lambda m: func(m)),
+        ("alg_" + alg, lambda m: asn1_alg(m)),
+        ("new().digest()", lambda m: cryptohash.new(alg, m).digest()),
+        ("hashlib", lambda m: hashlib.new(alg, m).digest()),
+    ]
+    results = []
+    for size in sizes:
+        message = os.urandom(size)
+        for label, call in entries:
+            seconds = min(
+                timeit.repeat(lambda: call(message), number=number, repeat=5)
+            )
+            ns = seconds / number * 1e9
+            results.append((label, size, ns))
+            print(f"{label:24s} {size:5d} B: {ns:8.0f} ns/call")
+    return results
+
+
+# name, params, hashlib reference as (name, digest length of shake) or None
+suite_algs = [
+    ("md5", (), ("md5", None)),
+    ("sha1", (), ("sha1", None)),
+    ("sha224", (), ("sha224", None)),
+    ("sha256", (), ("sha256", None)),
+    ("sha384", (), ("sha384", None)),
+    ("sha512", (), ("sha512", None)),
+    ("sha512t", (256,), ("sha512_256", None)),
+    ("sha512_224", (), ("sha512_224", None)),
+    ("sha512_256", (), ("sha512_256", None)),
+    ("sha3_224", (), ("sha3_224", None)),
+    ("sha3_256", (), ("sha3_256", None)),
+    ("sha3_384", (), ("sha3_384", None)),
+    ("sha3_512", (), ("sha3_512", None)),
+    ("shake128", (), ("shake_128", 32)),
+    ("shake256", (), ("shake_256", 64)),
+    ("shake128l", (512,), ("shake_128", 64)),
+    ("shake256l", (1024,), ("shake_256", 128)),
+    ("rawshake128l", (256,), None),
+    ("rawshake256l", (512,), None),
+    # same sponge as sha3_256
+    ("keccak_diy", (256, 256, 0x06), ("sha3_256", None)),
+    ("keccak12_diy", (256, 128, 0x07), None),
+]
+suite_sizes = [0, 64, 1 << 10, 64 << 10, 1 << 20, 64 << 20]
+suite_modes = ["oneshot", "incremental", "batch"]
+# pieces fed to update() in incremental mode
+_update_size = 64 << 10
+# messages per hash_many call in batch mode, only for short messages
+_batch_count = 64
+_batch_max_size = 64 << 10
+
+
+def _seconds_per_call(call, min_time):
+    """Best time of one call, over 3 runs of about min_time / 3 each."""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(call, number=number)
+        if elapsed >= min_time / 3:
+            break
+        number = max(number << 1, int(number * min_time / 3 / max(elapsed, 1e-6)))
+    best = min([elapsed] + timeit.repeat(call, number=number, repeat=2))
+    return best / number
+
+
+def _suite_calls(name, params, ref, mode, message):
+    """Return {impl: (call, expected digest)} for one algorithm and mode."""
+    calls = {}
+    if mode == "oneshot":
+        func = getattr(cryptohash, name)
+        calls["cryptohash"] = lambda: func(message, *params)
+    elif mode == "incremental":
+        pieces = [
+            memoryview(message)[i : i + _update_size]
+            for i in range(0, len(message), _update_size)
+        ]
+
+        def incremental():
+            h = cryptohash.new(name, None, *params)
+            for piece in pieces:
+                h.update(piece)
+            return h.digest()
+
+        calls["cryptohash"] = incremental
+    else:
+        messages = [message] * _batch_count
+        calls["cryptohash"] = lambda: cryptohash.hash_many(
+            name, messages, None, *params
+        )[0]
+    if ref is not None:
+        ref_name, ref_len = ref
+        args = () if ref_len is None else (ref_len,)
+        if mode == "oneshot":
+            calls["hashlib"] = lambda: hashlib.new(ref_name, message).digest(*args)
+        elif mode == "incremental":
+
+            def ref_incremental():
+                h = hashlib.new(ref_name)
+                for piece in pieces:
+                    h.update(piece)
+                return h.digest(*args)
+
+            calls["hashlib"] = ref_incremental
+        else:
+            calls["hashlib"] = lambda: [
+                hashlib.new(ref_name, m).digest(*args) for m in messages
+            ][0]
+    return calls
+
+
+def bench_suite(algs=None, sizes=None, modes=None, min_time=0.3, output=None):
+    """Throughput and latency of every hash function, against hashlib.
+
+    Every algorithm is run at every message size in each mode: oneshot (the
+    module function), incremental (new and update of 64 KiB pieces) and batch
+    (hash_many of 64 messages, up to 64 KiB). Digests are checked against
+    hashlib first. Results go to output, if given, as JSON, so that runs can
+    be diffed.
+    Return the list of result records.
+    """
+    algs = [a for a in suite_algs if algs is None or a[0] in algs]
+    sizes = suite_sizes if sizes is None else sizes
+    modes = suite_modes if modes is None else modes
+    records = []
+    for size in sizes:
+        message = os.urandom(size)
+        for name, params, ref in algs:
+            for mode in modes:
+                if mode == "batch" and size > _batch_max_size:
+                    continue
+                calls = _suite_calls(name, params, ref, mode, message)
+                digests = {impl: call() for impl, call in calls.items()}
+                match = len(set(digests.values())) == 1
+                count = _batch_count if mode == "batch" else 1
+                rates = {}
+                for impl, call in calls.items():
+                    seconds = _seconds_per_call(call, min_time) / count
+                    rate = size / seconds / 1e6 if size else None
+                    rates[impl] = rate
+                    records.append(
+                        {
+                            "alg": name,
+                            "params": list(params),
+                            "size": size,
+                            "mode": mode,
+                            "impl": impl,
+                            "ns_per_call": seconds * 1e9,
+                            "mb_per_s": rate,
+                            "match": match,
+                        }
+                    )
+                    print(
+                        f"{name:12s} {mode:11s} {size:9d} B {impl:10s}"
+                        f" {seconds * 1e9:12.0f} ns"
+                        + (f" {rate:9.1f} MB/s" if rate else "")
+                        + ("" if match else "  MISMATCH")
+                    )
+    result = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_features": cryptohash.cpu_features(),
+        "results": records,
+    }
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=1)
+    return records
+
+
+def bench_mgf(bits=(2048, 3072, 4096, 6144, 8192), min_time=0.3):
+    """Time the masks of PSS and OAEP, MGF1-SHA256 against SHAKE (RFC 8702).
+
+    For each key size, the mask of the PSS data block (emLen - hLen - 1
+    bytes) is XORed into place, as rsa.py does for encoding and decoding.
+    Return a list of (mgf, key bits, ns per mask).
+    """
+    import mgf
+
+    algs = [
+        ("mgf1-sha256", mgf.alg_mgf1sha256, 32),
+        ("shake128", mgf.alg_shake128mgf, 32),
+        ("shake256", mgf.alg_shake256mgf, 64),
+    ]
+    results = []
+    for nbits in bits:
+        for label, alg, hlen in algs:
+            seed = os.urandom(hlen)
+            target = bytearray(((nbits + 6) >> 3) - hlen - 1)
+            ns = _seconds_per_call(lambda: alg.xor(seed, target), min_time) * 1e9
+            results.append((label, nbits, ns))
+            print(f"{label:12s} {nbits:5d} bit, {len(target):4d} B: {ns:8.0f} ns/mask")
+    return results
+
+
+def _lucas_d(n):
+    d = 5
+    while mod.Mod(d, n).jacobi() != -1:
+        d = -d - 2 if d > 0 else -d + 2
+    return d
+
+
+def _lucas_mod(n, d):
+    """The Lucas chain of general_lucas_test on Mod, as it was."""
+    u = v = mod.Mod(1, n)
+    for bit in bin(n + 1)[3:]:
+        u, v = u * v, (v * v + d * u * u).half()
+        if bit == "1":
+            u, v = (u + v).half(), (v + d * u).half()
+    return u == 0
+
+
+def _lucas_mod_square(n, d):
+    """The same chain on Mod with square() and augmented assignments."""
+    u, v = mod.Mod(1, n), mod.Mod(1, n)
+    for bit in bin(n + 1)[3:]:
+        t = u.square()
+        t *= d
+        u *= v
+        v = v.square()
+        v += t
+        v = v.half()
+        if bit == "1":
+            t = u * d
+            u += v
+            u = u.half()
+            v += t
+            v = v.half()
+    return u == 0
+
+
+def _lucas_elem(n, d):
+    """The same chain on the ModElem of a ModContext."""
+    ring = mod.ModContext(n)
+    u = v = ring(1)
+    for bit in bin(n + 1)[3:]:
+        u, v = u * v, (v.square() + d * u.square()).half()
+        if bit == "1":
+            u, v = (u + v).half(), (v + d * u).half()
+    return u == 0
+
+
+def bench_mod(bits=(1024, 2048, 3072, 4096), min_time=0.3):
+    """Time Lucas tests and RSA CRT steps on Mod against ModContext.
+
+    The Lucas chain of a prime of each size is run on Mod, on Mod with
+    square() and augmented assignments, on ModElem, and on the ints of a
+    ModContext as general_lucas_test does. The CRT recombination of RSA
+    decryption is run by mod.crt on Mod and by ModContext.crt. Return a list
+    of (case, bits, ms per call).
+    """
+    results = []
+    for nbits in bits:
+        n = primes.random_prime(nbits)
+        d = _lucas_d(n)
+        q = primes.random_prime(nbits >> 1)
+        p = primes.random_prime(nbits >> 1)
+        qinv = pow(q, -1, p)
+        ring_p, ring_q = mod.ModContext(p), mod.ModContext(q)
+        mp, mq = p >> 1, q >> 1
+        cases = [
+            ("lucas Mod", lambda: _lucas_mod(n, d)),
+            ("lucas Mod square", lambda: _lucas_mod_square(n, d)),
+            ("lucas ModElem", lambda: _lucas_elem(n, d)),
+            ("lucas ModContext", lambda: primes.general_lucas_test(n)),
+            ("crt Mod", lambda: mod.crt(mod.Mod(mq, q), mod.Mod(mp, p), qinv)),
+            ("crt ModContext", lambda: ring_q.crt(mq, ring_p, mp, qinv)),
+        ]
+        for label, call in cases:
+            ms = _seconds_per_call(call, min_time) * 1e3
+            results.append((label, nbits, ms))
+            print(f"{label:20s} {nbits:5d} bit: {ms:10.4f} ms")
+    return results
+
+
+def bench_dsa(
+    lengths=((2048, 224), (3072, 256)),
+    width=power.COMB_WIDTH,
+    tables=power.COMB_TABLES,
+    min_time=0.3,
+):
+    """Time DSA keygen, sign and verify, and g^k by pow and by the comb table.
+
+    The domains are the provable ones of a fixed seed. keygen, sign and
+    verify use the tables of g and y, made beforehand; verify new key is a
+    key verifying its first signature. The fresh cases start from a copy of
+    the domain without tables, so the time to make those that pay off is
+    counted in: once for one call, and spread over the calls for the 32
+    verifies case, given per signature. Return a list of (case, L, ms per
+    call).
+    """
+    results = []
+    seed = bytes(range(0x80, 0xC0))
+    msg = b"abc"
+    for l, n in lengths:
+        domain = dsa.domaingen(l, n, seed=seed[: n >> 3])
+        t = time.perf_counter()
+        domain.fixed_base(width, tables)
+        setup = time.perf_counter() - t
+        results.append(("comb setup", l, setup * 1e3))
+        print(f"{'comb setup':18s} {l:5d} bit: {setup * 1e3:10.4f} ms")
+        pub, prv = dsa.keygen(domain)
+        sign = prv.sign(msg)
+        k = domain.q * 2 // 3
+
+        def fresh():
+            d = dsa.DSADomain()
+            d.l, d.n, d.p, d.q, d.g = domain.l, domain.n, domain.p, domain.q, domain.g
+            return d
+
+        def sign_fresh():
+            key = dsa.DSAPrivateKey()
+            key.domain, key.x, key.y = fresh(), prv.x, prv.y
+            return key.sign(msg)
+
+        many = 32
+
+        def verify_many_fresh():
+            key = dsa.DSAPublicKey(fresh(), pub.y)
+            for _ in range(many):
+                key.verify(msg, sign)
+
+        # (label, call, operations timed per call)
+        cases = [
+            ("pow(g, k, p)", lambda: pow(domain.g, k, domain.p), 1),
+            ("comb g^k", lambda: domain.pow_g(k), 1),
+            ("keygen", lambda: dsa.keygen(domain), 1),
+            ("sign", lambda: prv.sign(msg), 1),
+            ("verify", lambda: pub.verify(msg, sign), 1),
+            (
+                "verify new key",
+                lambda: dsa.DSAPublicKey(domain, pub.y).verify(msg, sign),
+                1,
+            ),
+            ("keygen fresh", lambda: dsa.keygen(fresh()), 1),
+            ("sign fresh", sign_fresh, 1),
+            (
+                "verify fresh",
+                lambda: dsa.DSAPublicKey(fresh(), pub.y).verify(msg, sign),
+                1,
+            ),
+            (f"{many} verifies fresh", verify_many_fresh, many),
+        ]
+        for label, call, per in cases:
+            ms = _seconds_per_call(call, min_time) * 1e3 / per
+            results.append((label, l, ms))
+            print(f"{label:18s} {l:5d} bit: {ms:10.4f} ms")
+    return results
+
+
+def _ext_gcd_euclid(a, b):
+    """basic.ext_gcd as it was, the textbook loop, for reference."""
+    if a > b:
+        x, y, z, w = 1, 0, 0, 1
+    else:
+        x, y, z, w = 0, 1, 1, 0
+        a, b = b, a
+    while b != 0:
+        q, r = divmod(a, b)
+        x, z = z, x - q * z
+        y, w = w, y - q * w
+        a, b = b, r
+    return (a, x, y)
+
+
+def bench_gcd(bits=(1024, 2048, 3072, 4096, 7680, 8192, 15360), min_time=0.3):
+    """Time extended gcd and modular inversion by Euclid, Lehmer and pow.
+
+    Operands are a random odd modulus of each size and a random residue.
+    inverse is basic.inverse, which Mod.inv uses. Return a list of (case,
+    bits, ms per call).
+    """
+    results = []
+    rng = random.Random(0)
+    for nbits in bits:
+        m = rng.getrandbits(nbits) | 1 | (1 << (nbits - 1))
+        x = rng.randrange(m)
+        while basic.ext_gcd(x, m)[0] != 1:
+            x = rng.randrange(m)
+        cases = [
+            ("ext_gcd Euclid", lambda: _ext_gcd_euclid(x, m)),
+            ("ext_gcd Lehmer", lambda: basic.ext_gcd(x, m)),
+            ("pow(x, -1, m)", lambda: pow(x, -1, m)),
+            ("inverse", lambda: basic.inverse(x, m)),
+        ]
+        for label, call in cases:
+            ms = _seconds_per_call(call, min_time) * 1e3
+            results.append((label, nbits, ms))
+            print(f"{label:18s} {nbits:5d} bit: {ms:10.4f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("threads", help=bench_threads.__doc__.splitlines()[0])
+    p.add_argument("--alg", default="sha256")
+    p.add_argument("--size", type=int, default=1 << 20)
+    p.add_argument("--rounds", type=int, default=32)
+    p.add_argument("--max-threads", type=int, default=None)
+    p = sub.add_parser("cpu", help=bench_cpu.__doc__.splitlines()[0])
+    p.add_argument("--algs", nargs="+", default=["sha1", "sha256"])
+    p.add_argument("--size", type=int, default=1 << 20)
+    p.add_argument("--rounds", type=int, default=32)
+    p = sub.add_parser("overhead", help=bench_overhead.__doc__.splitlines()[0])
+    p.add_argument("--alg", default="sha256")
+    p.add_argument("--sizes", type=int, nargs="+", default=[0, 32, 64])
+    p.add_argument("--number", type=int, default=100000)
+    p = sub.add_parser("suite", help=bench_suite.__doc__.splitlines()[0])
+    p.add_argument("--algs", nargs="+", default=None)
+    p.add_argument("--sizes", type=int, nargs="+", default=None)
+    p.add_argument("--modes", nargs="+", choices=suite_modes, default=None)
+    p.add_argument("--min-time", type=float, default=0.3)
+    p.add_argument("--output", "-o", default=None, help="JSON file of the results")
+    p = sub.add_parser("mgf", help=bench_mgf.__doc__.splitlines()[0])
+    p.add_argument(
+        "--bits", type=int, nargs="+", default=[2048, 3072, 4096, 6144, 8192]
+    )
+    p.add_argument("--min-time", type=float, default=0.3)
+    p = sub.add_parser("mod", help=bench_mod.__doc__.splitlines()[0])
+    p.add_argument("--bits", type=int, nargs="+", default=[1024, 2048, 3072, 4096])
+    p.add_argument("--min-time", type=float, default=0.3)
+    p = sub.add_parser("dsa", help=bench_dsa.__doc__.splitlines()[0])
+    p.add_argument(
+        "--lengths",
+        type=lambda s: tuple(map(int, s.split(","))),
+        nargs="+",
+        default=[(2048, 224), (3072, 256)],
+        help="L,N pairs",
+    )
+    p.add_argument("--width", type=int, default=power.COMB_WIDTH)
+    p.add_argument("--tables", type=int, default=power.COMB_TABLES)
+    p.add_argument("--min-time", type=float, default=0.3)
+    p = sub.add_parser("gcd", help=bench_gcd.__doc__.splitlines()[0])
+    p.add_argument(
+        "--bits",
+        type=int,
+        nargs="+",
+        default=[1024, 2048, 3072, 4096, 7680, 8192, 15360],
+    )
+    p.add_argument("--min-time", type=float, default=0.3)
+    args = parser.parse_args()
+    if args.bench == "threads":
+        bench_threads(args.alg, args.size, args.rounds, args.max_threads)
+    elif args.bench == "cpu":
+        bench_cpu(args.algs, args.size, args.rounds)
+    elif args.bench == "overhead":
+        bench_overhead(args.alg, args.sizes, args.number)
+    elif args.bench == "suite":
+        bench_suite(args.algs, args.sizes, args.modes, args.min_time, args.output)
+    elif args.bench == "mgf":
+        bench_mgf(args.bits, args.min_time)
+    elif args.bench == "mod":
+        bench_mod(args.bits, args.min_time)
+    elif args.bench == "dsa":
+        bench_dsa(args.lengths, args.width, args.tables, args.min_time)
+    elif args.bench == "gcd":
+        bench_gcd(args.bits, args.min_time)
@@ -28,4 +28,35 @@ inline uint64_t LeftRotate64(uint64_t x, uint64_t n) {
 inline uint64_t RightRotate64(uint64_t x, uint64_t n) {
     return (x >> n) | (x << (64 - n));
 }
+#if __BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__
+#define HOST_TO_BE32(x) __builtin_bswap32(x)
+#define HOST_TO_BE64(x) __builtin_bswap64(x)
+#define HOST_TO_LE32(x) (x)
+#define HOST_TO_LE64(x) (x)
+#else
+#define HOST_TO_BE32(x) (x)
+#define HOST_TO_BE64(x) (x)
+#define HOST_TO_LE32(x) __builtin_bswap32(x)
+#define HOST_TO_LE64(x) __builtin_bswap64(x)
+#endif
+static inline uint32_t LoadBE32(const uint8_t* src) {
+    uint32_t x;
+    memcpy(&x, src, 4);
+    return HOST_TO_BE32(x);
+}
+static inline uint64_t LoadBE64(const uint8_t* src) {
+    uint64_t x;
+    memcpy(&x, src, 8);
+    return HOST_TO_BE64(x);
+}
+static inline uint32_t LoadLE32(const uint8_t* src) {
+    uint32_t x;
+    memcpy(&x, src, 4);
+    return HOST_TO_LE32(x);
+}
+static inline uint64_t LoadLE64(const uint8_t* src) {
+    uint64_t x;
+    memcpy(&x, src, 8);
+    return HOST_TO_LE64(x);
+}
 #endif /* ifndef ARRAY_READ_H */
@@ -0,0 +1,68 @@
+#include "cpu.h"
+
+static const char* cpu_names[CPU_NFEATURES] = {"sse2", "avx2", "sha"};
+static int cpu_detected[CPU_NFEATURES];
+int cpu_enabled[CPU_NFEATURES];
+
+void CPU_Detect(void) {
+#if defined(__x86_64__) && defined(__GNUC__)
+    __builtin_cpu_init();
+    cpu_detected[CPU_SSE2] = __builtin_cpu_supports("sse2");
+    cpu_detected[CPU_AVX2] = __builtin_cpu_supports("avx2");
+    // the SHA-NI code also uses SSSE3 and SSE4.1 shuffles and blends
+    cpu_detected[CPU_SHA] = __builtin_cpu_supports("sha") &&
+                            __builtin_cpu_supports("sse4.1");
+#endif
+    memcpy(cpu_enabled, cpu_detected, sizeof(cpu_enabled));
+}
+
+/* cpu_features() -> {name: enabled} of features supported by the CPU */
+PyObject* cpu_features(PyObject* self, PyObject* args) {
+    PyObject* rv = PyDict_New();
+    if (!rv) return NULL;
+    for (int i = 0; i < CPU_NFEATURES; ++i) {
+        if (!cpu_detected[i]) continue;
+        if (PyDict_SetItemString(rv, cpu_names[i],
+                                 cpu_enabled[i] ? Py_True : Py_False) < 0) {
+            Py_DECREF(rv);
+            return NULL;
+        }
+    }
+    return rv;
+}
+
+/* set_cpu_features({name: enabled})
+ *
+ * Disable (or enable again) features, so that every implementation can be
+ * tested and benchmarked on one machine. Unsupported features raise. */
+PyObject* set_cpu_features(PyObject* self, PyObject* args) {
+    PyObject* features;
+    if (!PyArg_ParseTuple(args, "O!", &PyDict_Type, &features)) return NULL;
+    int enabled[CPU_NFEATURES];
+    memcpy(enabled, cpu_enabled, sizeof(enabled));
+    PyObject *key, *value;
+    Py_ssize_t pos = 0;
+    while (PyDict_Next(features, &pos, &key, &value)) {
+        const char* name = PyUnicode_Check(key) ? PyUnicode_AsUTF8(key) : NULL;
+        if (!name) {
+            PyErr_SetString(PyExc_TypeError, "feature name must be str");
+            return NULL;
+        }
+        int i = 0;
+        while (i < CPU_NFEATURES && strcmp(cpu_names[i], name) != 0) ++i;
+        if (i == CPU_NFEATURES) {
+            PyErr_Format(PyExc_ValueError, "unknown CPU feature %s", name);
+            return NULL;
+        }
+        int on = PyObject_IsTrue(value);
+        if (on < 0) return NULL;
+        if (on && !cpu_detected[i]) {
+            PyErr_Format(PyExc_ValueError, "CPU feature %s not supported",
+                         name);
+            return NULL;
+        }
+        enabled[i] = on;
+    }
+    memcpy(cpu_enabled, enabled, sizeof(enabled));
+    Py_RETURN_NONE;
+}
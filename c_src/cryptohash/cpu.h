@@ -0,0 +1,14 @@
+#ifndef CPU_H
+#define CPU_H
+#include "array_read.h"
+
+/* Optional CPU features used by the hash implementations. */
+enum { CPU_SSE2, CPU_AVX2, CPU_SHA, CPU_NFEATURES };
+
+/* Nonzero if the feature is supported and not disabled. */
+extern int cpu_enabled[CPU_NFEATURES];
+void CPU_Detect(void);
+
+PyObject* cpu_features(PyObject* self, PyObject* args);
+PyObject* set_cpu_features(PyObject* self, PyObject* args);
+#endif /* ifndef CPU_H */
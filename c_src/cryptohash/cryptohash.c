@@ -1,49 +1,102 @@
-#include "array_read.h"
-PyObject* md5(PyObject* self, PyObject* args);
-PyObject* sha1(PyObject* self, PyObject* args);
-PyObject* sha224(PyObject* self, PyObject* args);
-PyObject* sha256(PyObject* self, PyObject* args);
-PyObject* sha384(PyObject* self, PyObject* args);
-PyObject* sha512(PyObject* self, PyObject* args);
-PyObject* sha512t(PyObject* self, PyObject* args);
-PyObject* sha512_224(PyObject* self, PyObject* args);
-PyObject* sha512_256(PyObject* self, PyObject* args);
-PyObject* sha3_224(PyObject* self, PyObject* args);
-PyObject* sha3_256(PyObject* self, PyObject* args);
-PyObject* sha3_384(PyObject* self, PyObject* args);
-PyObject* sha3_512(PyObject* self, PyObject* args);
-PyObject* shake128(PyObject* self, PyObject* args);
-PyObject* shake256(PyObject* self, PyObject* args);
-PyObject* shake128l(PyObject* self, PyObject* args);
-PyObject* shake256l(PyObject* self, PyObject* args);
-PyObject* rawshake128l(PyObject* self, PyObject* args);
-PyObject* rawshake256l(PyObject* self, PyObject* args);
-PyObject* keccak_diy(PyObject* self, PyObject* args);
+#include "cpu.h"
+#include "hashobject.h"
+
+/* One-shot hash functions, (message, *params) -> digest. */
+#define ONESHOT(alg)                                                   \
+    static PyObject* alg(PyObject* self, PyObject* const* args,        \
+                         Py_ssize_t nargs) {                           \
+        return HashAlg_OneShot(&alg##_desc, args, nargs);              \
+    }
+ONESHOT(md5)
+ONESHOT(sha1)
+ONESHOT(sha224)
+ONESHOT(sha256)
+ONESHOT(sha384)
+ONESHOT(sha512)
+ONESHOT(sha512t)
+ONESHOT(sha512_224)
+ONESHOT(sha512_256)
+ONESHOT(sha3_224)
+ONESHOT(sha3_256)
+ONESHOT(sha3_384)
+ONESHOT(sha3_512)
+ONESHOT(shake128)
+ONESHOT(shake256)
+ONESHOT(shake128l)
+ONESHOT(shake256l)
+ONESHOT(rawshake128l)
+ONESHOT(rawshake256l)
+ONESHOT(keccak_diy)
+ONESHOT(keccak12_diy)
+#undef ONESHOT
 
 static PyMethodDef HashMethods[] = {
-    {"md5", md5, METH_VARARGS, NULL},
-    {"sha1", sha1, METH_VARARGS, NULL},
-    {"sha224", sha224, METH_VARARGS, NULL},
-    {"sha256", sha256, METH_VARARGS, NULL},
-    {"sha384", sha384, METH_VARARGS, NULL},
-    {"sha512", sha512, METH_VARARGS, NULL},
-    {"sha512t", sha512t, METH_VARARGS, NULL},
-    {"sha512_224", sha512_224, METH_VARARGS, NULL},
-    {"sha512_256", sha512_256, METH_VARARGS, NULL},
-    {"sha3_224", sha3_224, METH_VARARGS, NULL},
-    {"sha3_256", sha3_256, METH_VARARGS, NULL},
-    {"sha3_384", sha3_384, METH_VARARGS, NULL},
-    {"sha3_512", sha3_512, METH_VARARGS, NULL},
-    {"shake128", shake128, METH_VARARGS, NULL},
-    {"shake256", shake256, METH_VARARGS, NULL},
-    {"shake128l", shake128l, METH_VARARGS, NULL},
-    {"shake256l", shake256l, METH_VARARGS, NULL},
-    {"rawshake128l", rawshake128l, METH_VARARGS, NULL},
-    {"rawshake256l", rawshake256l, METH_VARARGS, NULL},
-    {"keccak_diy", keccak_diy, METH_VARARGS, NULL},
+    {"md5", (PyCFunction)md5, METH_FASTCALL, NULL},
+    {"sha1", (PyCFunction)sha1, METH_FASTCALL, NULL},
+    {"sha224", (PyCFunction)sha224, METH_FASTCALL, NULL},
+    {"sha256", (PyCFunction)sha256, METH_FASTCALL, NULL},
+    {"sha384", (PyCFunction)sha384, METH_FASTCALL, NULL},
+    {"sha512", (PyCFunction)sha512, METH_FASTCALL, NULL},
+    {"sha512t", (PyCFunction)sha512t, METH_FASTCALL, NULL},
+    {"sha512_224", (PyCFunction)sha512_224, METH_FASTCALL, NULL},
+    {"sha512_256", (PyCFunction)sha512_256, METH_FASTCALL, NULL},
+    {"sha3_224", (PyCFunction)sha3_224, METH_FASTCALL, NULL},
+    {"sha3_256", (PyCFunction)sha3_256, METH_FASTCALL, NULL},
+    {"sha3_384", (PyCFunction)sha3_384, METH_FASTCALL, NULL},
+    {"sha3_512", (PyCFunction)sha3_512, METH_FASTCALL, NULL},
+    {"shake128", (PyCFunction)shake128, METH_FASTCALL, NULL},
+    {"shake256", (PyCFunction)shake256, METH_FASTCALL, NULL},
+    {"shake128l", (PyCFunction)shake128l, METH_FASTCALL, NULL},
+    {"shake256l", (PyCFunction)shake256l, METH_FASTCALL, NULL},
+    {"rawshake128l", (PyCFunction)rawshake128l, METH_FASTCALL, NULL},
+    {"rawshake256l", (PyCFunction)rawshake256l, METH_FASTCALL, NULL},
+    {"keccak_diy", (PyCFunction)keccak_diy, METH_FASTCALL, NULL},
+    {"keccak12_diy", (PyCFunction)keccak12_diy, METH_FASTCALL, NULL},
+    {"hash_chunks", (PyCFunction)hash_chunks, METH_VARARGS | METH_KEYWORDS,
+     NULL},
+    {"new", (PyCFunction)hash_new, METH_FASTCALL, NULL},
+    {"new_xof", xof_new, METH_VARARGS, NULL},
+    {"hmac_new", hmac_new, METH_VARARGS, NULL},
+    {"hmac", hmac_digest, METH_VARARGS, NULL},
+    {"pbkdf2_hmac", pbkdf2_hmac, METH_VARARGS, NULL},
+    {"hkdf_extract", hkdf_extract, METH_VARARGS, NULL},
+    {"hkdf_expand", hkdf_expand, METH_VARARGS, NULL},
+    {"mgf1_xor", mgf1_xor, METH_VARARGS, NULL},
+    {"hash_many", (PyCFunction)hash_many, METH_VARARGS | METH_KEYWORDS,
+     NULL},
+    {"digest_into", digest_into, METH_VARARGS, NULL},
+    {"hash_file", hash_file, METH_VARARGS, NULL},
+    {"cpu_features", cpu_features, METH_NOARGS, NULL},
+    {"set_cpu_features", set_cpu_features, METH_VARARGS, NULL},
     {NULL, NULL, 0, NULL}};
 
 static struct PyModuleDef hashmodule = {PyModuleDef_HEAD_INIT, "cryptohash",
                                         NULL, -1, HashMethods};
 
-PyMODINIT_FUNC PyInit_cryptohash(void) { return PyModule_Create(&hashmodule); }
+PyMODINIT_FUNC PyInit_cryptohash(void) {
+    CPU_Detect();
+    if (PyType_Ready(&HashType) < 0) return NULL;
+    if (PyType_Ready(&XOFType) < 0) return NULL;
+    if (PyType_Ready(&HMACType) < 0) return NULL;
+    PyObject* m = PyModule_Create(&hashmodule);
+    if (!m) return NULL;
+    Py_INCREF(&HashType);
+    if (PyModule_AddObject(m, "Hash", (PyObject*)&HashType) < 0) {
+        Py_DECREF(&HashType);
+        Py_DECREF(m);
+        return NULL;
+    }
+    Py_INCREF(&XOFType);
+    if (PyModule_AddObject(m, "XOF", (PyObject*)&XOFType) < 0) {
+        Py_DECREF(&XOFType);
+        Py_DECREF(m);
+        return NULL;
+    }
+    Py_INCREF(&HMACType);
+    if (PyModule_AddObject(m, "HMAC", (PyObject*)&HMACType) < 0) {
+        Py_DECREF(&HMACType);
+        Py_DECREF(m);
+        return NULL;
+    }
+    return m;
+}
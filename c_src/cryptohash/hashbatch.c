@@ -0,0 +1,179 @@
+#include "hashobject.h"
+
+/* Destination of digest i: list[i] if list is given, else dst + i * hlen.
+ * The digests of list are new bytes objects not yet shared, so no Python API
+ * is called and this may run without the GIL. */
+#define DIGEST_DST(i) \
+    (list ? (uint8_t*)PyBytes_AS_STRING(PyList_GET_ITEM(list, i)) \
+          : dst + hlen * (i))
+
+/* Hash views into list or dst. Runs of messages of the same length go to the
+ * multi-buffer SIMD implementation if lanes > 1. */
+static void hash_views(const HashAlgDesc* desc, const HashState* init_state,
+                       int lanes, size_t hlen, Py_buffer* views, Py_ssize_t n,
+                       PyObject* list, uint8_t* dst) {
+    HashState state;
+    const uint8_t* src[MB_MAX_LANES];
+    uint8_t* out[MB_MAX_LANES];
+    Py_ssize_t i = 0;
+    while (i < n) {
+        int k = 1;
+        while (k < lanes && i + k < n && views[i + k].len == views[i].len)
+            ++k;
+        if (k > 1) {
+            for (int l = 0; l < k; ++l) {
+                src[l] = views[i + l].buf;
+                out[l] = DIGEST_DST(i + l);
+            }
+            desc->multi(init_state, src, views[i].len, out, k);
+            i += k;
+        } else {
+            state = *init_state;
+            desc->update(&state, views[i].buf, views[i].len);
+            desc->final(&state, DIGEST_DST(i));
+            ++i;
+        }
+    }
+}
+#undef DIGEST_DST
+
+/* hash_many(name, messages, out, *params, prefix=None)
+ *
+ * Hash every message of an iterable in one call. If out is None, return a
+ * list of digests, else write the digests consecutively into the writable
+ * buffer out and return it. prefix is hashed before every message. */
+PyObject* hash_many(PyObject* self, PyObject* args, PyObject* kwargs) {
+    static char* kwlist[] = {"", "", "", "", "", "", "prefix", NULL};
+    const char* name;
+    PyObject *messages, *out;
+    Py_buffer prefix = {NULL, NULL};
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "sOO|kIb$z*", kwlist,
+                                     &name, &messages, &out, &hashbit,
+                                     &capbit, &pad, &prefix))
+        return NULL;
+    PyObject* rv = NULL;
+    const HashAlgDesc* desc = HashAlg_Find(name);
+    if (!desc) {
+        PyErr_Format(PyExc_ValueError, "unsupported hash type %s", name);
+        goto release_prefix;
+    }
+    if (PyTuple_GET_SIZE(args) - 3 != desc->nparam) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)", name,
+                     desc->nparam);
+        goto release_prefix;
+    }
+    HashState init_state;
+    size_t hlen = desc->init(&init_state, hashbit, capbit, pad);
+    if (hlen == HASH_INVALID) {
+        PyErr_Format(PyExc_ValueError, "invalid parameter for %s", name);
+        goto release_prefix;
+    }
+    // the multi-buffer code starts from a fresh state only
+    int lanes = desc->multi_lanes ? desc->multi_lanes(&init_state) : 0;
+    if (prefix.buf && prefix.len) {
+        desc->update(&init_state, prefix.buf, prefix.len);
+        lanes = 0;
+    }
+
+    PyObject* seq = PySequence_Fast(messages, "messages must be iterable");
+    if (!seq) goto release_prefix;
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(seq);
+    Py_buffer* views = PyMem_Calloc(n ? n : 1, sizeof(Py_buffer));
+    Py_buffer out_view = {NULL, NULL};
+    Py_ssize_t acquired = 0;
+    size_t total = 0;
+    if (!views) {
+        PyErr_NoMemory();
+        goto done;
+    }
+    // take all buffers first, they stay valid without the GIL
+    for (; acquired < n; ++acquired) {
+        PyObject* item = PySequence_Fast_GET_ITEM(seq, acquired);
+        if (HashIn_Get(item, views + acquired) < 0) goto done;
+        total += views[acquired].len;
+    }
+    uint8_t* dst = NULL;
+    if (out == Py_None) {
+        rv = PyList_New(n);
+        if (!rv) goto done;
+        for (Py_ssize_t i = 0; i < n; ++i) {
+            PyObject* digest = PyBytes_FromStringAndSize(NULL, hlen);
+            if (!digest) {
+                Py_CLEAR(rv);
+                goto done;
+            }
+            PyList_SET_ITEM(rv, i, digest);
+        }
+    } else {
+        if (PyObject_GetBuffer(out, &out_view, PyBUF_WRITABLE) < 0) goto done;
+        if ((size_t)out_view.len < hlen * n) {
+            PyErr_Format(PyExc_ValueError,
+                         "out has %zd bytes, %zu needed for %zd digests",
+                         out_view.len, hlen * n, n);
+            goto done;
+        }
+        dst = out_view.buf;
+    }
+    HASH_UPDATE_ALLOW_THREADS(
+        total,
+        hash_views(desc, &init_state, lanes, hlen, views, n, rv, dst));
+    if (!rv) {
+        Py_INCREF(out);
+        rv = out;
+    }
+done:
+    if (out_view.obj) PyBuffer_Release(&out_view);
+    for (Py_ssize_t i = 0; i < acquired; ++i) PyBuffer_Release(views + i);
+    PyMem_Free(views);
+    Py_DECREF(seq);
+release_prefix:
+    if (prefix.obj) PyBuffer_Release(&prefix);
+    return rv;
+}
+
+/* digest_into(name, data, out, offset, *params) -> number of bytes written
+ *
+ * Hash data and write the digest to the writable buffer out at offset,
+ * without creating a bytes object. */
+PyObject* digest_into(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer view, out_view;
+    PyObject* out;
+    Py_ssize_t offset;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sy*On|kIb", &name, &view, &out, &offset,
+                          &hashbit, &capbit, &pad))
+        return NULL;
+    PyObject* rv = NULL;
+    const HashAlgDesc* desc = HashAlg_Find(name);
+    if (!desc) {
+        PyErr_Format(PyExc_ValueError, "unsupported hash type %s", name);
+        goto done;
+    }
+    if (PyTuple_GET_SIZE(args) - 4 != desc->nparam) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)", name,
+                     desc->nparam);
+        goto done;
+    }
+    HashState state;
+    size_t hlen = desc->init(&state, hashbit, capbit, pad);
+    if (hlen == HASH_INVALID) {
+        PyErr_Format(PyExc_ValueError, "invalid parameter for %s", name);
+        goto done;
+    }
+    uint8_t* dst = HashOut_Get(out, offset, hlen, &out_view);
+    if (!dst) goto done;
+    HASH_UPDATE_ALLOW_THREADS(view.len,
+                              desc->update(&state, view.buf, view.len));
+    desc->final(&state, dst);
+    PyBuffer_Release(&out_view);
+    rv = PyLong_FromSize_t(hlen);
+done:
+    PyBuffer_Release(&view);
+    return rv;
+}
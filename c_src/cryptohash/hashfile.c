@@ -0,0 +1,108 @@
+#include <errno.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include "hashobject.h"
+
+/* Hash a file without reading it into a Python object. Every file is read in
+ * chunks into one page-aligned buffer until read() returns 0, as
+ * hashlib.file_digest does: the size fstat reports is not trusted, since
+ * procfs files report 0 and files may grow, and a file truncated while
+ * mapped would raise SIGBUS. */
+
+#define HASH_FILE_CHUNK ((size_t)1 << 20)
+
+/* Hash from the current offset of fd to the end, return 0 or an errno. */
+static int hash_fd(const HashAlgDesc* desc, HashState* state, int fd) {
+#ifdef POSIX_FADV_SEQUENTIAL
+    // only a hint, fails harmlessly on pipes
+    posix_fadvise(fd, 0, 0, POSIX_FADV_SEQUENTIAL);
+#endif
+    void* buf;
+    int err = posix_memalign(&buf, sysconf(_SC_PAGESIZE), HASH_FILE_CHUNK);
+    if (err) return err;
+    for (;;) {
+        ssize_t n = read(fd, buf, HASH_FILE_CHUNK);
+        if (n < 0) {
+            if (errno == EINTR) continue;
+            err = errno;
+            break;
+        }
+        if (n == 0) break;
+        desc->update(state, buf, n);
+    }
+    free(buf);
+    return err;
+}
+
+/* hash_file(name, path_or_fd, *params) -> digest
+ *
+ * A file descriptor is hashed from its current offset and left at the end,
+ * a path is opened and closed. */
+PyObject* hash_file(PyObject* self, PyObject* args) {
+    const char* name;
+    PyObject* file;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sO|kIb", &name, &file, &hashbit, &capbit,
+                          &pad))
+        return NULL;
+    const HashAlgDesc* desc = HashAlg_Find(name);
+    if (!desc) {
+        PyErr_Format(PyExc_ValueError, "unsupported hash type %s", name);
+        return NULL;
+    }
+    if (PyTuple_GET_SIZE(args) - 2 != desc->nparam) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)", name,
+                     desc->nparam);
+        return NULL;
+    }
+    HashState state;
+    size_t hlen = desc->init(&state, hashbit, capbit, pad);
+    if (hlen == HASH_INVALID) {
+        PyErr_Format(PyExc_ValueError, "invalid parameter for %s", name);
+        return NULL;
+    }
+
+    int fd, err;
+    PyObject* path = NULL;
+    if (PyLong_Check(file)) {
+        long lfd = PyLong_AsLong(file);
+        if (lfd == -1 && PyErr_Occurred()) return NULL;
+        if (lfd < INT_MIN || lfd > INT_MAX) {
+            PyErr_SetString(PyExc_OverflowError,
+                            "file descriptor out of range");
+            return NULL;
+        }
+        fd = (int)lfd;
+    } else {
+        if (!PyUnicode_FSConverter(file, &path)) return NULL;
+        Py_BEGIN_ALLOW_THREADS
+        fd = open(PyBytes_AS_STRING(path), O_RDONLY | O_CLOEXEC);
+        Py_END_ALLOW_THREADS
+        if (fd < 0) {
+            PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, file);
+            Py_DECREF(path);
+            return NULL;
+        }
+    }
+    PyObject* rv = PyBytes_FromStringAndSize(NULL, hlen);
+    Py_BEGIN_ALLOW_THREADS
+    err = rv ? hash_fd(desc, &state, fd) : 0;
+    if (path) close(fd);
+    Py_END_ALLOW_THREADS
+    if (err) {
+        Py_CLEAR(rv);
+        errno = err;
+        if (path)
+            PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, file);
+        else
+            PyErr_SetFromErrno(PyExc_OSError);
+    } else if (rv) {
+        desc->final(&state, (uint8_t*)PyBytes_AS_STRING(rv));
+    }
+    Py_XDECREF(path);
+    return rv;
+}
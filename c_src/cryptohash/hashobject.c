@@ -0,0 +1,434 @@
+#include "hashobject.h"
+
+static const HashAlgDesc* hash_algs[] = {
+    &md5_desc,          &sha1_desc,         &sha224_desc,
+    &sha256_desc,       &sha384_desc,       &sha512_desc,
+    &sha512t_desc,      &sha512_224_desc,   &sha512_256_desc,
+    &sha3_224_desc,     &sha3_256_desc,     &sha3_384_desc,
+    &sha3_512_desc,     &shake128_desc,     &shake256_desc,
+    &shake128l_desc,    &shake256l_desc,    &rawshake128l_desc,
+    &rawshake256l_desc, &keccak_diy_desc,   &keccak12_diy_desc,
+    NULL};
+
+const HashAlgDesc* HashAlg_Find(const char* name) {
+    for (const HashAlgDesc** p = hash_algs; *p; ++p)
+        if (strcmp((*p)->name, name) == 0) return *p;
+    return NULL;
+}
+size_t HashAlg_BlockSize(const HashAlgDesc* desc, const HashState* state) {
+    return desc->block_size ? desc->block_size : state->sha3.RATE;
+}
+
+int HashIn_Get(PyObject* obj, Py_buffer* view) {
+    if (PyUnicode_Check(obj)) {
+        Py_ssize_t len;
+        const char* s = PyUnicode_AsUTF8AndSize(obj, &len);
+        if (!s) return -1;
+        // keeps a reference to obj, so s stays valid until release
+        return PyBuffer_FillInfo(view, obj, (void*)s, len, 1, PyBUF_SIMPLE);
+    }
+    return PyObject_GetBuffer(obj, view, PyBUF_SIMPLE);
+}
+
+size_t HashAlg_InitArgs(const HashAlgDesc* desc, HashState* state,
+                        PyObject* const* params, Py_ssize_t n) {
+    size_t hashbit = 0;
+    unsigned long capbit = 0;
+    long pad = 0;
+    if (n != desc->nparam) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)",
+                     desc->name, desc->nparam);
+        return HASH_INVALID;
+    }
+    if (n > 0) {
+        hashbit = PyLong_AsSize_t(params[0]);
+        if (hashbit == (size_t)-1 && PyErr_Occurred()) return HASH_INVALID;
+    }
+    if (n > 2) {
+        capbit = PyLong_AsUnsignedLong(params[1]);
+        if (capbit == (unsigned long)-1 && PyErr_Occurred()) return HASH_INVALID;
+        pad = PyLong_AsLong(params[2]);
+        if (pad == -1 && PyErr_Occurred()) return HASH_INVALID;
+        if (capbit > UINT_MAX || pad < 0 || pad > 0xff) {
+            PyErr_Format(PyExc_OverflowError, "parameter out of range for %s",
+                         desc->name);
+            return HASH_INVALID;
+        }
+    }
+    size_t hlen = desc->init(state, hashbit, capbit, pad);
+    if (hlen == HASH_INVALID)
+        PyErr_Format(PyExc_ValueError, "invalid parameter for %s", desc->name);
+    return hlen;
+}
+
+PyObject* HashAlg_OneShot(const HashAlgDesc* desc, PyObject* const* args,
+                          Py_ssize_t nargs) {
+    if (nargs < 1) {
+        PyErr_Format(PyExc_TypeError, "%s() missing message", desc->name);
+        return NULL;
+    }
+    HashState state;
+    size_t hlen = HashAlg_InitArgs(desc, &state, args + 1, nargs - 1);
+    if (hlen == HASH_INVALID) return NULL;
+    Py_buffer view;
+    if (HashIn_Get(args[0], &view) < 0) return NULL;
+    PyObject* rv = PyBytes_FromStringAndSize(NULL, hlen);
+    if (rv) {
+        HASH_UPDATE_ALLOW_THREADS(view.len,
+                                  desc->update(&state, view.buf, view.len));
+        desc->final(&state, (uint8_t*)PyBytes_AS_STRING(rv));
+    }
+    PyBuffer_Release(&view);
+    return rv;
+}
+
+uint8_t* HashOut_Get(PyObject* out, Py_ssize_t offset, size_t len,
+                     Py_buffer* view) {
+    if (PyObject_GetBuffer(out, view, PyBUF_WRITABLE) < 0) return NULL;
+    if (offset < 0 || (size_t)offset > (size_t)view->len ||
+        (size_t)view->len - offset < len) {
+        PyErr_Format(PyExc_ValueError,
+                     "out has %zd bytes, %zu needed at offset %zd", view->len,
+                     len, offset);
+        PyBuffer_Release(view);
+        return NULL;
+    }
+    return (uint8_t*)view->buf + offset;
+}
+
+typedef struct {
+    PyObject_HEAD
+    const HashAlgDesc* desc;
+    size_t hlen;
+    HashState state;
+    // allocated on first large update, guards state while GIL is released
+    PyThread_type_lock lock;
+} HashObject;
+
+static HashObject* HashObject_Alloc(const HashAlgDesc* desc, size_t hlen) {
+    HashObject* obj = PyObject_New(HashObject, &HashType);
+    if (!obj) return NULL;
+    obj->desc = desc;
+    obj->hlen = hlen;
+    obj->lock = NULL;
+    return obj;
+}
+
+static void Hash_dealloc(HashObject* self) {
+    if (self->lock) PyThread_free_lock(self->lock);
+    PyObject_Free(self);
+}
+
+static PyObject* Hash_update(HashObject* self, PyObject* data) {
+    Py_buffer view;
+    if (PyObject_GetBuffer(data, &view, PyBUF_SIMPLE) < 0) return NULL;
+    if (!self->lock && view.len >= HASH_GIL_MINSIZE)
+        // failure is harmless, just keep the GIL
+        self->lock = PyThread_allocate_lock();
+    if (self->lock) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(self->lock, 1);
+        self->desc->update(&self->state, view.buf, view.len);
+        PyThread_release_lock(self->lock);
+        Py_END_ALLOW_THREADS
+    } else {
+        self->desc->update(&self->state, view.buf, view.len);
+    }
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
+
+static PyObject* Hash_copy(HashObject* self, PyObject* unused) {
+    HashObject* obj = HashObject_Alloc(self->desc, self->hlen);
+    if (!obj) return NULL;
+    ENTER_HASH(self);
+    obj->state = self->state;
+    LEAVE_HASH(self);
+    return (PyObject*)obj;
+}
+
+static PyObject* Hash_digest(HashObject* self, PyObject* unused) {
+    // finalize a copy, so that the object may still be updated
+    HashState tmp;
+    ENTER_HASH(self);
+    tmp = self->state;
+    LEAVE_HASH(self);
+    PyObject* rv = PyBytes_FromStringAndSize(NULL, self->hlen);
+    if (!rv) return NULL;
+    self->desc->final(&tmp, (uint8_t*)PyBytes_AS_STRING(rv));
+    return rv;
+}
+
+/* digest_into(out, offset=0) -> number of bytes written */
+static PyObject* Hash_digest_into(HashObject* self, PyObject* args) {
+    PyObject* out;
+    Py_ssize_t offset = 0;
+    if (!PyArg_ParseTuple(args, "O|n", &out, &offset)) return NULL;
+    HashState tmp;
+    ENTER_HASH(self);
+    tmp = self->state;
+    LEAVE_HASH(self);
+    Py_buffer view;
+    uint8_t* dst = HashOut_Get(out, offset, self->hlen, &view);
+    if (!dst) return NULL;
+    self->desc->final(&tmp, dst);
+    PyBuffer_Release(&view);
+    return PyLong_FromSize_t(self->hlen);
+}
+
+static PyObject* Hash_hexdigest(HashObject* self, PyObject* unused) {
+    PyObject* digest = Hash_digest(self, NULL);
+    if (!digest) return NULL;
+    PyObject* rv = PyObject_CallMethod(digest, "hex", NULL);
+    Py_DECREF(digest);
+    return rv;
+}
+
+static PyObject* Hash_get_name(HashObject* self, void* closure) {
+    return PyUnicode_FromString(self->desc->name);
+}
+static PyObject* Hash_get_digest_size(HashObject* self, void* closure) {
+    return PyLong_FromSize_t(self->hlen);
+}
+static PyObject* Hash_get_block_size(HashObject* self, void* closure) {
+    return PyLong_FromSize_t(HashAlg_BlockSize(self->desc, &self->state));
+}
+
+static PyMethodDef Hash_methods[] = {
+    {"update", (PyCFunction)Hash_update, METH_O, NULL},
+    {"copy", (PyCFunction)Hash_copy, METH_NOARGS, NULL},
+    {"digest", (PyCFunction)Hash_digest, METH_NOARGS, NULL},
+    {"digest_into", (PyCFunction)Hash_digest_into, METH_VARARGS, NULL},
+    {"hexdigest", (PyCFunction)Hash_hexdigest, METH_NOARGS, NULL},
+    {NULL, NULL, 0, NULL}};
+
+static PyGetSetDef Hash_getset[] = {
+    {"name", (getter)Hash_get_name, NULL, NULL, NULL},
+    {"digest_size", (getter)Hash_get_digest_size, NULL, NULL, NULL},
+    {"block_size", (getter)Hash_get_block_size, NULL, NULL, NULL},
+    {NULL, NULL, NULL, NULL, NULL}};
+
+PyTypeObject HashType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "cryptohash.Hash",
+    .tp_basicsize = sizeof(HashObject),
+    .tp_dealloc = (destructor)Hash_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_methods = Hash_methods,
+    .tp_getset = Hash_getset,
+};
+
+/* new(name, data=None, *params) */
+PyObject* hash_new(PyObject* self, PyObject* const* args, Py_ssize_t nargs) {
+    if (nargs < 1 || !PyUnicode_Check(args[0])) {
+        PyErr_SetString(PyExc_TypeError, "new() requires the name as a str");
+        return NULL;
+    }
+    const char* name = PyUnicode_AsUTF8(args[0]);
+    if (!name) return NULL;
+    const HashAlgDesc* desc = HashAlg_Find(name);
+    if (!desc) {
+        PyErr_Format(PyExc_ValueError, "unsupported hash type %s", name);
+        return NULL;
+    }
+    HashState state;
+    size_t hlen =
+        HashAlg_InitArgs(desc, &state, args + 2, nargs > 2 ? nargs - 2 : 0);
+    if (hlen == HASH_INVALID) return NULL;
+    Py_buffer view = {NULL, NULL};
+    if (nargs > 1 && args[1] != Py_None && HashIn_Get(args[1], &view) < 0)
+        return NULL;
+    HashObject* obj = HashObject_Alloc(desc, hlen);
+    if (obj) {
+        obj->state = state;
+        if (view.obj) {
+            HASH_UPDATE_ALLOW_THREADS(
+                view.len, desc->update(&obj->state, view.buf, view.len));
+        }
+    }
+    if (view.obj) PyBuffer_Release(&view);
+    return (PyObject*)obj;
+}
+
+typedef struct {
+    PyObject_HEAD
+    // for the name attribute, points to a string constant
+    const char* name;
+    SHA3Object state;
+    // padded and squeezing, no more update
+    int squeezing;
+    // bytes of the current output block already read
+    uint32_t pos;
+    PyThread_type_lock lock;
+} XOFObject;
+
+static XOFObject* XOFObject_Alloc(const char* name) {
+    XOFObject* obj = PyObject_New(XOFObject, &XOFType);
+    if (!obj) return NULL;
+    obj->name = name;
+    obj->squeezing = 0;
+    obj->pos = 0;
+    obj->lock = NULL;
+    return obj;
+}
+
+static void XOF_dealloc(XOFObject* self) {
+    if (self->lock) PyThread_free_lock(self->lock);
+    PyObject_Free(self);
+}
+
+static PyObject* XOF_update(XOFObject* self, PyObject* data) {
+    Py_buffer view;
+    if (PyObject_GetBuffer(data, &view, PyBUF_SIMPLE) < 0) return NULL;
+    if (!self->lock && view.len >= HASH_GIL_MINSIZE)
+        self->lock = PyThread_allocate_lock();
+    int ok = 1;
+    if (self->lock) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(self->lock, 1);
+        if (self->squeezing)
+            ok = 0;
+        else
+            SHA3_HashUpdate(&self->state, view.buf, view.len);
+        PyThread_release_lock(self->lock);
+        Py_END_ALLOW_THREADS
+    } else if (self->squeezing) {
+        ok = 0;
+    } else {
+        SHA3_HashUpdate(&self->state, view.buf, view.len);
+    }
+    PyBuffer_Release(&view);
+    if (!ok) {
+        PyErr_SetString(PyExc_ValueError, "update after read");
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+/* Squeeze len bytes to dst, padding first if not yet done. Touches no
+ * Python object. */
+static void XOF_Squeeze(XOFObject* self, uint8_t* dst, size_t len) {
+    if (!self->squeezing) {
+        SHA3_HashPad(&self->state);
+        self->squeezing = 1;
+        self->pos = 0;
+    }
+    SHA3_Squeeze(&self->state, dst, len, &self->pos);
+}
+
+static void XOF_SqueezeLocked(XOFObject* self, uint8_t* dst, size_t len) {
+    if (!self->lock && len >= HASH_GIL_MINSIZE)
+        self->lock = PyThread_allocate_lock();
+    if (self->lock) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(self->lock, 1);
+        XOF_Squeeze(self, dst, len);
+        PyThread_release_lock(self->lock);
+        Py_END_ALLOW_THREADS
+    } else {
+        XOF_Squeeze(self, dst, len);
+    }
+}
+
+static PyObject* XOF_read(XOFObject* self, PyObject* args) {
+    Py_ssize_t n;
+    if (!PyArg_ParseTuple(args, "n", &n)) return NULL;
+    if (n < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative length");
+        return NULL;
+    }
+    PyObject* rv = PyBytes_FromStringAndSize(NULL, n);
+    if (!rv) return NULL;
+    XOF_SqueezeLocked(self, (uint8_t*)PyBytes_AS_STRING(rv), n);
+    return rv;
+}
+
+static PyObject* XOF_readinto(XOFObject* self, PyObject* args) {
+    Py_buffer view;
+    if (!PyArg_ParseTuple(args, "w*", &view)) return NULL;
+    XOF_SqueezeLocked(self, view.buf, view.len);
+    Py_ssize_t n = view.len;
+    PyBuffer_Release(&view);
+    return PyLong_FromSsize_t(n);
+}
+
+static PyObject* XOF_copy(XOFObject* self, PyObject* unused) {
+    XOFObject* obj = XOFObject_Alloc(self->name);
+    if (!obj) return NULL;
+    ENTER_HASH(self);
+    obj->state = self->state;
+    obj->squeezing = self->squeezing;
+    obj->pos = self->pos;
+    LEAVE_HASH(self);
+    return (PyObject*)obj;
+}
+
+static PyObject* XOF_get_name(XOFObject* self, void* closure) {
+    return PyUnicode_FromString(self->name);
+}
+static PyObject* XOF_get_block_size(XOFObject* self, void* closure) {
+    return PyLong_FromUnsignedLong(self->state.RATE);
+}
+
+static PyMethodDef XOF_methods[] = {
+    {"update", (PyCFunction)XOF_update, METH_O, NULL},
+    {"read", (PyCFunction)XOF_read, METH_VARARGS, NULL},
+    {"readinto", (PyCFunction)XOF_readinto, METH_VARARGS, NULL},
+    {"copy", (PyCFunction)XOF_copy, METH_NOARGS, NULL},
+    {NULL, NULL, 0, NULL}};
+
+static PyGetSetDef XOF_getset[] = {
+    {"name", (getter)XOF_get_name, NULL, NULL, NULL},
+    {"block_size", (getter)XOF_get_block_size, NULL, NULL, NULL},
+    {NULL, NULL, NULL, NULL, NULL}};
+
+PyTypeObject XOFType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "cryptohash.XOF",
+    .tp_basicsize = sizeof(XOFObject),
+    .tp_dealloc = (destructor)XOF_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_methods = XOF_methods,
+    .tp_getset = XOF_getset,
+};
+
+/* new_xof(name, data=None, capbit=0, pad=0)
+ *
+ * name is shake128, shake256, rawshake128, rawshake256, or keccak_diy and
+ * keccak12_diy which take capbit and pad. */
+PyObject* xof_new(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer view = {NULL, NULL};
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "s|z*Ib", &name, &view, &capbit, &pad))
+        return NULL;
+    XOFObject* obj = NULL;
+    SHA3Object state;
+    Py_ssize_t nparam = PyTuple_GET_SIZE(args) - 2;
+    int nrequired = strcmp(name, "keccak_diy") == 0 ||
+                            strcmp(name, "keccak12_diy") == 0
+                        ? 2
+                        : 0;
+    if (nparam < 0) nparam = 0;
+    if (nparam != nrequired) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)", name,
+                     nrequired);
+        goto done;
+    }
+    const char* alg = SHA3_XOFInit(&state, name, capbit, pad);
+    if (!alg) {
+        PyErr_Format(PyExc_ValueError, "unsupported XOF %s", name);
+        goto done;
+    }
+    obj = XOFObject_Alloc(alg);
+    if (!obj) goto done;
+    obj->state = state;
+    if (view.buf) {
+        HASH_UPDATE_ALLOW_THREADS(
+            view.len, SHA3_HashUpdate(&obj->state, view.buf, view.len));
+    }
+done:
+    if (view.obj) PyBuffer_Release(&view);
+    return (PyObject*)obj;
+}
@@ -0,0 +1,210 @@
+#ifndef HASHOBJECT_H
+#define HASHOBJECT_H
+#include "array_read.h"
+#include "pythread.h"
+
+typedef struct {
+    // state array
+    uint32_t a0;
+    uint32_t b0;
+    uint32_t c0;
+    uint32_t d0;
+    // temporary save
+    uint64_t msg_len, chunk_len;
+    // 512 bits per block
+    uint8_t msg[64];
+} MD5Object;
+
+typedef struct {
+    // state array
+    uint32_t a0;
+    uint32_t b0;
+    uint32_t c0;
+    uint32_t d0;
+    uint32_t e0;
+    // temporary save
+    uint64_t msg_len, chunk_len;
+    // 512 bits per block
+    uint8_t msg[64];
+} SHA1Object;
+
+typedef struct {
+    uint32_t a0[8];
+    uint64_t msg_len, chunk_len;
+    uint8_t msg[64];
+} SHA2_32Object;
+
+typedef __uint128_t uint128_t;
+typedef struct {
+    uint64_t a0[8];
+    uint128_t msg_len;
+    uint64_t chunk_len;
+    uint8_t msg[128];
+    // dynamic initial value for sha512/t
+    uint64_t a0_iv[8];
+    size_t t;
+} SHA2_64Object;
+
+typedef struct {
+    uint32_t CAP, RATE;
+    uint8_t PAD;
+    // 24, or 12 for keccak12_diy
+    uint8_t ROUNDS;
+    uint64_t a[5][5];
+    uint64_t msg_len, chunk_len;
+    size_t hlen;
+    uint8_t msg[200];
+} SHA3Object;
+
+/* Inputs of at least this many bytes are hashed with the GIL released. */
+#define HASH_GIL_MINSIZE 2048
+/* Run statement, an update that touches no Python object, without the GIL
+ * when len is large enough for parallel hashing to pay off. */
+#define HASH_UPDATE_ALLOW_THREADS(len, statement) \
+    if ((len) >= HASH_GIL_MINSIZE) {               \
+        Py_BEGIN_ALLOW_THREADS statement;          \
+        Py_END_ALLOW_THREADS                       \
+    } else {                                       \
+        statement;                                 \
+    }
+
+/* Take the lock of an object, if it has one, for a short access to its state
+ * with the GIL held. The lock is held by threads updating without the GIL. */
+#define ENTER_HASH(obj)                               \
+    if ((obj)->lock) {                                \
+        if (!PyThread_acquire_lock((obj)->lock, 0)) { \
+            Py_BEGIN_ALLOW_THREADS                    \
+            PyThread_acquire_lock((obj)->lock, 1);    \
+            Py_END_ALLOW_THREADS                      \
+        }                                             \
+    }
+#define LEAVE_HASH(obj) \
+    if ((obj)->lock) PyThread_release_lock((obj)->lock);
+
+/* State of any hash algorithm, so that one object type serves them all. */
+typedef union {
+    MD5Object md5;
+    SHA1Object sha1;
+    SHA2_32Object sha2_32;
+    SHA2_64Object sha2_64;
+    SHA3Object sha3;
+} HashState;
+
+/* Description of a hash algorithm.
+ *
+ * init -- reset state to the initial value, return digest length in byte,
+ *         which may be 0 for variable length shake, or HASH_INVALID for
+ *         parameters out of range.
+ *         hashbit is used by sha512t and variable length shake,
+ *         capbit and pad only by keccak_diy and keccak12_diy.
+ * update -- absorb bytes, may be called repeatedly.
+ * final -- write digest to dst, then reset state.
+ * multi_lanes, multi -- optional, see multibuffer.c */
+#define HASH_INVALID ((size_t)-1)
+
+typedef struct {
+    const char* name;
+    // 0 for parameter-dependent value, computed by init
+    size_t hlen;
+    // 0 for keccak_diy, the rate is stored in state
+    size_t block_size;
+    // number of integer parameters accepted by init: 0, 1 or 3
+    int nparam;
+    size_t (*init)(HashState*, size_t hashbit, unsigned capbit, uint8_t pad);
+    uint64_t (*update)(HashState*, const uint8_t*, uint64_t);
+    void (*final)(HashState*, uint8_t*);
+    // SIMD lanes for hashing messages of equal length at once, 0 if none
+    int (*multi_lanes)(const HashState* init);
+    // hash n <= multi_lanes(init) messages of length len from fresh state
+    void (*multi)(const HashState* init, const uint8_t* const src[],
+                  uint64_t len, uint8_t* const dst[], int n);
+} HashAlgDesc;
+
+/* Compress nblocks 64-byte blocks with the SHA extensions, see shani.c */
+void SHA1_Blocks_SHANI(uint32_t st[5], const uint8_t* src, uint64_t nblocks);
+void SHA2_32_Blocks_SHANI(uint32_t st[8], const uint8_t* src,
+                          uint64_t nblocks);
+
+#define MB_MAX_LANES 8
+int SHA2_32_MultiLanes(const HashState* init);
+void SHA224_Multi(const HashState* init, const uint8_t* const src[],
+                  uint64_t len, uint8_t* const dst[], int n);
+void SHA256_Multi(const HashState* init, const uint8_t* const src[],
+                  uint64_t len, uint8_t* const dst[], int n);
+int SHA3_MultiLanes(const HashState* init);
+void SHA3_Multi(const HashState* init, const uint8_t* const src[],
+                uint64_t len, uint8_t* const dst[], int n);
+
+extern const HashAlgDesc md5_desc;
+extern const HashAlgDesc sha1_desc;
+extern const HashAlgDesc sha224_desc, sha256_desc;
+extern const HashAlgDesc sha384_desc, sha512_desc, sha512t_desc,
+    sha512_224_desc, sha512_256_desc;
+extern const HashAlgDesc sha3_224_desc, sha3_256_desc, sha3_384_desc,
+    sha3_512_desc, shake128_desc, shake256_desc, shake128l_desc,
+    shake256l_desc, rawshake128l_desc, rawshake256l_desc, keccak_diy_desc,
+    keccak12_diy_desc;
+
+/* Keccak sponge used directly by XOF objects, see sha3.c */
+const char* SHA3_XOFInit(SHA3Object* self, const char* name, unsigned capbit,
+                         uint8_t pad);
+uint64_t SHA3_HashUpdate(SHA3Object* self, const uint8_t* src,
+                         uint64_t bytelen);
+void SHA3_HashPad(SHA3Object* self);
+void SHA3_Squeeze(SHA3Object* self, uint8_t* dst, size_t len, uint32_t* pos);
+
+/* Look up algorithm by name, return NULL if not found. */
+const HashAlgDesc* HashAlg_Find(const char* name);
+size_t HashAlg_BlockSize(const HashAlgDesc* desc, const HashState* state);
+/* Get the buffer of a bytes-like object, or the utf-8 encoding of a str. */
+int HashIn_Get(PyObject* obj, Py_buffer* view);
+/* Check and convert the integer parameters of desc (hashbit, capbit, pad),
+ * then init state. Return the digest length, HASH_INVALID with an exception
+ * set. */
+size_t HashAlg_InitArgs(const HashAlgDesc* desc, HashState* state,
+                        PyObject* const* params, Py_ssize_t n);
+/* METH_FASTCALL one-shot hash: args are the message then the parameters. */
+PyObject* HashAlg_OneShot(const HashAlgDesc* desc, PyObject* const* args,
+                          Py_ssize_t nargs);
+/* Get the writable buffer out, return where len bytes at offset go. Return
+ * NULL with an exception set if they do not fit, else release view after
+ * writing. */
+uint8_t* HashOut_Get(PyObject* out, Py_ssize_t offset, size_t len,
+                     Py_buffer* view);
+
+// largest block, the rate of keccak_diy with capbit 0
+#define HMAC_MAX_BLOCK 200
+/* HMAC key: midstates after absorbing the ipad and opad blocks, cloned for
+ * every message. See hmacobject.c */
+typedef struct {
+    const HashAlgDesc* desc;
+    size_t hlen;
+    HashState inner, outer;
+} HMACKey;
+/* Return 0 if the digest is longer than a block. */
+int HMAC_SetKey(HMACKey* key, const HashAlgDesc* desc, const HashState* init,
+                size_t hlen, const uint8_t* k, size_t klen);
+/* Finish state, a clone of key->inner updated with the message. */
+void HMAC_Final(const HMACKey* key, HashState* state, uint8_t* dst);
+void HMAC_Digest(const HMACKey* key, const uint8_t* src, uint64_t len,
+                 uint8_t* dst);
+/* Set up key for algorithm name with nparam extra parameters, as hash_new.
+ * Return 0 with an exception set on error. */
+int HMAC_KeyFromName(HMACKey* key, const char* name, Py_ssize_t nparam,
+                     size_t hashbit, unsigned capbit, uint8_t pad,
+                     const Py_buffer* k);
+
+extern PyTypeObject HashType, XOFType, HMACType;
+PyObject* hash_new(PyObject* self, PyObject* const* args, Py_ssize_t nargs);
+PyObject* xof_new(PyObject* self, PyObject* args);
+PyObject* hmac_new(PyObject* self, PyObject* args);
+PyObject* hmac_digest(PyObject* self, PyObject* args);
+PyObject* pbkdf2_hmac(PyObject* self, PyObject* args);
+PyObject* hkdf_extract(PyObject* self, PyObject* args);
+PyObject* hkdf_expand(PyObject* self, PyObject* args);
+PyObject* mgf1_xor(PyObject* self, PyObject* args);
+PyObject* hash_many(PyObject* self, PyObject* args, PyObject* kwargs);
+PyObject* digest_into(PyObject* self, PyObject* args);
+PyObject* hash_file(PyObject* self, PyObject* args);
+PyObject* hash_chunks(PyObject* self, PyObject* args, PyObject* kwargs);
+#endif /* ifndef HASHOBJECT_H */
@@ -0,0 +1,138 @@
+#include <pthread.h>
+#include <unistd.h>
+#include "hashobject.h"
+
+/* Hash the chunks of one long message, the leaves of tree hashes such as
+ * ParallelHash and KangarooTwelve. The chunks are split into contiguous runs,
+ * one per worker thread, all hashed with the GIL released. Full chunks have
+ * equal length and go to the multi-buffer code where the algorithm has it. */
+
+// fewer bytes than this per thread are not worth starting one
+#define HASH_CHUNKS_MINSIZE ((size_t)64 << 10)
+#define HASH_CHUNKS_MAX_THREADS 64
+
+typedef struct {
+    const HashAlgDesc* desc;
+    const HashState* init;
+    int lanes;
+    size_t hlen, chunk;
+    // len bytes from src, digests of its chunks to dst
+    const uint8_t* src;
+    size_t len;
+    uint8_t* dst;
+} ChunkRun;
+
+static void* hash_chunk_run(void* arg) {
+    const ChunkRun* run = arg;
+    const HashAlgDesc* desc = run->desc;
+    const uint8_t* src[MB_MAX_LANES];
+    uint8_t* out[MB_MAX_LANES];
+    int lanes = run->lanes;
+    size_t nfull = run->len / run->chunk, i = 0;
+    while (lanes > 1 && nfull - i > 1) {
+        int k = nfull - i < (size_t)lanes ? (int)(nfull - i) : lanes;
+        for (int l = 0; l < k; ++l) {
+            src[l] = run->src + run->chunk * (i + l);
+            out[l] = run->dst + run->hlen * (i + l);
+        }
+        desc->multi(run->init, src, run->chunk, out, k);
+        i += k;
+    }
+    for (size_t off = run->chunk * i; off < run->len; off += run->chunk) {
+        HashState state = *run->init;
+        size_t len = run->len - off < run->chunk ? run->len - off : run->chunk;
+        desc->update(&state, run->src + off, len);
+        desc->final(&state, run->dst + run->hlen * (off / run->chunk));
+    }
+    return NULL;
+}
+
+/* Hash runs[0..n) on n threads, the calling one included. A run whose
+ * thread cannot be started is hashed by the calling thread. */
+static void hash_chunk_runs(ChunkRun* runs, int n) {
+    pthread_t tid[HASH_CHUNKS_MAX_THREADS];
+    int started[HASH_CHUNKS_MAX_THREADS];
+    for (int t = 1; t < n; ++t)
+        started[t] =
+            pthread_create(tid + t, NULL, hash_chunk_run, runs + t) == 0;
+    hash_chunk_run(runs);
+    for (int t = 1; t < n; ++t) {
+        if (started[t])
+            pthread_join(tid[t], NULL);
+        else
+            hash_chunk_run(runs + t);
+    }
+}
+
+/* hash_chunks(name, data, chunk_size, threads, *params, prefix=None)
+ *
+ * Split data into chunks of chunk_size bytes, the last one possibly shorter,
+ * and return the concatenated digests of the chunks, each hashed after
+ * prefix. threads is the most worker threads to use, 0 for the number of
+ * online CPUs. */
+PyObject* hash_chunks(PyObject* self, PyObject* args, PyObject* kwargs) {
+    static char* kwlist[] = {"", "", "", "", "", "", "", "prefix", NULL};
+    const char* name;
+    Py_buffer view, prefix = {NULL, NULL};
+    Py_ssize_t chunk, threads;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "sy*nn|kIb$z*", kwlist,
+                                     &name, &view, &chunk, &threads, &hashbit,
+                                     &capbit, &pad, &prefix))
+        return NULL;
+    PyObject* rv = NULL;
+    const HashAlgDesc* desc = HashAlg_Find(name);
+    if (!desc) {
+        PyErr_Format(PyExc_ValueError, "unsupported hash type %s", name);
+        goto done;
+    }
+    if (PyTuple_GET_SIZE(args) - 4 != desc->nparam) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)", name,
+                     desc->nparam);
+        goto done;
+    }
+    HashState init_state;
+    size_t hlen = desc->init(&init_state, hashbit, capbit, pad);
+    if (hlen == HASH_INVALID) {
+        PyErr_Format(PyExc_ValueError, "invalid parameter for %s", name);
+        goto done;
+    }
+    // the multi-buffer code starts from a fresh state only
+    int lanes = desc->multi_lanes ? desc->multi_lanes(&init_state) : 0;
+    if (prefix.buf && prefix.len) {
+        desc->update(&init_state, prefix.buf, prefix.len);
+        lanes = 0;
+    }
+    if (chunk <= 0 || threads < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "chunk size must be positive, threads non-negative");
+        goto done;
+    }
+
+    size_t len = view.len, nchunk = (len + chunk - 1) / chunk;
+    rv = PyBytes_FromStringAndSize(NULL, hlen * nchunk);
+    if (!rv || nchunk == 0) goto done;
+    if (threads == 0) threads = sysconf(_SC_NPROCESSORS_ONLN);
+    if ((size_t)threads > len / HASH_CHUNKS_MINSIZE)
+        threads = len / HASH_CHUNKS_MINSIZE;
+    if ((size_t)threads > nchunk) threads = nchunk;
+    if (threads > HASH_CHUNKS_MAX_THREADS) threads = HASH_CHUNKS_MAX_THREADS;
+    if (threads < 1) threads = 1;
+
+    ChunkRun runs[HASH_CHUNKS_MAX_THREADS];
+    uint8_t* dst = (uint8_t*)PyBytes_AS_STRING(rv);
+    for (Py_ssize_t t = 0; t < threads; ++t) {
+        size_t first = nchunk * t / threads, last = nchunk * (t + 1) / threads;
+        runs[t] = (ChunkRun){desc, &init_state, lanes, hlen, chunk};
+        runs[t].src = (const uint8_t*)view.buf + chunk * first;
+        runs[t].len = (last == nchunk ? len : chunk * last) - chunk * first;
+        runs[t].dst = dst + hlen * first;
+    }
+    HASH_UPDATE_ALLOW_THREADS(len, hash_chunk_runs(runs, threads));
+done:
+    PyBuffer_Release(&view);
+    if (prefix.obj) PyBuffer_Release(&prefix);
+    return rv;
+}
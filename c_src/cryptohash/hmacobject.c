@@ -0,0 +1,257 @@
+#include "hashobject.h"
+
+/* HMAC (RFC 2104, FIPS 198-1) over any algorithm of hash_algs. The ipad and
+ * opad blocks are absorbed once per key, every message starts from a copy
+ * of the resulting midstates. */
+
+int HMAC_SetKey(HMACKey* key, const HashAlgDesc* desc, const HashState* init,
+                size_t hlen, const uint8_t* k, size_t klen) {
+    size_t block = HashAlg_BlockSize(desc, init);
+    uint8_t pad[HMAC_MAX_BLOCK];
+    if (hlen > block) return 0;
+    key->desc = desc;
+    key->hlen = hlen;
+    memset(pad, 0, block);
+    if (klen > block) {
+        HashState tmp = *init;
+        desc->update(&tmp, k, klen);
+        desc->final(&tmp, pad);
+    } else {
+        memcpy(pad, k, klen);
+    }
+    for (size_t i = 0; i < block; ++i) pad[i] ^= 0x36;
+    key->inner = *init;
+    desc->update(&key->inner, pad, block);
+    for (size_t i = 0; i < block; ++i) pad[i] ^= 0x36 ^ 0x5c;
+    key->outer = *init;
+    desc->update(&key->outer, pad, block);
+    memset(pad, 0, block);
+    return 1;
+}
+
+void HMAC_Final(const HMACKey* key, HashState* state, uint8_t* dst) {
+    uint8_t inner_hash[HMAC_MAX_BLOCK];
+    HashState outer = key->outer;
+    key->desc->final(state, inner_hash);
+    key->desc->update(&outer, inner_hash, key->hlen);
+    key->desc->final(&outer, dst);
+}
+
+void HMAC_Digest(const HMACKey* key, const uint8_t* src, uint64_t len,
+                 uint8_t* dst) {
+    HashState state = key->inner;
+    key->desc->update(&state, src, len);
+    HMAC_Final(key, &state, dst);
+}
+
+int HMAC_KeyFromName(HMACKey* key, const char* name, Py_ssize_t nparam,
+                     size_t hashbit, unsigned capbit, uint8_t pad,
+                     const Py_buffer* k) {
+    const HashAlgDesc* desc = HashAlg_Find(name);
+    if (!desc) {
+        PyErr_Format(PyExc_ValueError, "unsupported hash type %s", name);
+        return 0;
+    }
+    if (nparam < 0) nparam = 0;
+    if (nparam != desc->nparam) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)", name,
+                     desc->nparam);
+        return 0;
+    }
+    HashState init;
+    size_t hlen = desc->init(&init, hashbit, capbit, pad);
+    // an empty digest is no use as a MAC or a mask block
+    if (hlen == 0 || hlen == HASH_INVALID) {
+        PyErr_Format(PyExc_ValueError, "invalid parameter for %s", name);
+        return 0;
+    }
+    if (!HMAC_SetKey(key, desc, &init, hlen, k->buf, k->len)) {
+        PyErr_Format(PyExc_ValueError, "%s digest longer than block", name);
+        return 0;
+    }
+    return 1;
+}
+
+typedef struct {
+    PyObject_HEAD
+    HMACKey key;
+    // inner hash of the message so far
+    HashState state;
+    PyThread_type_lock lock;
+} HMACObject;
+
+static HMACObject* HMACObject_Alloc(const HMACKey* key) {
+    HMACObject* obj = PyObject_New(HMACObject, &HMACType);
+    if (!obj) return NULL;
+    obj->key = *key;
+    obj->state = key->inner;
+    obj->lock = NULL;
+    return obj;
+}
+
+static void HMAC_dealloc(HMACObject* self) {
+    if (self->lock) PyThread_free_lock(self->lock);
+    PyObject_Free(self);
+}
+
+static PyObject* HMAC_update(HMACObject* self, PyObject* data) {
+    Py_buffer view;
+    if (PyObject_GetBuffer(data, &view, PyBUF_SIMPLE) < 0) return NULL;
+    if (!self->lock && view.len >= HASH_GIL_MINSIZE)
+        self->lock = PyThread_allocate_lock();
+    if (self->lock) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(self->lock, 1);
+        self->key.desc->update(&self->state, view.buf, view.len);
+        PyThread_release_lock(self->lock);
+        Py_END_ALLOW_THREADS
+    } else {
+        self->key.desc->update(&self->state, view.buf, view.len);
+    }
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
+
+static PyObject* HMAC_copy(HMACObject* self, PyObject* unused) {
+    HMACObject* obj = HMACObject_Alloc(&self->key);
+    if (!obj) return NULL;
+    ENTER_HASH(self);
+    obj->state = self->state;
+    LEAVE_HASH(self);
+    return (PyObject*)obj;
+}
+
+/* new(data=None), a fresh object with the same key */
+static PyObject* HMAC_new(HMACObject* self, PyObject* args) {
+    Py_buffer view = {NULL, NULL};
+    if (!PyArg_ParseTuple(args, "|z*", &view)) return NULL;
+    HMACObject* obj = HMACObject_Alloc(&self->key);
+    if (obj && view.buf) {
+        HASH_UPDATE_ALLOW_THREADS(
+            view.len,
+            obj->key.desc->update(&obj->state, view.buf, view.len));
+    }
+    if (view.obj) PyBuffer_Release(&view);
+    return (PyObject*)obj;
+}
+
+static PyObject* HMAC_digest(HMACObject* self, PyObject* unused) {
+    HashState tmp;
+    ENTER_HASH(self);
+    tmp = self->state;
+    LEAVE_HASH(self);
+    PyObject* rv = PyBytes_FromStringAndSize(NULL, self->key.hlen);
+    if (!rv) return NULL;
+    HMAC_Final(&self->key, &tmp, (uint8_t*)PyBytes_AS_STRING(rv));
+    return rv;
+}
+
+/* digest_into(out, offset=0) -> number of bytes written */
+static PyObject* HMAC_digest_into(HMACObject* self, PyObject* args) {
+    PyObject* out;
+    Py_ssize_t offset = 0;
+    if (!PyArg_ParseTuple(args, "O|n", &out, &offset)) return NULL;
+    HashState tmp;
+    ENTER_HASH(self);
+    tmp = self->state;
+    LEAVE_HASH(self);
+    Py_buffer view;
+    uint8_t* dst = HashOut_Get(out, offset, self->key.hlen, &view);
+    if (!dst) return NULL;
+    HMAC_Final(&self->key, &tmp, dst);
+    PyBuffer_Release(&view);
+    return PyLong_FromSize_t(self->key.hlen);
+}
+
+static PyObject* HMAC_hexdigest(HMACObject* self, PyObject* unused) {
+    PyObject* digest = HMAC_digest(self, NULL);
+    if (!digest) return NULL;
+    PyObject* rv = PyObject_CallMethod(digest, "hex", NULL);
+    Py_DECREF(digest);
+    return rv;
+}
+
+static PyObject* HMAC_get_name(HMACObject* self, void* closure) {
+    return PyUnicode_FromFormat("hmac-%s", self->key.desc->name);
+}
+static PyObject* HMAC_get_digest_size(HMACObject* self, void* closure) {
+    return PyLong_FromSize_t(self->key.hlen);
+}
+static PyObject* HMAC_get_block_size(HMACObject* self, void* closure) {
+    return PyLong_FromSize_t(
+        HashAlg_BlockSize(self->key.desc, &self->key.inner));
+}
+
+static PyMethodDef HMAC_methods[] = {
+    {"update", (PyCFunction)HMAC_update, METH_O, NULL},
+    {"copy", (PyCFunction)HMAC_copy, METH_NOARGS, NULL},
+    {"new", (PyCFunction)HMAC_new, METH_VARARGS, NULL},
+    {"digest", (PyCFunction)HMAC_digest, METH_NOARGS, NULL},
+    {"digest_into", (PyCFunction)HMAC_digest_into, METH_VARARGS, NULL},
+    {"hexdigest", (PyCFunction)HMAC_hexdigest, METH_NOARGS, NULL},
+    {NULL, NULL, 0, NULL}};
+
+static PyGetSetDef HMAC_getset[] = {
+    {"name", (getter)HMAC_get_name, NULL, NULL, NULL},
+    {"digest_size", (getter)HMAC_get_digest_size, NULL, NULL, NULL},
+    {"block_size", (getter)HMAC_get_block_size, NULL, NULL, NULL},
+    {NULL, NULL, NULL, NULL, NULL}};
+
+PyTypeObject HMACType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "cryptohash.HMAC",
+    .tp_basicsize = sizeof(HMACObject),
+    .tp_dealloc = (destructor)HMAC_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_methods = HMAC_methods,
+    .tp_getset = HMAC_getset,
+};
+
+/* hmac_new(name, key, data=None, hashbit=0, capbit=0, pad=0) */
+PyObject* hmac_new(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer k, view = {NULL, NULL};
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sy*|z*kIb", &name, &k, &view, &hashbit,
+                          &capbit, &pad))
+        return NULL;
+    HMACKey key;
+    HMACObject* obj = NULL;
+    if (HMAC_KeyFromName(&key, name, PyTuple_GET_SIZE(args) - 3, hashbit,
+                         capbit, pad, &k))
+        obj = HMACObject_Alloc(&key);
+    if (obj && view.buf) {
+        HASH_UPDATE_ALLOW_THREADS(
+            view.len, key.desc->update(&obj->state, view.buf, view.len));
+    }
+    PyBuffer_Release(&k);
+    if (view.obj) PyBuffer_Release(&view);
+    return (PyObject*)obj;
+}
+
+/* hmac(name, key, data, hashbit=0, capbit=0, pad=0) -> bytes */
+PyObject* hmac_digest(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer k, view;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sy*y*|kIb", &name, &k, &view, &hashbit,
+                          &capbit, &pad))
+        return NULL;
+    HMACKey key;
+    PyObject* rv = NULL;
+    if (HMAC_KeyFromName(&key, name, PyTuple_GET_SIZE(args) - 3, hashbit,
+                         capbit, pad, &k))
+        rv = PyBytes_FromStringAndSize(NULL, key.hlen);
+    if (rv) {
+        uint8_t* dst = (uint8_t*)PyBytes_AS_STRING(rv);
+        HASH_UPDATE_ALLOW_THREADS(
+            view.len, HMAC_Digest(&key, view.buf, view.len, dst));
+    }
+    PyBuffer_Release(&k);
+    PyBuffer_Release(&view);
+    return rv;
+}
@@ -0,0 +1,147 @@
+#include "hashobject.h"
+
+/* Key derivation on HMAC midstates: PBKDF2 (RFC 8018) and HKDF (RFC 5869).
+ * The loops run without the GIL. */
+
+static void PBKDF2(const HMACKey* key, const uint8_t* salt, size_t salt_len,
+                   size_t iterations, uint8_t* dst, size_t dklen) {
+    uint8_t u[HMAC_MAX_BLOCK], t[HMAC_MAX_BLOCK], index[4];
+    size_t hlen = key->hlen;
+    for (uint32_t i = 1; dklen; ++i) {
+        HashState state = key->inner;
+        for (int j = 0; j < 4; ++j) index[j] = i >> (24 - (j << 3));
+        key->desc->update(&state, salt, salt_len);
+        key->desc->update(&state, index, 4);
+        HMAC_Final(key, &state, u);
+        memcpy(t, u, hlen);
+        for (size_t j = 1; j < iterations; ++j) {
+            HMAC_Digest(key, u, hlen, u);
+            for (size_t k = 0; k < hlen; ++k) t[k] ^= u[k];
+        }
+        size_t n = dklen < hlen ? dklen : hlen;
+        memcpy(dst, t, n);
+        dst += n;
+        dklen -= n;
+    }
+}
+
+static void HKDF_Expand(const HMACKey* key, const uint8_t* info,
+                        size_t info_len, uint8_t* dst, size_t len) {
+    uint8_t t[HMAC_MAX_BLOCK];
+    size_t tlen = 0;
+    for (uint8_t i = 1; len; ++i) {
+        HashState state = key->inner;
+        key->desc->update(&state, t, tlen);
+        key->desc->update(&state, info, info_len);
+        key->desc->update(&state, &i, 1);
+        HMAC_Final(key, &state, t);
+        tlen = key->hlen;
+        size_t n = len < tlen ? len : tlen;
+        memcpy(dst, t, n);
+        dst += n;
+        len -= n;
+    }
+}
+
+/* pbkdf2_hmac(name, password, salt, iterations, dklen, *params) -> bytes
+ *
+ * dklen 0 means the digest length. */
+PyObject* pbkdf2_hmac(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer password, salt;
+    Py_ssize_t iterations, dklen;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sy*y*nn|kIb", &name, &password, &salt,
+                          &iterations, &dklen, &hashbit, &capbit, &pad))
+        return NULL;
+    HMACKey key;
+    PyObject* rv = NULL;
+    if (iterations < 1) {
+        PyErr_SetString(PyExc_ValueError, "iterations must be positive");
+        goto done;
+    }
+    if (dklen < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative dklen");
+        goto done;
+    }
+    if (!HMAC_KeyFromName(&key, name, PyTuple_GET_SIZE(args) - 5, hashbit,
+                          capbit, pad, &password))
+        goto done;
+    if (dklen == 0) dklen = key.hlen;
+    if ((size_t)dklen > (size_t)UINT32_MAX * key.hlen) {
+        PyErr_SetString(PyExc_OverflowError, "dklen too large");
+        goto done;
+    }
+    rv = PyBytes_FromStringAndSize(NULL, dklen);
+    if (!rv) goto done;
+    uint8_t* dst = (uint8_t*)PyBytes_AS_STRING(rv);
+    HASH_UPDATE_ALLOW_THREADS(
+        (size_t)iterations * dklen,
+        PBKDF2(&key, salt.buf, salt.len, iterations, dst, dklen));
+done:
+    PyBuffer_Release(&password);
+    PyBuffer_Release(&salt);
+    return rv;
+}
+
+/* hkdf_extract(name, salt, ikm, *params) -> prk
+ *
+ * salt None means hlen zero bytes, which pad to the same HMAC key as an
+ * empty salt. */
+PyObject* hkdf_extract(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer salt = {NULL, NULL}, ikm;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sz*y*|kIb", &name, &salt, &ikm, &hashbit,
+                          &capbit, &pad))
+        return NULL;
+    HMACKey key;
+    PyObject* rv = NULL;
+    if (HMAC_KeyFromName(&key, name, PyTuple_GET_SIZE(args) - 3, hashbit,
+                         capbit, pad, &salt))
+        rv = PyBytes_FromStringAndSize(NULL, key.hlen);
+    if (rv) {
+        uint8_t* dst = (uint8_t*)PyBytes_AS_STRING(rv);
+        HASH_UPDATE_ALLOW_THREADS(
+            ikm.len, HMAC_Digest(&key, ikm.buf, ikm.len, dst));
+    }
+    if (salt.obj) PyBuffer_Release(&salt);
+    PyBuffer_Release(&ikm);
+    return rv;
+}
+
+/* hkdf_expand(name, prk, info, length, *params) -> okm */
+PyObject* hkdf_expand(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer prk, info;
+    Py_ssize_t len;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sy*y*n|kIb", &name, &prk, &info, &len,
+                          &hashbit, &capbit, &pad))
+        return NULL;
+    HMACKey key;
+    PyObject* rv = NULL;
+    if (!HMAC_KeyFromName(&key, name, PyTuple_GET_SIZE(args) - 4, hashbit,
+                          capbit, pad, &prk))
+        goto done;
+    if (len < 0 || (size_t)len > 255 * key.hlen) {
+        PyErr_Format(PyExc_ValueError, "length must be at most %zu",
+                     255 * key.hlen);
+        goto done;
+    }
+    rv = PyBytes_FromStringAndSize(NULL, len);
+    if (!rv) goto done;
+    uint8_t* dst = (uint8_t*)PyBytes_AS_STRING(rv);
+    HASH_UPDATE_ALLOW_THREADS(len + info.len,
+                              HKDF_Expand(&key, info.buf, info.len, dst, len));
+done:
+    PyBuffer_Release(&prk);
+    PyBuffer_Release(&info);
+    return rv;
+}
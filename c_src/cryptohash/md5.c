@@ -1,10 +1,5 @@
-#include "array_read.h"
+#include "hashobject.h"
 // precomputed constants
-static const uint8_t S[64] = {
-    7, 12, 17, 22, 7, 12, 17, 22, 7, 12, 17, 22, 7, 12, 17, 22,
-    5, 9,  14, 20, 5, 9,  14, 20, 5, 9,  14, 20, 5, 9,  14, 20,
-    4, 11, 16, 23, 4, 11, 16, 23, 4, 11, 16, 23, 4, 11, 16, 23,
-    6, 10, 15, 21, 6, 10, 15, 21, 6, 10, 15, 21, 6, 10, 15, 21};
 static const uint32_t K[64] = {
     0xd76aa478, 0xe8c7b756, 0x242070db, 0xc1bdceee, 0xf57c0faf, 0x4787c62a,
     0xa8304613, 0xfd469501, 0x698098d8, 0x8b44f7af, 0xffff5bb1, 0x895cd7be,
@@ -22,71 +17,71 @@ static const uint32_t b0_iv = 0xefcdab89;
 static const uint32_t c0_iv = 0x98badcfe;
 static const uint32_t d0_iv = 0x10325476;
 
-typedef struct {
-    // state array
-    uint32_t a0;
-    uint32_t b0;
-    uint32_t c0;
-    uint32_t d0;
-    // temporary save
-    uint64_t msg_len, chunk_len;
-    // 512 bits per block
-    uint8_t msg[64];
-} MD5Object;
-
 static const size_t md5_hlen = 16;
 
-void MD5_HashProcess(MD5Object* self) {
-    uint32_t a, b, c, d;
-    a = self->a0;
-    b = self->b0;
-    c = self->c0;
-    d = self->d0;
-    uint32_t f;
-    uint32_t j;
-    for (uint8_t i = 0; i < 64; ++i) {
-        if (i < 16) {
-            f = (b & c) | (~b & d);
-            j = i;
-        } else if (i < 32) {
-            f = (d & b) | (~d & c);
-            j = (uint32_t)(i << 2) + i + 1;
-        } else if (i < 48) {
-            f = b ^ c ^ d;
-            j = i + i + i + 5;
-        } else {
-            f = c ^ (b | ~d);
-            j = (uint32_t)(i << 3) - i;
-        }
-        j = (j & 15) << 2;
-        f += a + self->msg[j] + (uint32_t)(self->msg[j + 1] << 8) +
-             (uint32_t)(self->msg[j + 2] << 16) + (uint32_t)(self->msg[j + 3] << 24) +
-             K[i];
-        a = d;
-        d = c;
-        c = b;
-        b += (f << S[i]) | (f >> (32 - S[i]));
+#define MD5_F(b, c, d) ((d) ^ ((b) & ((c) ^ (d))))
+#define MD5_G(b, c, d) ((c) ^ ((d) & ((b) ^ (c))))
+#define MD5_H(b, c, d) ((b) ^ (c) ^ (d))
+#define MD5_I(b, c, d) ((c) ^ ((b) | ~(d)))
+#define MD5_STEP(f, a, b, c, d, x, k, s) \
+    a += f(b, c, d) + w[x] + (k);         \
+    a = LeftRotate32(a, s) + (b)
+// four steps, rotating the roles of a, b, c, d instead of the values
+#define MD5_STEP4(f, i, x0, x1, x2, x3, s0, s1, s2, s3) \
+    MD5_STEP(f, a, b, c, d, x0, K[i], s0);              \
+    MD5_STEP(f, d, a, b, c, x1, K[(i) + 1], s1);        \
+    MD5_STEP(f, c, d, a, b, x2, K[(i) + 2], s2);        \
+    MD5_STEP(f, b, c, d, a, x3, K[(i) + 3], s3)
+
+/* Process nblocks 64-byte blocks read directly from src. */
+static void MD5_Blocks(MD5Object* self, const uint8_t* src, uint64_t nblocks) {
+    uint32_t a, b, c, d, w[16];
+    for (; nblocks; --nblocks, src += 64) {
+        for (int i = 0; i < 16; ++i) w[i] = LoadLE32(src + (i << 2));
+        a = self->a0;
+        b = self->b0;
+        c = self->c0;
+        d = self->d0;
+        MD5_STEP4(MD5_F, 0, 0, 1, 2, 3, 7, 12, 17, 22);
+        MD5_STEP4(MD5_F, 4, 4, 5, 6, 7, 7, 12, 17, 22);
+        MD5_STEP4(MD5_F, 8, 8, 9, 10, 11, 7, 12, 17, 22);
+        MD5_STEP4(MD5_F, 12, 12, 13, 14, 15, 7, 12, 17, 22);
+        MD5_STEP4(MD5_G, 16, 1, 6, 11, 0, 5, 9, 14, 20);
+        MD5_STEP4(MD5_G, 20, 5, 10, 15, 4, 5, 9, 14, 20);
+        MD5_STEP4(MD5_G, 24, 9, 14, 3, 8, 5, 9, 14, 20);
+        MD5_STEP4(MD5_G, 28, 13, 2, 7, 12, 5, 9, 14, 20);
+        MD5_STEP4(MD5_H, 32, 5, 8, 11, 14, 4, 11, 16, 23);
+        MD5_STEP4(MD5_H, 36, 1, 4, 7, 10, 4, 11, 16, 23);
+        MD5_STEP4(MD5_H, 40, 13, 0, 3, 6, 4, 11, 16, 23);
+        MD5_STEP4(MD5_H, 44, 9, 12, 15, 2, 4, 11, 16, 23);
+        MD5_STEP4(MD5_I, 48, 0, 7, 14, 5, 6, 10, 15, 21);
+        MD5_STEP4(MD5_I, 52, 12, 3, 10, 1, 6, 10, 15, 21);
+        MD5_STEP4(MD5_I, 56, 8, 15, 6, 13, 6, 10, 15, 21);
+        MD5_STEP4(MD5_I, 60, 4, 11, 2, 9, 6, 10, 15, 21);
+        self->a0 += a;
+        self->b0 += b;
+        self->c0 += c;
+        self->d0 += d;
     }
-    self->a0 += a;
-    self->b0 += b;
-    self->c0 += c;
-    self->d0 += d;
 }
+void MD5_HashProcess(MD5Object* self) { MD5_Blocks(self, self->msg, 1); }
 uint64_t MD5_HashUpdate(MD5Object* self, const uint8_t* src, uint64_t bytelen) {
     if (!src) return self->msg_len;
-    uint64_t old_chunk = self->chunk_len;
-    const uint8_t* max_pos = src + bytelen;
-    self->chunk_len =
-        read_from_arr(self->msg + old_chunk, 64 - old_chunk, src, max_pos);
-    src += self->chunk_len;
-    self->msg_len += self->chunk_len << 3;
-    if (old_chunk + self->chunk_len < 64) return self->msg_len;
-    do {
+    self->msg_len += bytelen << 3;
+    if (self->chunk_len) {
+        uint64_t count = 64 - self->chunk_len;
+        if (count > bytelen) count = bytelen;
+        memcpy(self->msg + self->chunk_len, src, count);
+        self->chunk_len += count;
+        src += count;
+        bytelen -= count;
+        if (self->chunk_len < 64) return self->msg_len;
         MD5_HashProcess(self);
-        self->chunk_len = read_from_arr(self->msg, 64, src, max_pos);
-        src += self->chunk_len;
-        self->msg_len += self->chunk_len << 3;
-    } while (self->chunk_len >= 64);
+    }
+    // whole blocks straight from the caller's buffer
+    MD5_Blocks(self, src, bytelen >> 6);
+    self->chunk_len = bytelen & 63;
+    memcpy(self->msg, src + bytelen - self->chunk_len, self->chunk_len);
     return self->msg_len;
 }
 uint64_t MD5_HashFinal(MD5Object* self, uint8_t* dst) {
@@ -137,15 +132,18 @@ uint64_t MD5_HashFinal(MD5Object* self, uint8_t* dst) {
     return len_tmp;
 }
 
-PyObject* md5(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
+static size_t MD5_Init(HashState* self, size_t hashbit, unsigned capbit,
+                       uint8_t pad) {
     MD5Object obj = {a0_iv, b0_iv, c0_iv, d0_iv, 0, 0, {0}};
-    MD5_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(md5_hlen);
-    MD5_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, md5_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+    self->md5 = obj;
+    return md5_hlen;
+}
+static uint64_t MD5_Update(HashState* self, const uint8_t* src,
+                           uint64_t bytelen) {
+    return MD5_HashUpdate(&self->md5, src, bytelen);
+}
+static void MD5_Final(HashState* self, uint8_t* dst) {
+    MD5_HashFinal(&self->md5, dst);
 }
+const HashAlgDesc md5_desc = {"md5",     16,        64,       0,
+                              MD5_Init, MD5_Update, MD5_Final};
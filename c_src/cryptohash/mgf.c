@@ -0,0 +1,76 @@
+#include "hashobject.h"
+
+/* Mask generation function MGF1 (RFC 8017 B.2.1), XORed into its target as
+ * it is generated, so that neither the mask nor the seed || counter inputs
+ * are ever built. The seed is absorbed once, each block is a clone of that
+ * state finished after the 4-byte counter. */
+
+static void MGF1_Xor(const HashAlgDesc* desc, const HashState* seeded,
+                     size_t hlen, uint8_t* block, uint8_t* dst, size_t len) {
+    uint8_t counter[4];
+    for (uint32_t i = 0; len; ++i) {
+        HashState state = *seeded;
+        for (int j = 0; j < 4; ++j) counter[j] = i >> (24 - (j << 3));
+        desc->update(&state, counter, 4);
+        desc->final(&state, block);
+        size_t n = len < hlen ? len : hlen;
+        for (size_t k = 0; k < n; ++k) dst[k] ^= block[k];
+        dst += n;
+        len -= n;
+    }
+}
+
+/* mgf1_xor(name, seed, target, *params)
+ *
+ * XOR MGF1(seed, len(target)) into the writable buffer target in place. */
+PyObject* mgf1_xor(PyObject* self, PyObject* args) {
+    const char* name;
+    Py_buffer seed, target;
+    size_t hashbit = 0;
+    unsigned capbit = 0;
+    uint8_t pad = 0;
+    if (!PyArg_ParseTuple(args, "sy*w*|kIb", &name, &seed, &target, &hashbit,
+                          &capbit, &pad))
+        return NULL;
+    PyObject* rv = NULL;
+    const HashAlgDesc* desc = HashAlg_Find(name);
+    if (!desc) {
+        PyErr_Format(PyExc_ValueError, "unsupported hash type %s", name);
+        goto done;
+    }
+    if (PyTuple_GET_SIZE(args) - 3 != desc->nparam) {
+        PyErr_Format(PyExc_TypeError, "%s requires %d parameter(s)", name,
+                     desc->nparam);
+        goto done;
+    }
+    HashState state;
+    size_t hlen = desc->init(&state, hashbit, capbit, pad);
+    // an empty digest is no use as a MAC or a mask block
+    if (hlen == 0 || hlen == HASH_INVALID) {
+        PyErr_Format(PyExc_ValueError, "invalid parameter for %s", name);
+        goto done;
+    }
+    size_t len = target.len;
+    if (len > ((size_t)hlen << 32)) {
+        PyErr_SetString(PyExc_ValueError, "mask too long");
+        goto done;
+    }
+    // digests of XOFs with long outputs do not fit on the stack
+    uint8_t stack_block[64];
+    uint8_t* block = hlen <= sizeof(stack_block) ? stack_block
+                                                 : PyMem_Malloc(hlen);
+    if (!block) {
+        PyErr_NoMemory();
+        goto done;
+    }
+    desc->update(&state, seed.buf, seed.len);
+    HASH_UPDATE_ALLOW_THREADS(
+        len, MGF1_Xor(desc, &state, hlen, block, target.buf, len));
+    if (block != stack_block) PyMem_Free(block);
+    Py_INCREF(Py_None);
+    rv = Py_None;
+done:
+    PyBuffer_Release(&seed);
+    PyBuffer_Release(&target);
+    return rv;
+}
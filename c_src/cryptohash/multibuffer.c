@@ -0,0 +1,116 @@
+#include "cpu.h"
+#include "hashobject.h"
+
+/* Multi-buffer hashing: compress several independent messages of the same
+ * length at once, one message per SIMD lane. Used by hash_many, which sees
+ * many short messages of equal length in MGF1 and Merkle trees. */
+
+extern const uint32_t SHA2_32_K[64];
+extern const uint64_t iota_rc[24];
+
+#if defined(__x86_64__) && defined(__GNUC__)
+#define MB_ENABLED 1
+#define MB_ROTR32(x, n) (((x) >> (n)) | ((x) << (32 - (n))))
+#define MB_ROTL64(x, n) (((x) << (n)) | ((x) >> (64 - (n))))
+
+// lane x + 5y, rotation offset and destination after step pi
+static const uint8_t keccak_rho[25] = {0,  1,  62, 28, 27, 36, 44, 6,  55,
+                                       20, 3,  10, 43, 25, 39, 41, 45, 15,
+                                       21, 8,  18, 2,  61, 56, 14};
+static const uint8_t keccak_pi[25] = {0,  10, 20, 5,  15, 16, 1,  11, 21,
+                                      6,  7,  17, 2,  12, 22, 23, 8,  18,
+                                      3,  13, 14, 24, 9,  19, 4};
+
+#define MB_LANES 8
+#define MB_SUFFIX avx2
+#define MB_TARGET __attribute__((target("avx2")))
+#include "multibuffer_impl.h"
+#undef MB_LANES
+#undef MB_SUFFIX
+#undef MB_TARGET
+
+// SSE2 is always available on x86-64
+#define MB_LANES 4
+#define MB_SUFFIX sse2
+#define MB_TARGET
+#include "multibuffer_impl.h"
+#undef MB_LANES
+#undef MB_SUFFIX
+#undef MB_TARGET
+#else
+#define MB_ENABLED 0
+#endif
+
+int SHA2_32_MultiLanes(const HashState* init) {
+    // single-buffer SHA-NI beats eight AVX2 lanes but for tiny messages
+    if (!MB_ENABLED || cpu_enabled[CPU_SHA]) return 0;
+    if (cpu_enabled[CPU_AVX2]) return 8;
+    if (cpu_enabled[CPU_SSE2]) return 4;
+    return 0;
+}
+
+/* Hash n messages of length len, require n <= SHA2_32_MultiLanes(init). */
+static void SHA2_32_Multi(const HashState* init, const uint8_t* const src[],
+                          uint64_t len, uint8_t* const dst[], int n,
+                          size_t hlen) {
+#if MB_ENABLED
+    int lanes = SHA2_32_MultiLanes(init);
+    void (*blocks)(uint32_t[8][MB_MAX_LANES], const uint8_t* const[],
+                   uint64_t) =
+        lanes == 8 ? SHA2_32_Blocks_avx2 : SHA2_32_Blocks_sse2;
+    uint32_t st[8][MB_MAX_LANES];
+    const uint8_t* p[MB_MAX_LANES];
+    uint8_t tail[MB_MAX_LANES][128];
+    uint64_t nblocks = len >> 6, rem = len & 63;
+    uint64_t tail_len = rem < 56 ? 64 : 128;
+    uint64_t bitlen = init->sha2_32.msg_len + (len << 3);
+    // unused lanes repeat the first message
+    for (int l = 0; l < lanes; ++l) p[l] = src[l < n ? l : 0];
+    for (int i = 0; i < 8; ++i)
+        for (int l = 0; l < lanes; ++l) st[i][l] = init->sha2_32.a0[i];
+    blocks(st, p, nblocks);
+    for (int l = 0; l < n; ++l) {
+        memcpy(tail[l], p[l] + (nblocks << 6), rem);
+        tail[l][rem] = 0x80;
+        memset(tail[l] + rem + 1, 0, tail_len - rem - 1);
+        for (int i = 0; i < 8; ++i)
+            tail[l][tail_len - 1 - i] = bitlen >> (i << 3);
+        p[l] = tail[l];
+    }
+    for (int l = n; l < lanes; ++l) p[l] = tail[0];
+    blocks(st, p, tail_len >> 6);
+    for (int l = 0; l < n; ++l)
+        for (size_t i = 0; i < hlen; ++i)
+            dst[l][i] = st[i >> 2][l] >> (24 - ((i & 3) << 3));
+#endif
+}
+void SHA224_Multi(const HashState* init, const uint8_t* const src[],
+                  uint64_t len, uint8_t* const dst[], int n) {
+    SHA2_32_Multi(init, src, len, dst, n, 28);
+}
+void SHA256_Multi(const HashState* init, const uint8_t* const src[],
+                  uint64_t len, uint8_t* const dst[], int n) {
+    SHA2_32_Multi(init, src, len, dst, n, 32);
+}
+
+int SHA3_MultiLanes(const HashState* init) {
+    // lanes are loaded in whole words
+    if (!MB_ENABLED || init->sha3.RATE & 7) return 0;
+    if (cpu_enabled[CPU_AVX2]) return 4;
+    if (cpu_enabled[CPU_SSE2]) return 2;
+    return 0;
+}
+
+/* Hash n messages of length len, require n <= SHA3_MultiLanes(init). */
+void SHA3_Multi(const HashState* init, const uint8_t* const src[],
+                uint64_t len, uint8_t* const dst[], int n) {
+#if MB_ENABLED
+    int lanes = SHA3_MultiLanes(init);
+    const uint8_t* p[MB_MAX_LANES];
+    for (int l = 0; l < lanes; ++l) p[l] = src[l < n ? l : 0];
+    if (lanes == 4)
+        SHA3_Multi_avx2(&init->sha3, p, len, dst, n);
+    else
+        SHA3_Multi_sse2(&init->sha3, p, len, dst, n);
+#endif
+}
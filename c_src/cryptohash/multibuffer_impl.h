@@ -0,0 +1,141 @@
+/* Multi-buffer compression functions, included by multibuffer.c once per
+ * instruction set. Every vector holds the same word of MB_LANES (32-bit) or
+ * MB_LANES / 2 (64-bit) independent messages.
+ *
+ * Requires MB_LANES, MB_SUFFIX and MB_TARGET to be defined. */
+#define MB_CAT_(a, b) a##_##b
+#define MB_CAT(a, b) MB_CAT_(a, b)
+#define MB_FN(name) MB_CAT(name, MB_SUFFIX)
+
+typedef uint32_t MB_FN(U32V) __attribute__((vector_size(MB_LANES * 4)));
+typedef uint64_t MB_FN(U64V) __attribute__((vector_size(MB_LANES * 4)));
+
+/* Compress nblocks consecutive 64-byte blocks starting at src[l] for every
+ * lane l. st[i][l] is word i of the state of lane l. */
+MB_TARGET static void MB_FN(SHA2_32_Blocks)(uint32_t st[8][MB_MAX_LANES],
+                                            const uint8_t* const src[],
+                                            uint64_t nblocks) {
+    typedef MB_FN(U32V) V;
+    V s[8], w[16], a, b, c, d, e, f, g, h, t1, t2;
+    for (int i = 0; i < 8; ++i)
+        for (int l = 0; l < MB_LANES; ++l) s[i][l] = st[i][l];
+    for (uint64_t blk = 0; blk < nblocks; ++blk) {
+        for (int i = 0; i < 16; ++i)
+            for (int l = 0; l < MB_LANES; ++l)
+                w[i][l] = LoadBE32(src[l] + (blk << 6) + (i << 2));
+        a = s[0];
+        b = s[1];
+        c = s[2];
+        d = s[3];
+        e = s[4];
+        f = s[5];
+        g = s[6];
+        h = s[7];
+        for (int i = 0; i < 64; ++i) {
+            if (i >= 16) {
+                V w15 = w[(i - 15) & 15], w2 = w[(i - 2) & 15];
+                w[i & 15] += w[(i - 7) & 15] +
+                             (MB_ROTR32(w15, 7) ^ MB_ROTR32(w15, 18) ^
+                              (w15 >> 3)) +
+                             (MB_ROTR32(w2, 17) ^ MB_ROTR32(w2, 19) ^
+                              (w2 >> 10));
+            }
+            t1 = h + SHA2_32_K[i] + w[i & 15] +
+                 (MB_ROTR32(e, 6) ^ MB_ROTR32(e, 11) ^ MB_ROTR32(e, 25)) +
+                 ((e & f) ^ (~e & g));
+            t2 = (MB_ROTR32(a, 2) ^ MB_ROTR32(a, 13) ^ MB_ROTR32(a, 22)) +
+                 ((a & b) ^ (a & c) ^ (b & c));
+            h = g;
+            g = f;
+            f = e;
+            e = d + t1;
+            d = c;
+            c = b;
+            b = a;
+            a = t1 + t2;
+        }
+        s[0] += a;
+        s[1] += b;
+        s[2] += c;
+        s[3] += d;
+        s[4] += e;
+        s[5] += f;
+        s[6] += g;
+        s[7] += h;
+    }
+    for (int i = 0; i < 8; ++i)
+        for (int l = 0; l < MB_LANES; ++l) st[i][l] = s[i][l];
+}
+
+MB_TARGET static void MB_FN(KeccakPermutation)(MB_FN(U64V) * a,
+                                               int rounds) {
+    typedef MB_FN(U64V) V;
+    V b[25], c[5], d[5];
+    for (int r = 24 - rounds; r < 24; ++r) {
+        // theta
+        for (int x = 0; x < 5; ++x)
+            c[x] = a[x] ^ a[x + 5] ^ a[x + 10] ^ a[x + 15] ^ a[x + 20];
+        for (int x = 0; x < 5; ++x)
+            d[x] = c[(x + 4) % 5] ^ MB_ROTL64(c[(x + 1) % 5], 1);
+        for (int i = 0; i < 25; ++i) a[i] ^= d[i % 5];
+        // rho and pi
+        b[0] = a[0];
+        for (int i = 1; i < 25; ++i)
+            b[keccak_pi[i]] = MB_ROTL64(a[i], keccak_rho[i]);
+        // chi
+        for (int y = 0; y < 25; y += 5)
+            for (int x = 0; x < 5; ++x)
+                a[y + x] =
+                    b[y + x] ^ (~b[y + (x + 1) % 5] & b[y + (x + 2) % 5]);
+        // iota
+        a[0] ^= iota_rc[r];
+    }
+}
+
+/* Keccak sponge over MB_LANES / 2 messages of length len, starting from the
+ * (fresh) state init. Writes init->hlen bytes to dst[l] for the first n
+ * lanes, the others are computed and discarded. */
+MB_TARGET static void MB_FN(SHA3_Multi)(const SHA3Object* init,
+                                        const uint8_t* const src[],
+                                        uint64_t len, uint8_t* const dst[],
+                                        int n) {
+    typedef MB_FN(U64V) V;
+    enum { lanes = MB_LANES / 2 };
+    V a[25];
+    uint8_t tail[lanes][200];
+    uint32_t rate = init->RATE;
+    for (int i = 0; i < 25; ++i)
+        for (int l = 0; l < lanes; ++l) a[i][l] = init->a[i % 5][i / 5];
+    uint64_t off = 0;
+    for (; len - off >= rate; off += rate) {
+        for (uint32_t i = 0; i < (rate >> 3); ++i)
+            for (int l = 0; l < lanes; ++l)
+                a[i][l] ^= LoadLE64(src[l] + off + (i << 3));
+        MB_FN(KeccakPermutation)(a, init->ROUNDS);
+    }
+    // padding
+    for (int l = 0; l < lanes; ++l) {
+        memset(tail[l], 0, rate);
+        memcpy(tail[l], src[l] + off, len - off);
+        tail[l][len - off] = init->PAD;
+        tail[l][rate - 1] |= 0x80;
+    }
+    for (uint32_t i = 0; i < (rate >> 3); ++i)
+        for (int l = 0; l < lanes; ++l)
+            a[i][l] ^= LoadLE64(tail[l] + (i << 3));
+    MB_FN(KeccakPermutation)(a, init->ROUNDS);
+    // squeeze
+    uint32_t k = 0;
+    for (size_t i = 0; i < init->hlen; ++i, ++k) {
+        if (k == rate) {
+            MB_FN(KeccakPermutation)(a, init->ROUNDS);
+            k = 0;
+        }
+        for (int l = 0; l < n; ++l)
+            dst[l][i] = a[k >> 3][l] >> ((k & 7) << 3);
+    }
+}
+
+#undef MB_CAT_
+#undef MB_CAT
+#undef MB_FN
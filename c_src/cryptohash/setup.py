@@ -2,7 +2,24 @@ import distutils.core
 
 module1 = distutils.core.Extension(
     "cryptohash",
-    sources=["cryptohash.c", "md5.c", "sha1.c", "sha2_32.c", "sha2_64.c", "sha3.c"],
+    sources=[
+        "cryptohash.c",
+        "hashobject.c",
+        "hashbatch.c",
+        "hashfile.c",
+        "hashtree.c",
+        "hmacobject.c",
+        "kdf.c",
+        "mgf.c",
+        "cpu.c",
+        "multibuffer.c",
+        "shani.c",
+        "md5.c",
+        "sha1.c",
+        "sha2_32.c",
+        "sha2_64.c",
+        "sha3.c",
+    ],
 )
 
 distutils.core.setup(name="cryptohash", ext_modules=[module1])
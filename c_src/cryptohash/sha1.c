@@ -1,86 +1,96 @@
-#include "array_read.h"
+#include "cpu.h"
+#include "hashobject.h"
 static const uint32_t a0_iv = 0x67452301;
 static const uint32_t b0_iv = 0xefcdab89;
 static const uint32_t c0_iv = 0x98badcfe;
 static const uint32_t d0_iv = 0x10325476;
 static const uint32_t e0_iv = 0xc3d2e1f0;
 
-typedef struct {
-    // state array
-    uint32_t a0;
-    uint32_t b0;
-    uint32_t c0;
-    uint32_t d0;
-    uint32_t e0;
-    // temporary save
-    uint64_t msg_len, chunk_len;
-    // 512 bits per block
-    uint8_t msg[64];
-} SHA1Object;
-
 static const size_t sha1_hlen = 20;
 
-void SHA1_HashProcess(SHA1Object* self) {
-    uint32_t a, b, c, d, e;
-    uint32_t f;
-    uint32_t j;
-    uint32_t w[80];
-    a = self->a0;
-    b = self->b0;
-    c = self->c0;
-    d = self->d0;
-    e = self->e0;
-    for (uint8_t i = 0; i < 80; ++i) {
-        if (i < 16) {
-            w[i] = (uint32_t)(self->msg[4 * i + 3]) +
-                   (uint32_t)(self->msg[4 * i + 2] << 8) +
-                   (uint32_t)(self->msg[4 * i + 1] << 16) +
-                   (uint32_t)(self->msg[4 * i] << 24);
-        } else {
-            w[i] = LeftRotate32(w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16], 1);
-        }
-        if (i < 20) {
-            f = (b & c) | (~b & d);
-            j = 0x5A827999;
-        } else if (i < 40) {
-            f = b ^ c ^ d;
-            j = 0x6ED9EBA1;
-        } else if (i < 60) {
-            f = (b & c) | (b & d) | (c & d);
-            j = 0x8F1BBCDC;
-        } else {
-            f = b ^ c ^ d;
-            j = 0xCA62C1D6;
-        }
-        f += e + LeftRotate32(a, 5) + j + w[i];
-        e = d;
-        d = c;
-        c = LeftRotate32(b, 30);
-        b = a;
-        a = f;
+#define SHA1_CH(b, c, d) ((d) ^ ((b) & ((c) ^ (d))))
+#define SHA1_PARITY(b, c, d) ((b) ^ (c) ^ (d))
+#define SHA1_MAJ(b, c, d) (((b) & (c)) | ((d) & ((b) | (c))))
+// word i of the schedule, w holds the last 16 words
+#define SHA1_EXPAND(i)                                                     \
+    (w[(i)&15] = LeftRotate32(w[((i) + 13) & 15] ^ w[((i) + 8) & 15] ^ \
+                                  w[((i) + 2) & 15] ^ w[(i)&15],        \
+                              1))
+#define SHA1_W(i) ((i) < 16 ? w[(i)&15] : SHA1_EXPAND(i))
+#define SHA1_STEP(f, k, a, b, c, d, e, i)                      \
+    e += LeftRotate32(a, 5) + f(b, c, d) + (k) + SHA1_W(i);    \
+    b = LeftRotate32(b, 30)
+// five steps, rotating the roles of a, b, c, d, e instead of the values
+#define SHA1_STEP5(f, k, i)                       \
+    SHA1_STEP(f, k, a, b, c, d, e, i);            \
+    SHA1_STEP(f, k, e, a, b, c, d, (i) + 1);      \
+    SHA1_STEP(f, k, d, e, a, b, c, (i) + 2);      \
+    SHA1_STEP(f, k, c, d, e, a, b, (i) + 3);      \
+    SHA1_STEP(f, k, b, c, d, e, a, (i) + 4)
+
+/* Process nblocks 64-byte blocks read directly from src. */
+static void SHA1_Blocks(SHA1Object* self, const uint8_t* src,
+                        uint64_t nblocks) {
+    uint32_t a, b, c, d, e, w[16];
+    if (cpu_enabled[CPU_SHA]) {
+        uint32_t st[5] = {self->a0, self->b0, self->c0, self->d0, self->e0};
+        SHA1_Blocks_SHANI(st, src, nblocks);
+        self->a0 = st[0];
+        self->b0 = st[1];
+        self->c0 = st[2];
+        self->d0 = st[3];
+        self->e0 = st[4];
+        return;
+    }
+    for (; nblocks; --nblocks, src += 64) {
+        for (int i = 0; i < 16; ++i) w[i] = LoadBE32(src + (i << 2));
+        a = self->a0;
+        b = self->b0;
+        c = self->c0;
+        d = self->d0;
+        e = self->e0;
+        SHA1_STEP5(SHA1_CH, 0x5A827999, 0);
+        SHA1_STEP5(SHA1_CH, 0x5A827999, 5);
+        SHA1_STEP5(SHA1_CH, 0x5A827999, 10);
+        SHA1_STEP5(SHA1_CH, 0x5A827999, 15);
+        SHA1_STEP5(SHA1_PARITY, 0x6ED9EBA1, 20);
+        SHA1_STEP5(SHA1_PARITY, 0x6ED9EBA1, 25);
+        SHA1_STEP5(SHA1_PARITY, 0x6ED9EBA1, 30);
+        SHA1_STEP5(SHA1_PARITY, 0x6ED9EBA1, 35);
+        SHA1_STEP5(SHA1_MAJ, 0x8F1BBCDC, 40);
+        SHA1_STEP5(SHA1_MAJ, 0x8F1BBCDC, 45);
+        SHA1_STEP5(SHA1_MAJ, 0x8F1BBCDC, 50);
+        SHA1_STEP5(SHA1_MAJ, 0x8F1BBCDC, 55);
+        SHA1_STEP5(SHA1_PARITY, 0xCA62C1D6, 60);
+        SHA1_STEP5(SHA1_PARITY, 0xCA62C1D6, 65);
+        SHA1_STEP5(SHA1_PARITY, 0xCA62C1D6, 70);
+        SHA1_STEP5(SHA1_PARITY, 0xCA62C1D6, 75);
+        self->a0 += a;
+        self->b0 += b;
+        self->c0 += c;
+        self->d0 += d;
+        self->e0 += e;
     }
-    self->a0 += a;
-    self->b0 += b;
-    self->c0 += c;
-    self->d0 += d;
-    self->e0 += e;
 }
+void SHA1_HashProcess(SHA1Object* self) { SHA1_Blocks(self, self->msg, 1); }
 uint64_t SHA1_HashUpdate(SHA1Object* self, const uint8_t* src,
                          uint64_t bytelen) {
     if (!src) return self->msg_len;
-    uint64_t old_chunk = self->chunk_len;
-    const uint8_t* max_pos = src + bytelen;
-    self->chunk_len =
-        read_from_arr(self->msg + old_chunk, 64 - old_chunk, src, max_pos);
-    src += self->chunk_len;
-    self->msg_len += self->chunk_len << 3;
-    if (old_chunk + self->chunk_len < 64) return self->msg_len;
-    do {
+    self->msg_len += bytelen << 3;
+    if (self->chunk_len) {
+        uint64_t count = 64 - self->chunk_len;
+        if (count > bytelen) count = bytelen;
+        memcpy(self->msg + self->chunk_len, src, count);
+        self->chunk_len += count;
+        src += count;
+        bytelen -= count;
+        if (self->chunk_len < 64) return self->msg_len;
         SHA1_HashProcess(self);
-        self->chunk_len = read_from_arr(self->msg, 64, src, max_pos);
-        src += self->chunk_len;
-        self->msg_len += self->chunk_len << 3;
-    } while (self->chunk_len >= 64);
+    }
+    // whole blocks straight from the caller's buffer
+    SHA1_Blocks(self, src, bytelen >> 6);
+    self->chunk_len = bytelen & 63;
+    memcpy(self->msg, src + bytelen - self->chunk_len, self->chunk_len);
     return self->msg_len;
 }
 uint64_t SHA1_HashFinal(SHA1Object* self, uint8_t* dst) {
@@ -132,15 +142,18 @@ uint64_t SHA1_HashFinal(SHA1Object* self, uint8_t* dst) {
     return len_tmp;
 }
 
-PyObject* sha1(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
+static size_t SHA1_Init(HashState* self, size_t hashbit, unsigned capbit,
+                        uint8_t pad) {
     SHA1Object obj = {a0_iv, b0_iv, c0_iv, d0_iv, e0_iv, 0, 0, {0}};
-    SHA1_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha1_hlen);
-    SHA1_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, sha1_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+    self->sha1 = obj;
+    return sha1_hlen;
+}
+static uint64_t SHA1_Update(HashState* self, const uint8_t* src,
+                            uint64_t bytelen) {
+    return SHA1_HashUpdate(&self->sha1, src, bytelen);
+}
+static void SHA1_Final(HashState* self, uint8_t* dst) {
+    SHA1_HashFinal(&self->sha1, dst);
 }
+const HashAlgDesc sha1_desc = {"sha1",     20,          64,        0,
+                               SHA1_Init, SHA1_Update, SHA1_Final};
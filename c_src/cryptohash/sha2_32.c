@@ -1,5 +1,6 @@
-#include "array_read.h"
-static const uint32_t K[64] = {
+#include "cpu.h"
+#include "hashobject.h"
+const uint32_t SHA2_32_K[64] = {
     0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1,
     0x923f82a4, 0xab1c5ed5, 0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3,
     0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174, 0xe49b69c1, 0xefbe4786,
@@ -18,62 +19,95 @@ static const uint32_t a0_iv_sha256[8] = {0x6a09e667, 0xbb67ae85, 0x3c6ef372,
                                          0xa54ff53a, 0x510e527f, 0x9b05688c,
                                          0x1f83d9ab, 0x5be0cd19};
 
-typedef struct {
-    uint32_t a0[8];
-    uint64_t msg_len, chunk_len;
-    uint8_t msg[64];
-} SHA2_32Object;
-
 static size_t sha224_hlen = 28;
 static size_t sha256_hlen = 32;
 
-void SHA2_32_HashProcess(SHA2_32Object* self) {
-    uint32_t a[8];
-    uint32_t w[64];
-    uint32_t f1, f2;
-    for (uint8_t i = 0; i < 8; ++i) a[i] = self->a0[i];
-    for (uint8_t i = 0; i < 64; ++i) {
-        if (i < 16) {
-            w[i] = (uint32_t)(self->msg[4 * i + 3]) +
-                   (uint32_t)(self->msg[4 * i + 2] << 8) +
-                   (uint32_t)(self->msg[4 * i + 1] << 16) +
-                   (uint32_t)(self->msg[4 * i] << 24);
-        } else {
-            w[i] = w[i - 16] + w[i - 7];
-            w[i] += RightRotate32(w[i - 15], 7) ^ RightRotate32(w[i - 15], 18) ^
-                    (w[i - 15] >> 3);
-            w[i] += RightRotate32(w[i - 2], 17) ^ RightRotate32(w[i - 2], 19) ^
-                    (w[i - 2] >> 10);
-        }
-        f1 = K[i] + w[i] + a[7];
-        f1 += RightRotate32(a[4], 6) ^ RightRotate32(a[4], 11) ^
-              RightRotate32(a[4], 25);
-        f1 += (a[4] & a[5]) ^ (~a[4] & a[6]);
-        f2 = RightRotate32(a[0], 2) ^ RightRotate32(a[0], 13) ^
-             RightRotate32(a[0], 22);
-        f2 += (a[0] & a[1]) ^ (a[0] & a[2]) ^ (a[1] & a[2]);
-        for (uint8_t j = 7; j > 0; --j) a[j] = a[j - 1];
-        a[4] += f1;
-        a[0] = f1 + f2;
+#define SHA2_CH(e, f, g) ((g) ^ ((e) & ((f) ^ (g))))
+#define SHA2_MAJ(a, b, c) (((a) & (b)) | ((c) & ((a) | (b))))
+#define SHA256_S0(x) \
+    (RightRotate32(x, 2) ^ RightRotate32(x, 13) ^ RightRotate32(x, 22))
+#define SHA256_S1(x) \
+    (RightRotate32(x, 6) ^ RightRotate32(x, 11) ^ RightRotate32(x, 25))
+#define SHA256_s0(x) (RightRotate32(x, 7) ^ RightRotate32(x, 18) ^ ((x) >> 3))
+#define SHA256_s1(x) \
+    (RightRotate32(x, 17) ^ RightRotate32(x, 19) ^ ((x) >> 10))
+// word i of the schedule, w holds the last 16 words
+#define SHA256_EXPAND(i)                                                 \
+    (w[(i)&15] += SHA256_s1(w[((i) + 14) & 15]) + w[((i) + 9) & 15] + \
+                  SHA256_s0(w[((i) + 1) & 15]))
+#define SHA256_W(i) ((i) < 16 ? w[(i)&15] : SHA256_EXPAND(i))
+#define SHA256_STEP(a, b, c, d, e, f, g, h, i)                         \
+    h += SHA256_S1(e) + SHA2_CH(e, f, g) + SHA2_32_K[i] + SHA256_W(i); \
+    d += h;                                                           \
+    h += SHA256_S0(a) + SHA2_MAJ(a, b, c)
+// eight steps, rotating the roles of a to h instead of the values
+#define SHA256_STEP8(i)                                 \
+    SHA256_STEP(a, b, c, d, e, f, g, h, i);             \
+    SHA256_STEP(h, a, b, c, d, e, f, g, (i) + 1);       \
+    SHA256_STEP(g, h, a, b, c, d, e, f, (i) + 2);       \
+    SHA256_STEP(f, g, h, a, b, c, d, e, (i) + 3);       \
+    SHA256_STEP(e, f, g, h, a, b, c, d, (i) + 4);       \
+    SHA256_STEP(d, e, f, g, h, a, b, c, (i) + 5);       \
+    SHA256_STEP(c, d, e, f, g, h, a, b, (i) + 6);       \
+    SHA256_STEP(b, c, d, e, f, g, h, a, (i) + 7)
+
+/* Process nblocks 64-byte blocks read directly from src. */
+static void SHA2_32_Blocks(uint32_t st[8], const uint8_t* src,
+                           uint64_t nblocks) {
+    uint32_t a, b, c, d, e, f, g, h, w[16];
+    if (cpu_enabled[CPU_SHA]) {
+        SHA2_32_Blocks_SHANI(st, src, nblocks);
+        return;
+    }
+    for (; nblocks; --nblocks, src += 64) {
+        for (int i = 0; i < 16; ++i) w[i] = LoadBE32(src + (i << 2));
+        a = st[0];
+        b = st[1];
+        c = st[2];
+        d = st[3];
+        e = st[4];
+        f = st[5];
+        g = st[6];
+        h = st[7];
+        SHA256_STEP8(0);
+        SHA256_STEP8(8);
+        SHA256_STEP8(16);
+        SHA256_STEP8(24);
+        SHA256_STEP8(32);
+        SHA256_STEP8(40);
+        SHA256_STEP8(48);
+        SHA256_STEP8(56);
+        st[0] += a;
+        st[1] += b;
+        st[2] += c;
+        st[3] += d;
+        st[4] += e;
+        st[5] += f;
+        st[6] += g;
+        st[7] += h;
     }
-    for (uint8_t i = 0; i < 8; ++i) self->a0[i] += a[i];
+}
+void SHA2_32_HashProcess(SHA2_32Object* self) {
+    SHA2_32_Blocks(self->a0, self->msg, 1);
 }
 uint64_t SHA2_32_HashUpdate(SHA2_32Object* self, const uint8_t* src,
                             uint64_t bytelen) {
     if (!src) return self->msg_len;
-    uint64_t old_chunk = self->chunk_len;
-    const uint8_t* max_pos = src + bytelen;
-    self->chunk_len =
-        read_from_arr(self->msg + old_chunk, 64 - old_chunk, src, max_pos);
-    src += self->chunk_len;
-    self->msg_len += self->chunk_len << 3;
-    if (old_chunk + self->chunk_len < 64) return self->msg_len;
-    do {
+    self->msg_len += bytelen << 3;
+    if (self->chunk_len) {
+        uint64_t count = 64 - self->chunk_len;
+        if (count > bytelen) count = bytelen;
+        memcpy(self->msg + self->chunk_len, src, count);
+        self->chunk_len += count;
+        src += count;
+        bytelen -= count;
+        if (self->chunk_len < 64) return self->msg_len;
         SHA2_32_HashProcess(self);
-        self->chunk_len = read_from_arr(self->msg, 64, src, max_pos);
-        src += self->chunk_len;
-        self->msg_len += self->chunk_len << 3;
-    } while (self->chunk_len >= 64);
+    }
+    // whole blocks straight from the caller's buffer
+    SHA2_32_Blocks(self->a0, src, bytelen >> 6);
+    self->chunk_len = bytelen & 63;
+    memcpy(self->msg, src + bytelen - self->chunk_len, self->chunk_len);
     return self->msg_len;
 }
 uint64_t SHA2_32_HashFinal(SHA2_32Object* self, uint8_t* dst,
@@ -136,29 +170,31 @@ void SHA256_Reset(SHA2_32Object* self) {
     self->chunk_len = 0;
 }
 
-PyObject* sha224(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA2_32Object obj;
-    SHA224_Reset(&obj);
-    SHA2_32_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha224_hlen);
-    SHA2_32_HashFinal(&obj, (uint8_t*)(dst), SHA224_GetHash, SHA224_Reset);
-    PyObject* rv = Py_BuildValue("y#", dst, sha224_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static uint64_t SHA2_32_Update(HashState* self, const uint8_t* src,
+                               uint64_t bytelen) {
+    return SHA2_32_HashUpdate(&self->sha2_32, src, bytelen);
+}
+static size_t SHA224_Init(HashState* self, size_t hashbit, unsigned capbit,
+                          uint8_t pad) {
+    SHA224_Reset(&self->sha2_32);
+    return sha224_hlen;
+}
+static void SHA224_Final(HashState* self, uint8_t* dst) {
+    SHA2_32_HashFinal(&self->sha2_32, dst, SHA224_GetHash, SHA224_Reset);
+}
+static size_t SHA256_Init(HashState* self, size_t hashbit, unsigned capbit,
+                          uint8_t pad) {
+    SHA256_Reset(&self->sha2_32);
+    return sha256_hlen;
 }
-PyObject* sha256(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA2_32Object obj;
-    SHA256_Reset(&obj);
-    SHA2_32_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha256_hlen);
-    SHA2_32_HashFinal(&obj, (uint8_t*)(dst), SHA256_GetHash, SHA256_Reset);
-    PyObject* rv = Py_BuildValue("y#", dst, sha256_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static void SHA256_Final(HashState* self, uint8_t* dst) {
+    SHA2_32_HashFinal(&self->sha2_32, dst, SHA256_GetHash, SHA256_Reset);
 }
+const HashAlgDesc sha224_desc = {
+    "sha224", 28, 64, 0,
+    SHA224_Init, SHA2_32_Update, SHA224_Final,
+    SHA2_32_MultiLanes, SHA224_Multi};
+const HashAlgDesc sha256_desc = {
+    "sha256", 32, 64, 0,
+    SHA256_Init, SHA2_32_Update, SHA256_Final,
+    SHA2_32_MultiLanes, SHA256_Multi};
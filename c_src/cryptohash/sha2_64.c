@@ -1,4 +1,4 @@
-#include "array_read.h"
+#include "hashobject.h"
 static const uint64_t K[80] = {
     0x428a2f98d728ae22, 0x7137449123ef65cd, 0xb5c0fbcfec4d3b2f,
     0xe9b5dba58189dbbc, 0x3956c25bf348b538, 0x59f111f1b605d019,
@@ -48,70 +48,95 @@ static const uint64_t a0_iv_sha512_256[8] = {
     0x963877195940eabd, 0x96283ee2a88effe3, 0xbe5e1e2553863992,
     0x2b0199fc2c85b8aa, 0xeb72ddc81c52ca2};
 
-typedef __uint128_t uint128_t;
-typedef struct {
-    uint64_t a0[8];
-    uint128_t msg_len;
-    uint64_t chunk_len;
-    uint8_t msg[128];
-    // dynamic initial value for sha512/t
-    uint64_t a0_iv[8];
-    size_t t;
-} SHA2_64Object;
-
 static size_t sha384_hlen = 48;
 static size_t sha512_hlen = 64;
 static size_t sha512_224_hlen = 28;
 static size_t sha512_256_hlen = 32;
 
-void SHA2_64_HashProcess(SHA2_64Object* self) {
-    uint64_t f1, f2;
-    uint64_t w[80];
-    uint64_t a[8];
-    for (uint8_t i = 0; i < 8; ++i) a[i] = self->a0[i];
-    for (uint8_t i = 0; i < 80; ++i) {
-        if (i < 16) {
-            w[i] = (uint64_t)(self->msg[8 * i]);
-            for (uint8_t j = 1; j < 8; ++j) {
-                w[i] <<= 8;
-                w[i] += (uint64_t)(self->msg[8 * i + j]);
-            }
-        } else {
-            w[i] = w[i - 16] + w[i - 7];
-            w[i] += RightRotate64(w[i - 15], 1) ^ RightRotate64(w[i - 15], 8) ^
-                    (w[i - 15] >> 7);
-            w[i] += RightRotate64(w[i - 2], 19) ^ RightRotate64(w[i - 2], 61) ^
-                    (w[i - 2] >> 6);
-        }
-        f1 = K[i] + w[i] + a[7];
-        f1 += RightRotate64(a[4], 14) ^ RightRotate64(a[4], 18) ^
-              RightRotate64(a[4], 41);
-        f1 += (a[4] & a[5]) ^ (~a[4] & a[6]);
-        f2 = RightRotate64(a[0], 28) ^ RightRotate64(a[0], 34) ^
-             RightRotate64(a[0], 39);
-        f2 += (a[0] & a[1]) ^ (a[0] & a[2]) ^ (a[1] & a[2]);
-        for (uint8_t j = 7; j > 0; --j) a[j] = a[j - 1];
-        a[4] += f1;
-        a[0] = f1 + f2;
+#define SHA2_CH(e, f, g) ((g) ^ ((e) & ((f) ^ (g))))
+#define SHA2_MAJ(a, b, c) (((a) & (b)) | ((c) & ((a) | (b))))
+#define SHA512_S0(x) \
+    (RightRotate64(x, 28) ^ RightRotate64(x, 34) ^ RightRotate64(x, 39))
+#define SHA512_S1(x) \
+    (RightRotate64(x, 14) ^ RightRotate64(x, 18) ^ RightRotate64(x, 41))
+#define SHA512_s0(x) (RightRotate64(x, 1) ^ RightRotate64(x, 8) ^ ((x) >> 7))
+#define SHA512_s1(x) \
+    (RightRotate64(x, 19) ^ RightRotate64(x, 61) ^ ((x) >> 6))
+// word i of the schedule, w holds the last 16 words
+#define SHA512_EXPAND(i)                                                 \
+    (w[(i)&15] += SHA512_s1(w[((i) + 14) & 15]) + w[((i) + 9) & 15] + \
+                  SHA512_s0(w[((i) + 1) & 15]))
+#define SHA512_W(i) ((i) < 16 ? w[(i)&15] : SHA512_EXPAND(i))
+#define SHA512_STEP(a, b, c, d, e, f, g, h, i)                 \
+    h += SHA512_S1(e) + SHA2_CH(e, f, g) + K[i] + SHA512_W(i); \
+    d += h;                                                   \
+    h += SHA512_S0(a) + SHA2_MAJ(a, b, c)
+// eight steps, rotating the roles of a to h instead of the values
+#define SHA512_STEP8(i)                                 \
+    SHA512_STEP(a, b, c, d, e, f, g, h, i);             \
+    SHA512_STEP(h, a, b, c, d, e, f, g, (i) + 1);       \
+    SHA512_STEP(g, h, a, b, c, d, e, f, (i) + 2);       \
+    SHA512_STEP(f, g, h, a, b, c, d, e, (i) + 3);       \
+    SHA512_STEP(e, f, g, h, a, b, c, d, (i) + 4);       \
+    SHA512_STEP(d, e, f, g, h, a, b, c, (i) + 5);       \
+    SHA512_STEP(c, d, e, f, g, h, a, b, (i) + 6);       \
+    SHA512_STEP(b, c, d, e, f, g, h, a, (i) + 7)
+
+/* Process nblocks 128-byte blocks read directly from src. */
+static void SHA2_64_Blocks(uint64_t st[8], const uint8_t* src,
+                           uint64_t nblocks) {
+    uint64_t a, b, c, d, e, f, g, h, w[16];
+    for (; nblocks; --nblocks, src += 128) {
+        for (int i = 0; i < 16; ++i) w[i] = LoadBE64(src + (i << 3));
+        a = st[0];
+        b = st[1];
+        c = st[2];
+        d = st[3];
+        e = st[4];
+        f = st[5];
+        g = st[6];
+        h = st[7];
+        SHA512_STEP8(0);
+        SHA512_STEP8(8);
+        SHA512_STEP8(16);
+        SHA512_STEP8(24);
+        SHA512_STEP8(32);
+        SHA512_STEP8(40);
+        SHA512_STEP8(48);
+        SHA512_STEP8(56);
+        SHA512_STEP8(64);
+        SHA512_STEP8(72);
+        st[0] += a;
+        st[1] += b;
+        st[2] += c;
+        st[3] += d;
+        st[4] += e;
+        st[5] += f;
+        st[6] += g;
+        st[7] += h;
     }
-    for (uint8_t i = 0; i < 8; ++i) self->a0[i] += a[i];
+}
+void SHA2_64_HashProcess(SHA2_64Object* self) {
+    SHA2_64_Blocks(self->a0, self->msg, 1);
 }
 uint64_t SHA2_64_HashUpdate(SHA2_64Object* self, const uint8_t* src,
                             uint64_t bytelen) {
     if (!src) return self->msg_len;
-    uint64_t old_chunk = self->chunk_len;
-    const uint8_t* max_pos = src + bytelen;
-    self->chunk_len =
-        read_from_arr(self->msg + old_chunk, 128 - old_chunk, src, max_pos);
-    src += self->chunk_len;
-    self->msg_len += self->chunk_len << 3;
-    if (old_chunk + self->chunk_len < 128) return self->msg_len;
-    do {
+    self->msg_len += (uint128_t)bytelen << 3;
+    if (self->chunk_len) {
+        uint64_t count = 128 - self->chunk_len;
+        if (count > bytelen) count = bytelen;
+        memcpy(self->msg + self->chunk_len, src, count);
+        self->chunk_len += count;
+        src += count;
+        bytelen -= count;
+        if (self->chunk_len < 128) return self->msg_len;
         SHA2_64_HashProcess(self);
-        self->chunk_len = read_from_arr(self->msg, 128, src, max_pos);
-        src += self->chunk_len;
-        self->msg_len += self->chunk_len << 3;
-    } while (self->chunk_len >= 128);
+    }
+    // whole blocks straight from the caller's buffer
+    SHA2_64_Blocks(self->a0, src, bytelen >> 7);
+    self->chunk_len = bytelen & 127;
+    memcpy(self->msg, src + bytelen - self->chunk_len, self->chunk_len);
     return self->msg_len;
 }
 uint64_t SHA2_64_HashFinal(SHA2_64Object* self, uint8_t* dst,
@@ -246,74 +271,66 @@ void SHA512_256_Reset(SHA2_64Object* self) {
     self->chunk_len = 0;
 }
 
-PyObject* sha384(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA2_64Object obj;
-    SHA384_Reset(&obj);
-    SHA2_64_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha384_hlen);
-    SHA2_64_HashFinal(&obj, (uint8_t*)(dst), SHA384_GetHash, SHA384_Reset);
-    PyObject* rv = Py_BuildValue("y#", dst, sha384_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static uint64_t SHA2_64_Update(HashState* self, const uint8_t* src,
+                               uint64_t bytelen) {
+    return SHA2_64_HashUpdate(&self->sha2_64, src, bytelen);
+}
+static size_t SHA384_Init(HashState* self, size_t hashbit, unsigned capbit,
+                          uint8_t pad) {
+    SHA384_Reset(&self->sha2_64);
+    return sha384_hlen;
 }
-PyObject* sha512(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA2_64Object obj;
-    SHA512_Reset(&obj);
-    SHA2_64_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha512_hlen);
-    SHA2_64_HashFinal(&obj, (uint8_t*)(dst), SHA512_GetHash, SHA512_Reset);
-    PyObject* rv = Py_BuildValue("y#", dst, sha512_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static void SHA384_Final(HashState* self, uint8_t* dst) {
+    SHA2_64_HashFinal(&self->sha2_64, dst, SHA384_GetHash, SHA384_Reset);
 }
-PyObject* sha512_224(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA2_64Object obj;
-    SHA512_224_Reset(&obj);
-    SHA2_64_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha512_224_hlen);
-    SHA2_64_HashFinal(&obj, (uint8_t*)(dst), SHA512_224_GetHash,
+static size_t SHA512_Init(HashState* self, size_t hashbit, unsigned capbit,
+                          uint8_t pad) {
+    SHA512_Reset(&self->sha2_64);
+    return sha512_hlen;
+}
+static void SHA512_Final(HashState* self, uint8_t* dst) {
+    SHA2_64_HashFinal(&self->sha2_64, dst, SHA512_GetHash, SHA512_Reset);
+}
+static size_t SHA512t_Init(HashState* self, size_t hashbit, unsigned capbit,
+                           uint8_t pad) {
+    // t = 384 is allowed, though it is just another name of sha384
+    if (hashbit == 0 || hashbit >= 512) return HASH_INVALID;
+    self->sha2_64.t = hashbit;
+    SHA512t_IVGen(&self->sha2_64);
+    return (hashbit + 7) >> 3;
+}
+static void SHA512t_Final(HashState* self, uint8_t* dst) {
+    SHA2_64_HashFinal(&self->sha2_64, dst, SHA512t_GetHash, SHA512t_Reset);
+}
+static size_t SHA512_224_Init(HashState* self, size_t hashbit, unsigned capbit,
+                              uint8_t pad) {
+    SHA512_224_Reset(&self->sha2_64);
+    return sha512_224_hlen;
+}
+static void SHA512_224_Final(HashState* self, uint8_t* dst) {
+    SHA2_64_HashFinal(&self->sha2_64, dst, SHA512_224_GetHash,
                       SHA512_224_Reset);
-    PyObject* rv = Py_BuildValue("y#", dst, sha512_224_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
 }
-PyObject* sha512_256(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA2_64Object obj;
-    SHA512_256_Reset(&obj);
-    SHA2_64_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha512_256_hlen);
-    SHA2_64_HashFinal(&obj, (uint8_t*)(dst), SHA512_256_GetHash,
-                      SHA512_256_Reset);
-    PyObject* rv = Py_BuildValue("y#", dst, sha512_256_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t SHA512_256_Init(HashState* self, size_t hashbit, unsigned capbit,
+                              uint8_t pad) {
+    SHA512_256_Reset(&self->sha2_64);
+    return sha512_256_hlen;
 }
-
-PyObject* sha512t(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    size_t t;
-    if (!PyArg_ParseTuple(args, "y*k", &view, &t)) return NULL;
-    size_t hlen = (t + 7) >> 3;
-    SHA2_64Object obj;
-    obj.t = t;
-    SHA512t_IVGen(&obj);
-    SHA2_64_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(hlen);
-    SHA2_64_HashFinal(&obj, (uint8_t*)(dst), SHA512t_GetHash, SHA512t_Reset);
-    PyObject* rv = Py_BuildValue("y#", dst, hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static void SHA512_256_Final(HashState* self, uint8_t* dst) {
+    SHA2_64_HashFinal(&self->sha2_64, dst, SHA512_256_GetHash,
+                      SHA512_256_Reset);
 }
+const HashAlgDesc sha384_desc = {"sha384",    48,             128,         0,
+                                 SHA384_Init, SHA2_64_Update, SHA384_Final};
+const HashAlgDesc sha512_desc = {"sha512",    64,             128,         0,
+                                 SHA512_Init, SHA2_64_Update, SHA512_Final};
+const HashAlgDesc sha512t_desc = {"sha512t",    0,              128,          1,
+                                  SHA512t_Init, SHA2_64_Update, SHA512t_Final};
+const HashAlgDesc sha512_224_desc = {"sha512_224",    28,
+                                     128,             0,
+                                     SHA512_224_Init, SHA2_64_Update,
+                                     SHA512_224_Final};
+const HashAlgDesc sha512_256_desc = {"sha512_256",    32,
+                                     128,             0,
+                                     SHA512_256_Init, SHA2_64_Update,
+                                     SHA512_256_Final};
@@ -1,49 +1,34 @@
-#include "array_read.h"
-static const uint64_t rho_count[24] = {1,  3,  6,  10, 15, 21, 28, 36,
-                                       45, 55, 2,  14, 27, 41, 56, 8,
-                                       25, 43, 62, 18, 39, 61, 20, 44};
-static const uint64_t rho_x[24] = {1, 0, 2, 1, 2, 3, 3, 0, 1, 3, 1, 4,
-                                   4, 0, 3, 4, 3, 2, 2, 0, 4, 2, 4, 1};
-static const uint64_t rho_y[24] = {0, 2, 1, 2, 3, 3, 0, 1, 3, 1, 4, 4,
-                                   0, 3, 4, 3, 2, 2, 0, 4, 2, 4, 1, 1};
-static const uint64_t pi_x[5][5] = {{0, 3, 1, 4, 2},
-                                    {1, 4, 2, 0, 3},
-                                    {2, 0, 3, 1, 4},
-                                    {3, 1, 4, 2, 0},
-                                    {4, 2, 0, 3, 1}};
-static const uint64_t iota_rc[24] = {0x1,
-                                     0x8082,
-                                     0x800000000000808a,
-                                     0x8000000080008000,
-                                     0x808b,
-                                     0x80000001,
-                                     0x8000000080008081,
-                                     0x8000000000008009,
-                                     0x8a,
-                                     0x88,
-                                     0x80008009,
-                                     0x8000000a,
-                                     0x8000808b,
-                                     0x800000000000008b,
-                                     0x8000000000008089,
-                                     0x8000000000008003,
-                                     0x8000000000008002,
-                                     0x8000000000000080,
-                                     0x800a,
-                                     0x800000008000000a,
-                                     0x8000000080008081,
-                                     0x8000000000008080,
-                                     0x80000001,
-                                     0x8000000080008008};
-typedef struct {
-    uint32_t CAP, RATE;
-    uint8_t PAD;
-    uint64_t a[5][5];
-    uint64_t msg_len, chunk_len;
-    size_t hlen;
-    uint8_t msg[200];
-} SHA3Object;
-
+#include "hashobject.h"
+// rotation of lane (x, y) in step rho
+static const uint8_t rho_xy[5][5] = {{0, 36, 3, 41, 18},
+                                     {1, 44, 10, 45, 2},
+                                     {62, 6, 43, 15, 61},
+                                     {28, 55, 25, 21, 56},
+                                     {27, 20, 39, 8, 14}};
+const uint64_t iota_rc[24] = {0x1,
+                              0x8082,
+                              0x800000000000808a,
+                              0x8000000080008000,
+                              0x808b,
+                              0x80000001,
+                              0x8000000080008081,
+                              0x8000000000008009,
+                              0x8a,
+                              0x88,
+                              0x80008009,
+                              0x8000000a,
+                              0x8000808b,
+                              0x800000000000008b,
+                              0x8000000000008089,
+                              0x8000000000008003,
+                              0x8000000000008002,
+                              0x8000000000000080,
+                              0x800a,
+                              0x800000008000000a,
+                              0x8000000080008081,
+                              0x8000000000008080,
+                              0x80000001,
+                              0x8000000080008008};
 static size_t sha3_224_hlen = 28;
 static size_t sha3_256_hlen = 32;
 static size_t sha3_384_hlen = 48;
@@ -53,36 +38,33 @@ static size_t shake256_hlen = 64;
 static uint8_t sha3_pad = 0x06;
 static uint8_t shake_pad = 0x1f;
 static uint8_t rawshake_pad = 0x07;
+static uint8_t keccak_rounds = 24;
+static uint8_t keccak12_rounds = 12;
 
-static void KeccakPermutation(uint64_t a[][5]) {
-    // constants
-    uint64_t c[5], d[5], pi[5][5];
-    for (int r = 0; r < 24; ++r) {
+/* The last rounds rounds of Keccak-f[1600], 24 for the full permutation,
+ * 12 for the Keccak-p[1600, 12] of KangarooTwelve. */
+static void KeccakPermutation(uint64_t a[][5], int rounds) {
+    // the loops have constant bounds, unrolled they keep b in registers
+    uint64_t b[5][5], c[5], d;
+    for (int r = 24 - rounds; r < 24; ++r) {
         // step theta, xor parity
-        for (uint8_t i = 0; i < 5; ++i)
-            c[i] = a[i][0] ^ a[i][1] ^ a[i][2] ^ a[i][3] ^ a[i][4];
-        d[0] = c[4] ^ LeftRotate64(c[1], 1);
-        d[1] = c[0] ^ LeftRotate64(c[2], 1);
-        d[2] = c[1] ^ LeftRotate64(c[3], 1);
-        d[3] = c[2] ^ LeftRotate64(c[4], 1);
-        d[4] = c[3] ^ LeftRotate64(c[0], 1);
-        for (uint8_t i = 0; i < 5; ++i)
-            for (uint8_t j = 0; j < 5; ++j) a[i][j] ^= d[i];
-        // step rho, rotate, only a(0,0) is not rotated
-        for (uint8_t i = 0; i < 24; ++i)
-            a[rho_x[i]][rho_y[i]] =
-                LeftRotate64(a[rho_x[i]][rho_y[i]], rho_count[i]);
-        // step pi, permutation, diverge to array pi
-        for (uint8_t i = 0; i < 5; ++i)
-            for (uint8_t j = 0; j < 5; ++j) pi[i][j] = a[pi_x[i][j]][i];
-        // step chi, non-linear, merge back to array a
-        for (uint8_t i = 0; i < 5; ++i) {
-            a[0][i] = pi[0][i] ^ (~pi[1][i] & pi[2][i]);
-            a[1][i] = pi[1][i] ^ (~pi[2][i] & pi[3][i]);
-            a[2][i] = pi[2][i] ^ (~pi[3][i] & pi[4][i]);
-            a[3][i] = pi[3][i] ^ (~pi[4][i] & pi[0][i]);
-            a[4][i] = pi[4][i] ^ (~pi[0][i] & pi[1][i]);
+        for (int x = 0; x < 5; ++x)
+            c[x] = a[x][0] ^ a[x][1] ^ a[x][2] ^ a[x][3] ^ a[x][4];
+        for (int x = 0; x < 5; ++x) {
+            d = c[(x + 4) % 5] ^ LeftRotate64(c[(x + 1) % 5], 1);
+            for (int y = 0; y < 5; ++y) a[x][y] ^= d;
         }
+        // steps rho and pi, lane (x, y) rotated to (y, 2x + 3y)
+        b[0][0] = a[0][0];
+        for (int x = 0; x < 5; ++x)
+            for (int y = 0; y < 5; ++y)
+                if (x | y)
+                    b[y][(2 * x + 3 * y) % 5] =
+                        LeftRotate64(a[x][y], rho_xy[x][y]);
+        // step chi, non-linear, merge back to array a
+        for (int x = 0; x < 5; ++x)
+            for (int y = 0; y < 5; ++y)
+                a[x][y] = b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y]);
         // step iota, xor a LSFR sequence to break symmetry
         a[0][0] ^= iota_rc[r];
     }
@@ -90,39 +72,41 @@ static void KeccakPermutation(uint64_t a[][5]) {
 
 void SHA3_HashProcess(SHA3Object* self) {
     // xor into state array, column major
-    for (uint32_t i = 0; i < (self->RATE >> 3); ++i)
-        for (uint32_t j = 0; j < 8; ++j)
-            self->a[i % 5][i / 5] ^=
-                ((uint64_t)(self->msg[(i << 3) + j]) << (j << 3));
-    KeccakPermutation(self->a);
+    uint32_t lanes = self->RATE >> 3;
+    for (uint32_t i = 0; i < lanes; ++i)
+        self->a[i % 5][i / 5] ^= LoadLE64(self->msg + (i << 3));
+    // a rate of keccak_diy may end inside a lane
+    for (uint32_t j = 0; j < (self->RATE & 7); ++j)
+        self->a[lanes % 5][lanes / 5] ^=
+            (uint64_t)self->msg[(lanes << 3) + j] << (j << 3);
+    KeccakPermutation(self->a, self->ROUNDS);
 }
-void SHA3_GetHash(SHA3Object* self, uint8_t* dst) {
-    uint64_t tmp;
-    uint32_t offset = 0;
-    uint32_t i;
-    uint64_t hl = self->hlen >> 3;
-    for (i = 0; i < hl; ++i) {
-        if (i - offset == 25) {
-            offset = i;
-            KeccakPermutation(self->a);
-        }
-        tmp = self->a[(i - offset) % 5][(i - offset) / 5];
-        for (uint8_t j = 0; j < 8; ++j) {
-            dst[(i << 3) + j] = tmp & 0xff;
-            tmp >>= 8;
+/* Squeeze len bytes to dst. *pos bytes of the current block of RATE bytes
+ * are already used, the state is permuted only when it runs out. */
+void SHA3_Squeeze(SHA3Object* self, uint8_t* dst, size_t len, uint32_t* pos) {
+    uint32_t k = *pos;
+    while (len) {
+        if (k == self->RATE) {
+            KeccakPermutation(self->a, self->ROUNDS);
+            k = 0;
         }
+        // the rest of the lane of byte k, up to the end of the block
+        uint64_t lane = self->a[(k >> 3) % 5][(k >> 3) / 5] >> ((k & 7) << 3);
+        size_t n = 8 - (k & 7);
+        if (n > self->RATE - k) n = self->RATE - k;
+        if (n > len) n = len;
+        for (size_t j = 0; j < n; ++j, lane >>= 8) dst[j] = lane;
+        dst += n;
+        len -= n;
+        k += n;
     }
-    if (i - offset == 25) {
-        offset = i;
-        KeccakPermutation(self->a);
-    }
-    tmp = self->a[(i - offset) % 5][(i - offset) / 5];
-    for (uint8_t j = 0; j < self->hlen - (i << 3); ++j) {
-        dst[(i << 3) + j] = (tmp & 255);
-        tmp >>= 8;
-    }
+    *pos = k;
+}
+void SHA3_GetHash(SHA3Object* self, uint8_t* dst) {
+    uint32_t pos = 0;
+    SHA3_Squeeze(self, dst, self->hlen, &pos);
 }
-/* Require CAP, PAD, hlen set */
+/* Require CAP, PAD, ROUNDS, hlen set */
 void SHA3_CommonReset(SHA3Object* self) {
     self->RATE = 200 - (self->CAP << 1);
     memset(self->a, 0, sizeof(self->a));
@@ -135,11 +119,12 @@ uint64_t SHA3_HashUpdate(SHA3Object* self, const uint8_t* src,
     if (!src) return self->msg_len;
     uint64_t old_chunk = self->chunk_len;
     const uint8_t* max_pos = src + bytelen;
-    self->chunk_len = read_from_arr(self->msg + old_chunk,
-                                    self->RATE - old_chunk, src, max_pos);
-    src += self->chunk_len;
-    self->msg_len += self->chunk_len << 3;
-    if (old_chunk + self->chunk_len < self->RATE) return self->msg_len;
+    uint64_t count = read_from_arr(self->msg + old_chunk,
+                                   self->RATE - old_chunk, src, max_pos);
+    src += count;
+    self->msg_len += count << 3;
+    self->chunk_len = old_chunk + count;
+    if (self->chunk_len < self->RATE) return self->msg_len;
     do {
         SHA3_HashProcess(self);
         self->chunk_len = read_from_arr(self->msg, self->RATE, src, max_pos);
@@ -148,7 +133,8 @@ uint64_t SHA3_HashUpdate(SHA3Object* self, const uint8_t* src,
     } while (self->chunk_len >= self->RATE);
     return self->msg_len;
 }
-uint64_t SHA3_HashFinal(SHA3Object* self, uint8_t* dst) {
+/* Pad and absorb the last block, then the state is ready to squeeze. */
+void SHA3_HashPad(SHA3Object* self) {
     if (self->chunk_len < self->RATE - 1) {
         self->msg[self->chunk_len] = self->PAD;
         memset(self->msg + self->chunk_len + 1, 0,
@@ -158,6 +144,9 @@ uint64_t SHA3_HashFinal(SHA3Object* self, uint8_t* dst) {
         self->msg[self->chunk_len] = self->PAD | 0x80;
     }
     SHA3_HashProcess(self);
+}
+uint64_t SHA3_HashFinal(SHA3Object* self, uint8_t* dst) {
+    SHA3_HashPad(self);
     SHA3_GetHash(self, dst);
     // reset
     uint64_t len_tmp = self->msg_len;
@@ -165,187 +154,160 @@ uint64_t SHA3_HashFinal(SHA3Object* self, uint8_t* dst) {
     return len_tmp;
 }
 
-PyObject* sha3_224(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA3Object obj;
-    obj.hlen = sha3_224_hlen;
-    obj.PAD = sha3_pad;
-    obj.CAP = sha3_224_hlen;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha3_224_hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, sha3_224_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static uint64_t SHA3_Update(HashState* self, const uint8_t* src,
+                            uint64_t bytelen) {
+    return SHA3_HashUpdate(&self->sha3, src, bytelen);
+}
+static void SHA3_Final(HashState* self, uint8_t* dst) {
+    SHA3_HashFinal(&self->sha3, dst);
+}
+static size_t SHA3_Setup(HashState* self, size_t hlen, uint32_t cap,
+                         uint8_t pad) {
+    self->sha3.hlen = hlen;
+    self->sha3.PAD = pad;
+    self->sha3.CAP = cap;
+    self->sha3.ROUNDS = keccak_rounds;
+    SHA3_CommonReset(&self->sha3);
+    return hlen;
+}
+static size_t SHA3_224_Init(HashState* self, size_t hashbit, unsigned capbit,
+                            uint8_t pad) {
+    return SHA3_Setup(self, sha3_224_hlen, sha3_224_hlen, sha3_pad);
+}
+static size_t SHA3_256_Init(HashState* self, size_t hashbit, unsigned capbit,
+                            uint8_t pad) {
+    return SHA3_Setup(self, sha3_256_hlen, sha3_256_hlen, sha3_pad);
+}
+static size_t SHA3_384_Init(HashState* self, size_t hashbit, unsigned capbit,
+                            uint8_t pad) {
+    return SHA3_Setup(self, sha3_384_hlen, sha3_384_hlen, sha3_pad);
 }
-PyObject* sha3_256(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA3Object obj;
-    obj.hlen = sha3_256_hlen;
-    obj.PAD = sha3_pad;
-    obj.CAP = sha3_256_hlen;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha3_256_hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, sha3_256_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t SHA3_512_Init(HashState* self, size_t hashbit, unsigned capbit,
+                            uint8_t pad) {
+    return SHA3_Setup(self, sha3_512_hlen, sha3_512_hlen, sha3_pad);
 }
-PyObject* sha3_384(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA3Object obj;
-    obj.hlen = sha3_384_hlen;
-    obj.PAD = sha3_pad;
-    obj.CAP = sha3_384_hlen;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha3_384_hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, sha3_384_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t SHAKE128_Init(HashState* self, size_t hashbit, unsigned capbit,
+                            uint8_t pad) {
+    return SHA3_Setup(self, shake128_hlen, shake128_hlen >> 1, shake_pad);
 }
-PyObject* sha3_512(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA3Object obj;
-    obj.hlen = sha3_512_hlen;
-    obj.PAD = sha3_pad;
-    obj.CAP = sha3_512_hlen;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(sha3_512_hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, sha3_512_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t SHAKE256_Init(HashState* self, size_t hashbit, unsigned capbit,
+                            uint8_t pad) {
+    return SHA3_Setup(self, shake256_hlen, shake256_hlen >> 1, shake_pad);
 }
-PyObject* shake128(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA3Object obj;
-    obj.hlen = shake128_hlen;
-    obj.PAD = shake_pad;
-    // intended for this: shake double hlen but keep CAP
-    obj.CAP = shake128_hlen >> 1;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(shake128_hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, shake128_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t SHAKE128l_Init(HashState* self, size_t hashbit, unsigned capbit,
+                             uint8_t pad) {
+    return SHA3_Setup(self, (hashbit + 7) >> 3, shake128_hlen >> 1,
+                      shake_pad);
 }
-PyObject* shake256(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    if (!PyArg_ParseTuple(args, "y*", &view)) return NULL;
-    SHA3Object obj;
-    obj.hlen = shake256_hlen;
-    obj.PAD = shake_pad;
-    obj.CAP = shake256_hlen >> 1;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(shake256_hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, shake256_hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t SHAKE256l_Init(HashState* self, size_t hashbit, unsigned capbit,
+                             uint8_t pad) {
+    return SHA3_Setup(self, (hashbit + 7) >> 3, shake256_hlen >> 1,
+                      shake_pad);
 }
-PyObject* shake128l(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    SHA3Object obj;
-    size_t hashbit;
-    if (!PyArg_ParseTuple(args, "y*k", &view, &hashbit)) return NULL;
-    obj.hlen = (hashbit + 7) >> 3;
-    obj.PAD = shake_pad;
-    obj.CAP = shake128_hlen >> 1;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(obj.hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, obj.hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t RawSHAKE128l_Init(HashState* self, size_t hashbit,
+                                unsigned capbit, uint8_t pad) {
+    return SHA3_Setup(self, (hashbit + 7) >> 3, shake128_hlen >> 1,
+                      rawshake_pad);
 }
-PyObject* shake256l(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    SHA3Object obj;
-    size_t hashbit;
-    if (!PyArg_ParseTuple(args, "y*k", &view, &hashbit)) return NULL;
-    obj.hlen = (hashbit + 7) >> 3;
-    obj.PAD = shake_pad;
-    obj.CAP = shake256_hlen >> 1;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(obj.hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, obj.hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t RawSHAKE256l_Init(HashState* self, size_t hashbit,
+                                unsigned capbit, uint8_t pad) {
+    return SHA3_Setup(self, (hashbit + 7) >> 3, shake256_hlen >> 1,
+                      rawshake_pad);
 }
-PyObject* rawshake128l(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    SHA3Object obj;
-    size_t hashbit;
-    if (!PyArg_ParseTuple(args, "y*k", &view, &hashbit)) return NULL;
-    obj.hlen = (hashbit + 7) >> 3;
-    obj.PAD = rawshake_pad;
-    obj.CAP = shake128_hlen >> 1;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(obj.hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, obj.hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t Keccak_DIY_Init(HashState* self, size_t hashbit, unsigned capbit,
+                              uint8_t pad) {
+    // rate must be positive
+    if (capbit > 792) return HASH_INVALID;
+    return SHA3_Setup(self, (hashbit + 7) >> 3, (capbit + 7) >> 3, pad);
 }
-PyObject* rawshake256l(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    SHA3Object obj;
-    size_t hashbit;
-    if (!PyArg_ParseTuple(args, "y*k", &view, &hashbit)) return NULL;
-    obj.hlen = (hashbit + 7) >> 3;
-    obj.PAD = rawshake_pad;
-    obj.CAP = shake256_hlen >> 1;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(obj.hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, obj.hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static size_t Keccak12_DIY_Init(HashState* self, size_t hashbit,
+                                unsigned capbit, uint8_t pad) {
+    size_t hlen = Keccak_DIY_Init(self, hashbit, capbit, pad);
+    if (hlen == HASH_INVALID) return hlen;
+    self->sha3.ROUNDS = keccak12_rounds;
+    return hlen;
 }
+const HashAlgDesc sha3_224_desc = {
+    "sha3_224", 28, 144, 0,
+    SHA3_224_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc sha3_256_desc = {
+    "sha3_256", 32, 136, 0,
+    SHA3_256_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc sha3_384_desc = {
+    "sha3_384", 48, 104, 0,
+    SHA3_384_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc sha3_512_desc = {
+    "sha3_512", 64, 72, 0,
+    SHA3_512_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc shake128_desc = {
+    "shake128", 32, 168, 0,
+    SHAKE128_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc shake256_desc = {
+    "shake256", 64, 136, 0,
+    SHAKE256_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc shake128l_desc = {
+    "shake128l", 0, 168, 1,
+    SHAKE128l_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc shake256l_desc = {
+    "shake256l", 0, 136, 1,
+    SHAKE256l_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc rawshake128l_desc = {
+    "rawshake128l", 0, 168, 1,
+    RawSHAKE128l_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc rawshake256l_desc = {
+    "rawshake256l", 0, 136, 1,
+    RawSHAKE256l_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc keccak_diy_desc = {
+    "keccak_diy", 0, 0, 3,
+    Keccak_DIY_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
+const HashAlgDesc keccak12_diy_desc = {
+    "keccak12_diy", 0, 0, 3,
+    Keccak12_DIY_Init, SHA3_Update, SHA3_Final,
+    SHA3_MultiLanes, SHA3_Multi};
 
-PyObject* keccak_diy(PyObject* self, PyObject* args) {
-    Py_buffer view;
-    SHA3Object obj;
-    size_t hashbit;
-    unsigned capbit;
-    if (!PyArg_ParseTuple(args, "y*kIb", &view, &hashbit, &capbit, &obj.PAD))
-        return NULL;
-    obj.hlen = (hashbit + 7) >> 3;
-    obj.CAP = (capbit + 7) >> 3;
-    SHA3_CommonReset(&obj);
-    SHA3_HashUpdate(&obj, view.buf, view.len);
-    char* dst = malloc(obj.hlen);
-    SHA3_HashFinal(&obj, (uint8_t*)(dst));
-    PyObject* rv = Py_BuildValue("y#", dst, obj.hlen);
-    free(dst);
-    PyBuffer_Release(&view);
-    return rv;
+static const struct {
+    const char* name;
+    uint32_t cap;
+    uint8_t pad;
+} xof_algs[] = {{"shake128", 16, 0x1f},
+                {"shake256", 32, 0x1f},
+                {"rawshake128", 16, 0x07},
+                {"rawshake256", 32, 0x07},
+                {NULL, 0, 0}};
+
+/* Set up an extendable-output function by name: shake128, shake256,
+ * rawshake128, rawshake256, or keccak_diy and keccak12_diy with capbit and
+ * pad.
+ * Return the name as a string constant, NULL if unsupported. */
+const char* SHA3_XOFInit(SHA3Object* self, const char* name, unsigned capbit,
+                         uint8_t pad) {
+    HashState* state = (HashState*)self;
+    if (strcmp(name, keccak_diy_desc.name) == 0) {
+        if (capbit > 792) return NULL;
+        SHA3_Setup(state, 0, (capbit + 7) >> 3, pad);
+        return keccak_diy_desc.name;
+    }
+    if (strcmp(name, keccak12_diy_desc.name) == 0) {
+        if (capbit > 792) return NULL;
+        Keccak12_DIY_Init(state, 0, capbit, pad);
+        return keccak12_diy_desc.name;
+    }
+    for (int i = 0; xof_algs[i].name; ++i) {
+        if (strcmp(name, xof_algs[i].name) == 0) {
+            SHA3_Setup(state, 0, xof_algs[i].cap, xof_algs[i].pad);
+            return xof_algs[i].name;
+        }
+    }
+    return NULL;
 }
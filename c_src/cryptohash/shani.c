@@ -0,0 +1,150 @@
+#include "cpu.h"
+#include "hashobject.h"
+
+/* SHA-1 and SHA-256 compression with the x86 SHA extensions. Only called
+ * when cpu_enabled[CPU_SHA], sha1.c and sha2_32.c keep the portable code. */
+
+extern const uint32_t SHA2_32_K[64];
+
+#if defined(__x86_64__) && defined(__GNUC__)
+#include <immintrin.h>
+#define SHANI_TARGET __attribute__((target("sha,sse4.1")))
+
+/* Four rounds of group g (0 to 19), message words of group g in m[g % 4].
+ * The schedule of group g + 4 is built in three steps: sha1msg1 at g - 3,
+ * xor at g - 2 and sha1msg2 at g - 1. */
+#define SHA1_ROUNDS4(g)                                                  \
+    do {                                                                 \
+        if ((g) < 4)                                                     \
+            m[(g) % 4] = _mm_shuffle_epi8(                               \
+                _mm_loadu_si128((const __m128i*)(src + 16 * (g))), mask); \
+        if ((g) == 0) {                                                  \
+            e0 = _mm_add_epi32(e0, m[0]);                                \
+            e1 = abcd;                                                   \
+            abcd = _mm_sha1rnds4_epu32(abcd, e0, 0);                     \
+        } else if ((g)&1) {                                              \
+            e1 = _mm_sha1nexte_epu32(e1, m[(g) % 4]);                    \
+            e0 = abcd;                                                   \
+            abcd = _mm_sha1rnds4_epu32(abcd, e1, (g) / 5);               \
+        } else {                                                         \
+            e0 = _mm_sha1nexte_epu32(e0, m[(g) % 4]);                    \
+            e1 = abcd;                                                   \
+            abcd = _mm_sha1rnds4_epu32(abcd, e0, (g) / 5);               \
+        }                                                                \
+        if ((g) >= 1 && (g) <= 16)                                       \
+            m[((g) + 3) % 4] =                                           \
+                _mm_sha1msg1_epu32(m[((g) + 3) % 4], m[(g) % 4]);         \
+        if ((g) >= 2 && (g) <= 17)                                       \
+            m[((g) + 2) % 4] =                                           \
+                _mm_xor_si128(m[((g) + 2) % 4], m[(g) % 4]);             \
+        if ((g) >= 3 && (g) <= 18)                                       \
+            m[((g) + 1) % 4] =                                           \
+                _mm_sha1msg2_epu32(m[((g) + 1) % 4], m[(g) % 4]);         \
+    } while (0)
+
+SHANI_TARGET void SHA1_Blocks_SHANI(uint32_t st[5], const uint8_t* src,
+                                    uint64_t nblocks) {
+    const __m128i mask =
+        _mm_set_epi64x(0x0001020304050607ULL, 0x08090a0b0c0d0e0fULL);
+    __m128i abcd, e0, e1, abcd_save, e0_save, m[4];
+    abcd = _mm_shuffle_epi32(_mm_loadu_si128((const __m128i*)st), 0x1b);
+    e0 = _mm_set_epi32(st[4], 0, 0, 0);
+    for (; nblocks; --nblocks, src += 64) {
+        abcd_save = abcd;
+        e0_save = e0;
+        SHA1_ROUNDS4(0);
+        SHA1_ROUNDS4(1);
+        SHA1_ROUNDS4(2);
+        SHA1_ROUNDS4(3);
+        SHA1_ROUNDS4(4);
+        SHA1_ROUNDS4(5);
+        SHA1_ROUNDS4(6);
+        SHA1_ROUNDS4(7);
+        SHA1_ROUNDS4(8);
+        SHA1_ROUNDS4(9);
+        SHA1_ROUNDS4(10);
+        SHA1_ROUNDS4(11);
+        SHA1_ROUNDS4(12);
+        SHA1_ROUNDS4(13);
+        SHA1_ROUNDS4(14);
+        SHA1_ROUNDS4(15);
+        SHA1_ROUNDS4(16);
+        SHA1_ROUNDS4(17);
+        SHA1_ROUNDS4(18);
+        SHA1_ROUNDS4(19);
+        e0 = _mm_sha1nexte_epu32(e0, e0_save);
+        abcd = _mm_add_epi32(abcd, abcd_save);
+    }
+    _mm_storeu_si128((__m128i*)st, _mm_shuffle_epi32(abcd, 0x1b));
+    st[4] = _mm_extract_epi32(e0, 3);
+}
+
+/* Four rounds of group g (0 to 15), message words of group g in m[g % 4].
+ * The schedule of group g + 4 is built by sha256msg1 at g - 3, then the
+ * addition of w[t-7] and sha256msg2 at g - 1. */
+#define SHA256_ROUNDS4(g)                                                \
+    do {                                                                 \
+        if ((g) < 4)                                                     \
+            m[(g) % 4] = _mm_shuffle_epi8(                               \
+                _mm_loadu_si128((const __m128i*)(src + 16 * (g))), mask); \
+        msg = _mm_add_epi32(m[(g) % 4],                                  \
+                            _mm_loadu_si128((const __m128i*)SHA2_32_K + (g))); \
+        state1 = _mm_sha256rnds2_epu32(state1, state0, msg);             \
+        if ((g) >= 3 && (g) <= 14) {                                     \
+            tmp = _mm_alignr_epi8(m[(g) % 4], m[((g) + 3) % 4], 4);      \
+            m[((g) + 1) % 4] = _mm_add_epi32(m[((g) + 1) % 4], tmp);     \
+            m[((g) + 1) % 4] =                                           \
+                _mm_sha256msg2_epu32(m[((g) + 1) % 4], m[(g) % 4]);       \
+        }                                                                \
+        msg = _mm_shuffle_epi32(msg, 0x0e);                              \
+        state0 = _mm_sha256rnds2_epu32(state0, state1, msg);             \
+        if ((g) >= 1 && (g) <= 12)                                       \
+            m[((g) + 3) % 4] =                                           \
+                _mm_sha256msg1_epu32(m[((g) + 3) % 4], m[(g) % 4]);       \
+    } while (0)
+
+SHANI_TARGET void SHA2_32_Blocks_SHANI(uint32_t st[8], const uint8_t* src,
+                                       uint64_t nblocks) {
+    const __m128i mask =
+        _mm_set_epi64x(0x0c0d0e0f08090a0bULL, 0x0405060700010203ULL);
+    __m128i state0, state1, save0, save1, msg, tmp, m[4];
+    // the rounds instruction wants the state as (a, b, e, f), (c, d, g, h)
+    tmp = _mm_shuffle_epi32(_mm_loadu_si128((const __m128i*)st), 0xb1);
+    state1 =
+        _mm_shuffle_epi32(_mm_loadu_si128((const __m128i*)(st + 4)), 0x1b);
+    state0 = _mm_alignr_epi8(tmp, state1, 8);
+    state1 = _mm_blend_epi16(state1, tmp, 0xf0);
+    for (; nblocks; --nblocks, src += 64) {
+        save0 = state0;
+        save1 = state1;
+        SHA256_ROUNDS4(0);
+        SHA256_ROUNDS4(1);
+        SHA256_ROUNDS4(2);
+        SHA256_ROUNDS4(3);
+        SHA256_ROUNDS4(4);
+        SHA256_ROUNDS4(5);
+        SHA256_ROUNDS4(6);
+        SHA256_ROUNDS4(7);
+        SHA256_ROUNDS4(8);
+        SHA256_ROUNDS4(9);
+        SHA256_ROUNDS4(10);
+        SHA256_ROUNDS4(11);
+        SHA256_ROUNDS4(12);
+        SHA256_ROUNDS4(13);
+        SHA256_ROUNDS4(14);
+        SHA256_ROUNDS4(15);
+        state0 = _mm_add_epi32(state0, save0);
+        state1 = _mm_add_epi32(state1, save1);
+    }
+    tmp = _mm_shuffle_epi32(state0, 0x1b);
+    state1 = _mm_shuffle_epi32(state1, 0xb1);
+    _mm_storeu_si128((__m128i*)st, _mm_blend_epi16(tmp, state1, 0xf0));
+    _mm_storeu_si128((__m128i*)(st + 4), _mm_alignr_epi8(state1, tmp, 8));
+}
+#else
+// never called, CPU_SHA is not detected on other platforms
+void SHA1_Blocks_SHANI(uint32_t st[5], const uint8_t* src, uint64_t nblocks) {
+}
+void SHA2_32_Blocks_SHANI(uint32_t st[8], const uint8_t* src,
+                          uint64_t nblocks) {}
+#endif
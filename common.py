@@ -1,45 +1,61 @@
 """Common functions and exception handling."""
 
 
+def _oslen(i: int):
+    """Octets of the shortest two's complement form of i, as in DER."""
+    return (i if i >= 0 else ~i).bit_length() // 8 + 1
+
+
 def i2osp(i: int, k=None):
-    osp = bytearray()
-    osp.append(i & 0xFF)
-    i >>= 8
-    if i >= 0:
-        while i != 0:
-            osp.append(i & 0xFF)
-            i >>= 8
-        if osp[-1] & 0x80:
-            osp.append(0)
+    """Octet string of i, big-endian, as a bytearray.
+
+    Without k, i is in the shortest two's complement form. With k, a
+    shorter form is padded with zero octets on the left and a longer one
+    keeps its last k octets, such as the sign octet of a positive RSA value
+    with the top bit set.
+    """
+    if k is None:
+        return bytearray(i.to_bytes(_oslen(i), "big", signed=True))
+    if 0 <= i and i.bit_length() <= k << 3:
+        return bytearray(i.to_bytes(k, "big"))
+    l = _oslen(i)
+    if k < l:
+        return bytearray((i & ((1 << (k << 3)) - 1)).to_bytes(k, "big"))
+    return bytearray(k - l) + i.to_bytes(l, "big", signed=True)
+
+
+def i2osp_into(i: int, buf, offset=0, k=None):
+    """Write i2osp(i, k) into the writable buffer buf at offset, return the
+    index after it."""
+    if k is not None and 0 <= i and i.bit_length() <= k << 3:
+        osp = i.to_bytes(k, "big")
     else:
-        while i != -1:
-            osp.append(i & 0xFF)
-            i >>= 8
-        if not osp[-1] & 0x80:
-            osp.append(0xFF)
-    osp.reverse()
-    l = len(osp)
-    if k is not None:
-        if k > l:
-            return bytearray(k - l) + osp
-        elif k < l:
-            return osp[-k:]
-    return osp
+        osp = i2osp(i, k)
+    end = offset + len(osp)
+    buf[offset:end] = osp
+    return end
+
+
+def i2osp_many(ints, k):
+    """Non-negative integers of at most k octets each, as one bytearray of
+    consecutive k-octet strings."""
+    return bytearray(b"".join(i.to_bytes(k, "big") for i in ints))
 
 
 def os2ip(osp, possible_negative=True):
-    if possible_negative and osp[0] & 0x80:
-        i = -1
-    else:
-        i = 0
-    for o in osp:
-        i <<= 8
-        i |= o
-    return i
+    """Integer of the big-endian octet string osp, in two's complement if
+    possible_negative."""
+    return int.from_bytes(osp, "big", signed=possible_negative)
 
 
 def os2ui(osp):
-    return os2ip(osp, False)
+    return int.from_bytes(osp, "big")
+
+
+def os2ip_many(osp, k):
+    """Non-negative integers of the consecutive k-octet strings of osp."""
+    m = memoryview(osp).cast("B")
+    return [int.from_bytes(m[j : j + k], "big") for j in range(0, len(m), k)]
 
 
 class CryptoError(Exception):
@@ -1,10 +1,11 @@
 from common import *
-import warnings
 import c_src.cryptohash
 import asn1
 
 
 class ASN1_HashAlg(asn1.AlgID):
+    __slots__ = ("hlen", "collision_resist", "extension_resist")
+
     def __init__(self, oid, param, func, hlen, collision_resist, extension_resist):
         self.oid = oid
         self.param = param
@@ -15,15 +16,43 @@ class ASN1_HashAlg(asn1.AlgID):
         self.collision_resist = collision_resist
         self.extension_resist = extension_resist
 
+    @classmethod
+    def fromlist(cls, ls):
+        """The algorithm of AlgorithmIdentifier ls, looked up by its OID."""
+        for alg in globals().values():
+            if isinstance(alg, cls) and alg.oid.identifier == ls[0].identifier:
+                return alg
+        raise DecodeError(f"unknown hash algorithm {ls[0].identifier}")
+
     def __call__(self, octets):
+        # func is the C function itself
         if self.param is None:
             return self.func(octets)
-        else:
-            return self.func(octets, param)
+        return self.func(octets, self.param)
 
     def security_strength(self):
         return self.collision_resist
 
+    @property
+    def name(self):
+        """Name of the hash function, same in this module and c_src.cryptohash."""
+        return self.func.__name__
+
+    def new(self, message=None):
+        """Return an incremental hash object of this algorithm."""
+        if self.param is None:
+            return new(self.name, message)
+        else:
+            return new(self.name, message, self.param)
+
+    def hmac(self, key, message=None):
+        """Return an HMAC object of this algorithm keyed with key."""
+        return hmac_new(self, key, message)
+
+    def digest_into(self, message, out, offset=0):
+        """Write the digest of message to out[offset:offset + hlen]."""
+        return digest_into(self, message, out, offset)
+
 
 class ASN1_DigestInfo:
     def __init__(self, algid: ASN1_HashAlg, digest):
@@ -47,163 +76,240 @@ class ASN1_DigestInfo:
         return index
 
 
-def _warn_hash(typebit, msg_len):
-    if typebit == 512:
-        # 2^64 bits message length
-        if msg_len >= 1 << 61:
-            warnings.warn("message too long, hash insecure", SecurityWarning)
-    elif typebit == 1024:
-        # 2^128 bits message length
-        if msg_len >= 1 << 125:
-            warnings.warn("message too long, hash insecure", SecurityWarning)
+# One-shot hash functions, func(message, *params) -> digest, called without
+# a Python wrapper: the C functions take str (hashed as utf-8) themselves.
+# params: t of sha512t, l of the shake*l functions, (l, cap, pad) of
+# keccak_diy and of keccak12_diy, which runs Keccak-p[1600, 12] (TurboSHAKE).
+# One buffer cannot reach the 2^64-bit length limit of SHA-1 and SHA-2.
+md5 = c_src.cryptohash.md5
+sha1 = c_src.cryptohash.sha1
+sha224 = c_src.cryptohash.sha224
+sha256 = c_src.cryptohash.sha256
+sha384 = c_src.cryptohash.sha384
+sha512 = c_src.cryptohash.sha512
+sha512t = c_src.cryptohash.sha512t
+sha512_224 = c_src.cryptohash.sha512_224
+sha512_256 = c_src.cryptohash.sha512_256
+sha3_224 = c_src.cryptohash.sha3_224
+sha3_256 = c_src.cryptohash.sha3_256
+sha3_384 = c_src.cryptohash.sha3_384
+sha3_512 = c_src.cryptohash.sha3_512
+shake128 = c_src.cryptohash.shake128
+shake256 = c_src.cryptohash.shake256
+shake128l = c_src.cryptohash.shake128l
+shake256l = c_src.cryptohash.shake256l
+rawshake128l = c_src.cryptohash.rawshake128l
+rawshake256l = c_src.cryptohash.rawshake256l
+keccak_diy = c_src.cryptohash.keccak_diy
+keccak12_diy = c_src.cryptohash.keccak12_diy
+
+
+Hash = c_src.cryptohash.Hash
+
+
+def new(name, message=None, *params):
+    """Return an incremental hash object, like hashlib.new.
+
+    name -- name of any hash function above, e.g. "sha256", "shake128l"
+    message -- optional initial message
+    params -- extra parameters of the hash function, e.g. t of sha512t,
+              l of shake128l, (l, cap, pad) of keccak_diy and keccak12_diy
+
+    The object supports update(data), copy(), digest() and hexdigest(),
+    so that long messages can be hashed piece by piece in constant memory.
+    """
+    return c_src.cryptohash.new(name, message, *params)
+
+
+XOF = c_src.cryptohash.XOF
+
+
+def new_xof(name, message=None, *params):
+    """Return an extendable-output function object.
+
+    name -- "shake128", "shake256", "rawshake128", "rawshake256", or
+            "keccak_diy" and "keccak12_diy" with params (cap, pad)
+    message -- optional initial message
+
+    The object supports update(data) until the first read(n) or
+    readinto(buffer), which squeeze the next bytes of output. Reads continue
+    where the last one stopped, so output of any length can be streamed
+    without keeping it in memory.
+    """
+    if isinstance(message, str):
+        message = bytes(message, "utf-8")
+    return c_src.cryptohash.new_xof(name, message, *params)
 
 
-def md5(message):
-    if isinstance(message, str):
-        return c_src.cryptohash.md5(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.md5(message)
+HMAC = c_src.cryptohash.HMAC
 
 
-def sha1(message):
-    _warn_hash(512, len(message))
-    if isinstance(message, str):
-        return c_src.cryptohash.sha1(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha1(message)
+def _alg_name(alg, params):
+    """Return (name, params) of an ASN1_HashAlg or a name with params."""
+    if isinstance(alg, ASN1_HashAlg):
+        if alg.param is not None:
+            params = (alg.param,)
+        alg = alg.name
+    return alg, params
 
 
-def sha224(message):
-    _warn_hash(512, len(message))
+def _octets(message):
     if isinstance(message, str):
-        return c_src.cryptohash.sha224(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha224(message)
+        return bytes(message, "utf-8")
+    return message
 
 
-def sha256(message):
-    _warn_hash(512, len(message))
-    if isinstance(message, str):
-        return c_src.cryptohash.sha256(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha256(message)
+def hmac_new(alg, key, message=None, *params):
+    """Return an HMAC object (RFC 2104) keyed with key.
 
+    alg -- ASN1_HashAlg, or name of a hash function as in new
+    params -- extra parameters of the hash function, as in new
 
-def sha384(message):
-    _warn_hash(1024, len(message))
-    if isinstance(message, str):
-        return c_src.cryptohash.sha384(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha384(message)
+    The key pads are absorbed once, the object keeps the midstates. It
+    supports update(data), copy(), digest() and hexdigest() like a hash
+    object, and new(message=None) for another message with the same key.
+    """
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.hmac_new(
+        alg, _octets(key), _octets(message), *params
+    )
 
 
-def sha512(message):
-    _warn_hash(1024, len(message))
-    if isinstance(message, str):
-        return c_src.cryptohash.sha512(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha512(message)
+def hmac(alg, key, message, *params):
+    """Return HMAC of message under key, see hmac_new."""
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.hmac(alg, _octets(key), _octets(message), *params)
 
 
-def sha512t(message, t):
-    _warn_hash(1024, len(message))
-    if isinstance(message, str):
-        return c_src.cryptohash.sha512t(bytes(message, "utf-8"), t)
-    else:
-        return c_src.cryptohash.sha512t(message, t)
+def pbkdf2_hmac(alg, password, salt, iterations, dklen=None, *params):
+    """PBKDF2 (RFC 8018) with HMAC of alg, like hashlib.pbkdf2_hmac.
 
+    dklen -- length of the derived key in byte, default the digest length
 
-def sha512_224(message):
-    _warn_hash(1024, len(message))
-    if isinstance(message, str):
-        return c_src.cryptohash.sha512_224(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha512_224(message)
+    The iterations run in C on the HMAC midstates of password, without the
+    GIL.
+    """
+    if dklen is not None and dklen < 1:
+        raise ValueError("dklen must be positive")
+    alg, params = _alg_name(alg, params)
+    # 0 for the digest length in C
+    dklen = 0 if dklen is None else dklen
+    return c_src.cryptohash.pbkdf2_hmac(
+        alg, _octets(password), _octets(salt), iterations, dklen, *params
+    )
 
 
-def sha512_256(message):
-    _warn_hash(1024, len(message))
-    if isinstance(message, str):
-        return c_src.cryptohash.sha512_256(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha512_256(message)
+def hkdf_extract(alg, salt, ikm, *params):
+    """HKDF-Extract (RFC 5869): return the pseudorandom key HMAC(salt, ikm).
 
+    salt -- None for hlen zero bytes
+    """
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.hkdf_extract(
+        alg, _octets(salt), _octets(ikm), *params
+    )
 
-def sha3_224(message):
-    if isinstance(message, str):
-        return c_src.cryptohash.sha3_224(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha3_224(message)
 
+def hkdf_expand(alg, prk, info, length, *params):
+    """HKDF-Expand (RFC 5869): return length bytes of keying material."""
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.hkdf_expand(
+        alg, _octets(prk), _octets(info), length, *params
+    )
 
-def sha3_256(message):
-    if isinstance(message, str):
-        return c_src.cryptohash.sha3_256(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha3_256(message)
 
+def hkdf(alg, ikm, salt, info, length, *params):
+    """HKDF-Extract then HKDF-Expand."""
+    prk = hkdf_extract(alg, salt, ikm, *params)
+    return hkdf_expand(alg, prk, info, length, *params)
 
-def sha3_384(message):
-    if isinstance(message, str):
-        return c_src.cryptohash.sha3_384(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha3_384(message)
 
+def mgf1_xor(alg, seed, target, *params):
+    """XOR the MGF1 mask (RFC 8017 B.2.1) of seed into the writable buffer
+    target in place, with as many mask bytes as target has."""
+    alg, params = _alg_name(alg, params)
+    c_src.cryptohash.mgf1_xor(alg, _octets(seed), target, *params)
 
-def sha3_512(message):
-    if isinstance(message, str):
-        return c_src.cryptohash.sha3_512(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.sha3_512(message)
 
+def hash_many(alg, messages, out=None, *params, prefix=None):
+    """Hash every message of an iterable in one C call.
 
-def shake128(message):
-    if isinstance(message, str):
-        return c_src.cryptohash.shake128(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.shake128(message)
+    alg -- ASN1_HashAlg, or name of a hash function as in new
+    messages -- iterable of bytes-like objects or str
+    out -- optional writable buffer (e.g. bytearray) of at least
+           len(messages) * hlen bytes
+    params -- extra parameters of the hash function, as in new
+    prefix -- optional bytes hashed before every message, absorbed once
 
+    Return the list of digests, or out with the digests written consecutively.
+    """
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.hash_many(
+        alg, messages, out, *params, prefix=prefix
+    )
 
-def shake256(message):
-    if isinstance(message, str):
-        return c_src.cryptohash.shake256(bytes(message, "utf-8"))
-    else:
-        return c_src.cryptohash.shake256(message)
 
+def digest_into(alg, message, out, offset=0, *params):
+    """Hash message and write the digest into the writable buffer out.
 
-def shake128l(message, l):
-    if isinstance(message, str):
-        return c_src.cryptohash.shake128l(bytes(message, "utf-8"), l)
-    else:
-        return c_src.cryptohash.shake128l(message, l)
+    alg -- ASN1_HashAlg, or name of a hash function as in new
+    offset -- where the digest starts in out
 
+    Return the number of bytes written. No bytes object is created, so
+    digests can be assembled in place, e.g. in a mask being built.
+    Hash and HMAC objects have the method digest_into(out, offset=0) too.
+    """
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.digest_into(
+        alg, _octets(message), out, offset, *params
+    )
 
-def shake256l(message, l):
-    if isinstance(message, str):
-        return c_src.cryptohash.shake256l(bytes(message, "utf-8"), l)
-    else:
-        return c_src.cryptohash.shake256l(message, l)
 
+def hash_chunks(alg, message, chunk_size, threads=0, *params, prefix=None):
+    """Return the concatenated digests of the chunks of message.
 
-def rawshake128l(message, l):
-    if isinstance(message, str):
-        return c_src.cryptohash.rawshake128l(bytes(message, "utf-8"), l)
-    else:
-        return c_src.cryptohash.rawshake128l(message, l)
+    message is split into chunks of chunk_size bytes, the last one possibly
+    shorter. The chunks are hashed in C on up to threads threads (0 for one
+    per CPU) with the GIL released, as the leaves of a tree hash. prefix,
+    optional bytes hashed before every chunk, is absorbed once.
+    """
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.hash_chunks(
+        alg, _octets(message), chunk_size, threads, *params, prefix=prefix
+    )
 
 
-def rawshake256l(message, l):
-    if isinstance(message, str):
-        return c_src.cryptohash.rawshake256l(bytes(message, "utf-8"), l)
-    else:
-        return c_src.cryptohash.rawshake256l(message, l)
+def hash_file(path_or_fd, alg, *params):
+    """Hash a file in C without the GIL, return the digest.
 
+    path_or_fd -- path (str, bytes or os.PathLike), or an open file descriptor
+                  which is hashed from its current offset to the end
+    alg -- ASN1_HashAlg, or name of a hash function as in new
+    params -- extra parameters of the hash function, as in new
 
-def keccak_diy(message, l, cap, pad):
-    if isinstance(message, str):
-        return c_src.cryptohash.keccak_diy(bytes(message, "utf-8"), l, cap, pad)
-    else:
-        return c_src.cryptohash.keccak_diy(message, l, cap, pad)
+    The file is read in chunks to its end, so neither the file nor a copy of
+    it is held in memory.
+    """
+    alg, params = _alg_name(alg, params)
+    return c_src.cryptohash.hash_file(alg, path_or_fd, *params)
+
+
+def cpu_features():
+    """Return {feature: enabled} of the CPU features usable by the C extension.
+
+    sse2, avx2 -- multi-buffer SIMD hashing in hash_many
+    sha -- SHA-NI compression for sha1, sha224 and sha256
+    """
+    return c_src.cryptohash.cpu_features()
+
+
+def set_cpu_features(**features):
+    """Enable or disable CPU features, e.g. set_cpu_features(sha=False).
+
+    Used to test and benchmark every implementation on one machine.
+    A feature not supported by the CPU cannot be enabled.
+    """
+    c_src.cryptohash.set_cpu_features(features)
 
 
 id_digest_alg = asn1.OID(
@@ -248,6 +354,30 @@ alg_shake256 = ASN1_HashAlg(id_shake256, None, shake256, 64, 256, 512)
 
 
 if __name__ == "__main__":
+    import hashlib
+
+    # FIPS 202 known answers, then hashlib at lengths about the rates, which
+    # also squeeze several blocks
+    assert sha3_224(b"abc").hex() == (
+        "e642824c3f8cf24ad09234ee7d3c766fc9a3a5168d0c94ad73b46fdf"
+    )
+    assert shake256l(b"", 256).hex() == (
+        "46b9dd2b0ba88d13233b3feb743eeb243fcd52ea62b81b82b50c27646ed5762f"
+    )
+    for n in (0, 1, 71, 72, 73, 103, 104, 135, 136, 137, 167, 168, 169, 500):
+        m = (bytes(range(256)) * 2)[:n]
+        for f, g in ((sha3_224, hashlib.sha3_224), (sha3_256, hashlib.sha3_256)):
+            assert f(m) == g(m).digest(), (f, n)
+        for f, g in ((sha3_384, hashlib.sha3_384), (sha3_512, hashlib.sha3_512)):
+            assert f(m) == g(m).digest(), (f, n)
+        assert shake128l(m, 8 * 400) == hashlib.shake_128(m).digest(400), n
+        assert shake256l(m, 8 * 300) == hashlib.shake_256(m).digest(300), n
+    # a rate of 190 bytes, the last of its lanes absorbed in part
+    assert keccak_diy(bytes(range(256)) * 2, 320, 40, 6).hex() == (
+        "e06b93c33834fe700636955927fadde68956eecfab5ff628"
+        "f9903e4a1fead00c6378c4500e67f1e2"
+    )
+    print("SHA-3 tests passed!")
     print("md5:", alg_md5.encode().hex())
     print("sha512/256:", alg_sha512_256.encode().hex())
     a = input("Message: ")
@@ -270,3 +400,11 @@ if __name__ == "__main__":
     print(f"shake128l (l=256): 0x {shake128l(a, 256).hex()}")
     print(f"shake256: 0x {shake256(a).hex()}")
     print(f"shake256l (l=512): 0x {shake256l(a, 512).hex()}")
+    h = new("sha256")
+    for c in a:
+        h.update(bytes(c, "utf-8"))
+    print(f"sha256 (incremental): 0x {h.hexdigest()}")
+    print(f"sha256 (batch): 0x {hash_many(alg_sha256, [a])[0].hex()}")
+    print(f"hmac-sha256 (key 'key'): 0x {hmac(alg_sha256, 'key', a).hex()}")
+    x = new_xof("shake256", a)
+    print(f"shake256 (xof, 2 reads): 0x {x.read(32).hex()} {x.read(32).hex()}")
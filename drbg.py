@@ -0,0 +1,251 @@
+"""Deterministic random bit generators of NIST SP 800-90A: Hash_DRBG, HMAC_DRBG.
+
+Both are random.Random subclasses, so that randint, randrange, choice and the
+rest come with them, and can be passed as rng wherever random numbers are
+drawn: keygen and signing in rsa and dsa, prime generation in arith.primes.
+Generate requests are issued for whole blocks of output (64 KiB, the most
+SP 800-90A allows per request), which small draws such as getrandbits(256)
+are then served from.
+
+Every thread has its own default generator, seeded from os.urandom on first
+use. seed(a) replaces it by one instantiated from a alone, so that a run with
+the same seed draws the same keys, salts and primes.
+"""
+import os
+import random
+import threading
+import cryptohash
+from common import *
+
+# bytes in one generate request, 2^19 bits
+MAX_REQUEST = 1 << 16
+RESEED_INTERVAL = 1 << 48
+
+
+def _octets(s):
+    if isinstance(s, str):
+        return bytes(s, "utf-8")
+    if isinstance(s, int):
+        return s.to_bytes((s.bit_length() + 8) >> 3, "big", signed=True)
+    return bytes(s)
+
+
+class DRBG(random.Random):
+    """Common part of the DRBGs: seeding, reseeding and buffered output.
+
+    seed -- None to instantiate from os.urandom, otherwise bytes, str or int
+            used as the only entropy input, for reproducible output
+    alg -- ASN1_HashAlg of the underlying hash function
+    personalization -- personalization string of the instantiation
+    block -- bytes generated at once for the buffered output
+    """
+
+    def __init__(
+        self, seed=None, alg=cryptohash.alg_sha256, personalization=b"", block=1 << 16
+    ):
+        if not 0 < block <= MAX_REQUEST:
+            raise ValueError(f"block must be in [1, {MAX_REQUEST}]")
+        self.alg = alg
+        self.personalization = _octets(personalization)
+        self.block = block
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        """Instantiate again, from os.urandom if a is None, otherwise from a."""
+        self.from_urandom = a is None
+        if a is None:
+            entropy, nonce = os.urandom(self.alg.hlen), os.urandom(self.alg.hlen >> 1)
+        else:
+            entropy, nonce = _octets(a), b""
+        self.instantiate(entropy, nonce, self.personalization)
+        self.gauss_next = None
+
+    def instantiate(self, entropy, nonce=b"", personalization=b""):
+        self._instantiate(entropy + nonce + _octets(personalization))
+        self.reseed_counter = 1
+        self._buf = b""
+        self._pos = 0
+
+    def reseed(self, entropy=None, additional=b""):
+        """Reseed, with entropy from os.urandom if it is None."""
+        if entropy is None:
+            entropy = os.urandom(self.alg.hlen)
+        self._reseed(entropy + _octets(additional))
+        self.reseed_counter = 1
+        self._buf = b""
+        self._pos = 0
+
+    def generate(self, n, additional=b""):
+        """One generate request of n bytes, unbuffered."""
+        if not 0 <= n <= MAX_REQUEST:
+            raise ValueError(f"request must be in [0, {MAX_REQUEST}] bytes")
+        if self.reseed_counter > RESEED_INTERVAL:
+            self.reseed()
+        out = self._generate(n, _octets(additional))
+        self.reseed_counter += 1
+        return out
+
+    def randbytes(self, n):
+        pos = self._pos
+        if pos + n <= len(self._buf):
+            self._pos = pos + n
+            return self._buf[pos : pos + n]
+        out = bytearray(self._buf[pos:])
+        while True:
+            self._buf = self.generate(self.block)
+            need = n - len(out)
+            if need <= self.block:
+                out += self._buf[:need]
+                self._pos = need
+                return bytes(out)
+            out += self._buf
+
+    def getrandbits(self, k):
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        n = (k + 7) >> 3
+        return int.from_bytes(self.randbytes(n), "big") >> ((n << 3) - k)
+
+    def random(self):
+        return self.getrandbits(53) / (1 << 53)
+
+    # a saved state restored, or a copy, would give the same output again: the
+    # same salts, and the same DSA k, which gives the private key away
+    def getstate(self):
+        raise TypeError("DRBG state cannot be saved or restored")
+
+    def setstate(self, state):
+        raise TypeError("DRBG state cannot be saved or restored")
+
+
+class HashDRBG(DRBG):
+    """Hash_DRBG (SP 800-90A section 10.1.1).
+
+    The hashgen output blocks are hashes of V, V+1, ..., which are joined
+    into one buffer and hashed by one hash_chunks call."""
+
+    def _instantiate(self, material):
+        # seedlen of table 2, 440 bit up to SHA-256, 888 bit above
+        self.seedlen = 55 if self.alg.hlen <= 32 else 111
+        self._mask = (1 << (self.seedlen << 3)) - 1
+        self._set_seed(self._hash_df(material))
+
+    def _reseed(self, material):
+        self._set_seed(self._hash_df(b"\x01" + self._vbytes() + material))
+
+    def _set_seed(self, seed):
+        self._v = int.from_bytes(seed, "big")
+        self._c = int.from_bytes(self._hash_df(b"\x00" + seed), "big")
+
+    def _vbytes(self):
+        return self._v.to_bytes(self.seedlen, "big")
+
+    def _hash_df(self, data):
+        hlen = self.alg.hlen
+        bits = (self.seedlen << 3).to_bytes(4, "big")
+        count = -(-self.seedlen // hlen)
+        out = bytearray(count * hlen)
+        cryptohash.hash_many(
+            self.alg, [bytes((i,)) + bits + data for i in range(1, count + 1)], out
+        )
+        return bytes(out[: self.seedlen])
+
+    def _generate(self, n, additional):
+        v, mask, sl = self._v, self._mask, self.seedlen
+        if additional:
+            w = self.alg(b"\x02" + self._vbytes() + additional)
+            v = (v + int.from_bytes(w, "big")) & mask
+            self._v = v
+        count = -(-n // self.alg.hlen)
+        data = b"".join(((v + i) & mask).to_bytes(sl, "big") for i in range(count))
+        out = cryptohash.hash_chunks(self.alg, data, sl, 1)[:n]
+        h = int.from_bytes(self.alg(b"\x03" + self._vbytes()), "big")
+        self._v = (v + h + self._c + self.reseed_counter) & mask
+        return out
+
+
+class HmacDRBG(DRBG):
+    """HMAC_DRBG (SP 800-90A section 10.1.2).
+
+    The HMAC object of key K is kept between updates, so that each output
+    block costs the two compressions of V and not the key pads again."""
+
+    def _instantiate(self, material):
+        self._v = b"\x01" * self.alg.hlen
+        self._mac = cryptohash.hmac_new(self.alg, bytes(self.alg.hlen))
+        self._update(material)
+
+    def _reseed(self, material):
+        self._update(material)
+
+    def _update(self, provided):
+        self._mac = cryptohash.hmac_new(
+            self.alg, self._mac.new(self._v + b"\x00" + provided).digest()
+        )
+        self._v = self._mac.new(self._v).digest()
+        if provided:
+            self._mac = cryptohash.hmac_new(
+                self.alg, self._mac.new(self._v + b"\x01" + provided).digest()
+            )
+            self._v = self._mac.new(self._v).digest()
+
+    def _generate(self, n, additional):
+        if additional:
+            self._update(additional)
+        hlen = self.alg.hlen
+        out = bytearray(-(-n // hlen) * hlen)
+        v = self._v
+        for i in range(0, len(out), hlen):
+            v = self._mac.new(v).digest()
+            out[i : i + hlen] = v
+        self._v = v
+        self._update(additional)
+        return bytes(out[:n])
+
+
+_local = threading.local()
+
+
+def get_rng():
+    """The generator of the calling thread, a HashDRBG unless set_rng."""
+    rng = getattr(_local, "rng", None)
+    if rng is None:
+        rng = _local.rng = HashDRBG()
+    return rng
+
+
+def set_rng(rng):
+    """Make rng, any random.Random, the generator of the calling thread."""
+    _local.rng = rng
+
+
+def seed(a=None, alg=cryptohash.alg_sha256):
+    """Give the calling thread a HashDRBG seeded with a, see DRBG."""
+    set_rng(HashDRBG(a, alg))
+
+
+def _after_fork():
+    # a child must not replay the output of its parent
+    rng = getattr(_local, "rng", None)
+    if isinstance(rng, DRBG) and rng.from_urandom:
+        rng.seed()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+if __name__ == "__main__":
+    # RFC 6979 A.2.5: k of ECDSA P-256 with SHA-256 over "sample" is the first
+    # output of HMAC_DRBG on the private key x and the message hash h1
+    x = bytes.fromhex(
+        "C9AFA9D845BA75166B5C215767B1D6934E50C3DB36E89B127B8A622B120F6721"
+    )
+    h1 = cryptohash.sha256("sample")
+    rng = HmacDRBG(b"")
+    rng.instantiate(x, h1)
+    print("HMAC_DRBG k:", rng.generate(32).hex())
+    seed(2023)
+    a = get_rng().getrandbits(256)
+    seed(2023)
+    print("reproducible:", a == get_rng().getrandbits(256))
+    print("Hash_DRBG:", HashDRBG().randbytes(16).hex())
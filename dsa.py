@@ -1,9 +1,10 @@
 from common import *
 import warnings
-import random
+import drbg
 import cryptohash
 import asn1
-from arith import basic, mod, primes
+import hash_math
+from arith import basic, mod, power, primes
 
 id_x9_57_alg = asn1.OID("1.2.840.10040.4", "/ISO/Member-Body/US/X9-57/X9Algorithm")
 id_dsa = id_x9_57_alg.subnode("1", "DSA")
@@ -30,15 +31,93 @@ def secure_ln(strength):
         return 15360, 512
 
 
+# powers of g a domain, and signatures a public key verifies, by pow before
+# a comb table of g or y is made; the table costs a few dozen pows to set up
+FIXED_BASE_AFTER = 8
+
+
+def _fixed_base(fb, base, modulus, bits, width, tables):
+    """fb if it is the table of base with width and tables, else a new one."""
+    if (
+        fb is None
+        or fb.base != base
+        or fb.modulus != modulus
+        or width not in (None, fb.width)
+        or tables not in (None, fb.tables)
+    ):
+        fb = power.FixedBase(
+            base,
+            modulus,
+            bits,
+            width or power.COMB_WIDTH,
+            tables or power.COMB_TABLES,
+        )
+    return fb
+
+
 class DSADomain:
+    __slots__ = ("l", "n", "p", "q", "g", "seed", "_fixed_base", "_uses")
+
     def encode(self):
         return asn1.encode_sequence([self.p, self.q, self.g])
 
+    def fixed_base(self, width=None, tables=None):
+        """Comb table of g for exponents below q, made on first call. pow_g
+        and verify make it by themselves after FIXED_BASE_AFTER uses of g.
+
+        width and tables, see arith.power.FixedBase, trade memory and setup
+        time for speed; giving values other than those of the kept table
+        makes it again, and later g^e use the new one."""
+        self._fixed_base = _fixed_base(
+            getattr(self, "_fixed_base", None),
+            self.g,
+            self.p,
+            self.q.bit_length(),
+            width,
+            tables,
+        )
+        return self._fixed_base
+
+    def _g(self):
+        """g for one more use: its comb table once there is one or it pays
+        off, else g itself."""
+        self._uses = getattr(self, "_uses", 0) + 1
+        if (
+            getattr(self, "_fixed_base", None) is not None
+            or self._uses > FIXED_BASE_AFTER
+        ):
+            return self.fixed_base()
+        return self.g
+
+    def pow_g(self, e):
+        """g^e mod p, by the comb table of g once it pays off."""
+        g = self._g()
+        if isinstance(g, power.FixedBase):
+            return g.pow(e)
+        return pow(g, e, self.p)
+
 
 class DSAPublicKey:
+    __slots__ = ("domain", "y", "_verified", "_fixed_base")
+
     def __init__(self, domain, y):
         self.domain = domain
         self.y = y
+        self._verified = 0
+        self._fixed_base = None
+
+    def fixed_base(self, width=None, tables=None):
+        """Comb table of y, as DSADomain.fixed_base is of g. verify makes it
+        by itself after FIXED_BASE_AFTER signatures."""
+        self._fixed_base = _fixed_base(
+            self._fixed_base,
+            self.y,
+            self.domain.p,
+            self.domain.q.bit_length(),
+            width,
+            tables,
+        )
+        return self._fixed_base
 
     def verify(self, msg, sign, hash_alg=cryptohash.alg_sha1):
         # sign=(r,s)
@@ -52,21 +131,33 @@ class DSAPublicKey:
         if klen < hash_alg.hlen:
             h = h[:klen]
         h = os2ui(h)
-        v1 = pow(self.domain.g, (h * w).value, self.domain.p)
-        v2 = pow(self.y, (sign[0] * w).value, self.domain.p)
-        return v1 * v2 % self.domain.p % self.domain.q == sign[0]
+        # g^u1 * y^u2 in one chain, with the tables of g and y once they pay
+        # off
+        self._verified += 1
+        y = self.y
+        if self._fixed_base is not None or self._verified > FIXED_BASE_AFTER:
+            y = self.fixed_base()
+        v = power.multi_pow(
+            self.domain.p,
+            [(self.domain._g(), (h * w).value), (y, (sign[0] * w).value)],
+        )
+        return v % self.domain.q == sign[0]
 
     def encode(self):
         return asn1.encode_int(self.y)
 
 
 class DSAPrivateKey:
+    __slots__ = ("domain", "x", "y")
+
     def get_public_key(self):
         return DSAPublicKey(self.domain, self.y)
 
-    def sign(self, msg, hash_alg=cryptohash.alg_sha1):
-        assert pow(self.domain.g, self.x, self.domain.p) == self.y
-        assert pow(self.domain.g, self.domain.q, self.domain.p) == 1
+    def sign(self, msg, hash_alg=cryptohash.alg_sha1, rng=None):
+        if rng is None:
+            rng = drbg.get_rng()
+        assert self.domain.pow_g(self.x) == self.y
+        assert self.domain.pow_g(self.domain.q) == 1
         h = hash_alg(msg)
         klen = self.domain.n >> 3
         if klen < hash_alg.hlen:
@@ -75,9 +166,9 @@ class DSAPrivateKey:
         r = 0
         s = 0
         while r == 0 or s == 0:
-            k = random.randint(1, self.domain.q - 1)
+            k = rng.randint(1, self.domain.q - 1)
             kinv = mod.Mod(k, self.domain.q).inv()
-            r = pow(self.domain.g, k, domain.p) % self.domain.q
+            r = self.domain.pow_g(k) % self.domain.q
             s = (kinv * (self.x * r + h)).value
         return r, s
 
@@ -85,31 +176,49 @@ class DSAPrivateKey:
         return asn1.encode_int(self.x)
 
 
-def domaingen(l, n):
+def domaingen(l, n, rng=None, seed=None, hash_alg=cryptohash.alg_sha256):
+    """Domain parameters with L-bit p and N-bit q.
+
+    seed -- firstseed in bytes: p and q are the provable primes of FIPS 186-4
+            A.1.2.1.2 and g the canonical generator of A.2.3 of index 1, all
+            hashed from seed with hash_alg, so the same seed gives the same
+            domain. Without seed, they are drawn from rng."""
+    if rng is None:
+        rng = drbg.get_rng()
     if l < 1024:
         warnings.warn("length less than 1024 insecure")
     domain = DSADomain()
     domain.l = l
     domain.n = n
-    domain.q = primes.st_random_prime(n)
+    if seed is not None:
+        domain.p, domain.q, domain.seed, _, _ = hash_math.st_domain(
+            l, n, seed, hash_alg
+        )
+        domain.g = hash_math.canonical_generator(
+            domain.p, domain.q, domain.seed, 1, hash_alg
+        )
+        return domain
+    domain.q = primes.st_random_prime(n, rng=rng)
     # p-1 has factor q
-    domain.p = primes.st_random_prime(l, domain.q)
+    domain.p = primes.st_random_prime(l, domain.q, rng)
     e = (domain.p - 1) // domain.q
-    h = random.randint(2, domain.p - 2)
+    h = rng.randint(2, domain.p - 2)
     # g^q=1 mod p
     domain.g = pow(h, e, domain.p)
     while domain.g == 1:
-        h = random.randint(2, domain.p - 2)
+        h = rng.randint(2, domain.p - 2)
         domain.g = pow(h, e, domain.p)
     return domain
 
 
-def keygen(domain):
+def keygen(domain, rng=None):
+    if rng is None:
+        rng = drbg.get_rng()
     key = DSAPrivateKey()
     key.domain = domain
-    key.x = random.randint(1, domain.q - 1)
+    key.x = rng.randint(1, domain.q - 1)
     # y=g^x mod p
-    key.y = pow(domain.g, key.x, domain.p)
+    key.y = domain.pow_g(key.x)
     return key.get_public_key(), key
 
 
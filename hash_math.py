@@ -1,3 +1,193 @@
-"""Math functions that requires hash function (mostly for pseudorandom generation)."""
-from arith import mod
+"""Math functions that requires hash function (mostly for pseudorandom generation).
+
+The constructions of FIPS 186-4 that draw numbers from a seed through a hash
+function: random integers, Shawe-Taylor provable primes (Appendix C.6), DSA
+primes p and q (A.1.2.1.2) and the canonical generator g (A.2.3). The same
+seed always gives the same numbers.
+
+Seeds are byte strings, read as seedlen-bit integers: Hash(seed + i) is the
+hash of (seed + i) mod 2^seedlen in seedlen bits. The consecutive hashes a
+candidate takes are done by one hash_many call, and those of several
+candidates at once, since the seeds of later candidates do not depend on
+whether earlier ones are prime.
+"""
+import math
+from arith import primes
 import cryptohash
+
+# candidates hashed at once by st_random_prime and st_domain
+_batch = 16
+# product of the odd primes below 2^12, for trial division by one gcd
+_small_primes = math.prod(primes.prime_sieve(1 << 12)[1:])
+
+
+class _Seed:
+    """Integer seed of fixed length, hashed as Hash(seed + i)."""
+
+    def __init__(self, seed, alg):
+        self.value = int.from_bytes(seed, "big")
+        self.nbytes = len(seed)
+        self.mask = (1 << (self.nbytes << 3)) - 1
+        self.alg = alg
+
+    def hash(self, count):
+        """Hash(seed + i) for i in range(count), joined."""
+        v, mask, n = self.value, self.mask, self.nbytes
+        out = bytearray(count * self.alg.hlen)
+        cryptohash.hash_many(
+            self.alg, [((v + i) & mask).to_bytes(n, "big") for i in range(count)], out
+        )
+        return out
+
+    def blocks(self, count, blocks):
+        """count integers of the form sum(Hash(seed + i) * 2^(i * outlen)) for
+        blocks consecutive i each, from one hash_many call."""
+        hlen = self.alg.hlen
+        out = self.hash(count * blocks)
+        step = blocks * hlen
+        rv = []
+        for j in range(count):
+            x = 0
+            for i in range(blocks - 1, -1, -1):
+                x = (x << (hlen << 3)) | int.from_bytes(
+                    out[j * step + i * hlen : j * step + (i + 1) * hlen], "big"
+                )
+            rv.append(x)
+        return rv
+
+    def bytes(self):
+        return (self.value & self.mask).to_bytes(self.nbytes, "big")
+
+
+def hash_bits(seed, nbits, alg=cryptohash.alg_sha256):
+    """nbits-bit integer from seed, as x in steps 18-21 of FIPS 186-4 C.6."""
+    s = _Seed(seed, alg)
+    return s.blocks(1, -(-nbits // (alg.hlen << 3)))[0] & ((1 << nbits) - 1)
+
+
+def hash_randint(seed, a, b, alg=cryptohash.alg_sha256):
+    """Integer in [a, b] from seed.
+
+    64 bits more than b - a needs are drawn and reduced, as with the extra
+    random bits of FIPS 186-4 B.1.1, so that the bias is below 2^-64."""
+    if a > b:
+        raise ValueError("empty range")
+    n = b - a + 1
+    return a + hash_bits(seed, n.bit_length() + 64, alg) % n
+
+
+def _st_small(length, s):
+    """Steps 3-13 of C.6, for length < 33."""
+    counter = 0
+    half = 1 << (length - 1)
+    while True:
+        # candidate j is Hash(seed + 2j) xor Hash(seed + 2j + 1)
+        out = s.hash(_batch << 1)
+        hlen = s.alg.hlen
+        for j in range(_batch):
+            c0 = int.from_bytes(out[2 * j * hlen : (2 * j + 1) * hlen], "big")
+            c1 = int.from_bytes(out[(2 * j + 1) * hlen : (2 * j + 2) * hlen], "big")
+            c = half + (c0 ^ c1) % half
+            c |= 1
+            counter += 1
+            s.value += 2
+            if primes.isprime(c):
+                # seeds of the candidates after this one are not consumed
+                return c, counter
+            if counter > length << 2:
+                raise RuntimeError("didn't get a prime")
+
+
+def _st_extend(length, c0, factor, s, counter, limit):
+    """Steps 16-34 of C.6 with c0 * factor in place of c0, the prime p of
+    A.1.2.1.2 steps 5-22 with factor q. limit is the last counter allowed."""
+    outlen = s.alg.hlen << 3
+    blocks = -(-length // outlen)
+    m = 2 * c0 * factor
+    x = s.blocks(1, blocks)[0]
+    s.value += blocks
+    x = (1 << (length - 1)) + x % (1 << (length - 1))
+    t = -(-x // m)
+    while True:
+        for a in s.blocks(_batch, blocks):
+            if m * t + 1 > 1 << length:
+                t = -(-(1 << (length - 1)) // m)
+            c = m * t + 1
+            counter += 1
+            s.value += blocks
+            # a composite c never passes, so one with a small factor is
+            # skipped without the exponentiations, leaving the result as is
+            if math.gcd(c, _small_primes) == 1:
+                a = 2 + a % (c - 3)
+                z = pow(a, 2 * t * factor, c)
+                if math.gcd(z - 1, c) == 1 and pow(z, c0, c) == 1:
+                    return c, counter
+            if counter > limit:
+                raise RuntimeError("didn't get a prime")
+            t += 1
+
+
+def st_random_prime(length, seed, alg=cryptohash.alg_sha256):
+    """Shawe-Taylor provable prime of FIPS 186-4 C.6.
+
+    Return (prime, prime_seed, prime_gen_counter), prime_seed in bytes of the
+    length of seed. Raise RuntimeError where the standard returns FAILURE."""
+    if length < 2:
+        raise ValueError("random prime must be at least 2-bit long")
+    s = _Seed(seed, alg)
+    c, counter = _st_random_prime(length, s)
+    return c, s.bytes(), counter
+
+
+def _st_random_prime(length, s):
+    if length < 33:
+        return _st_small(length, s)
+    c0, counter = _st_random_prime(-(-length // 2) + 1, s)
+    # step 32 fails at 4 * length + old_counter, like > 4 * length + old - 1
+    return _st_extend(length, c0, 1, s, counter, (length << 2) + counter - 1)
+
+
+def st_domain(l, n, seed, alg=cryptohash.alg_sha256):
+    """DSA primes p and q of FIPS 186-4 A.1.2.1.2, provable from firstseed.
+
+    seed -- firstseed, at least n bits long as an integer
+    Return (p, q, domain_parameter_seed, pgen_counter, qgen_counter), where
+    domain_parameter_seed is firstseed || pseed || qseed for
+    canonical_generator."""
+    if alg.hlen << 3 < n:
+        raise ValueError("hash output shorter than n")
+    if int.from_bytes(seed, "big") < 1 << (n - 1):
+        raise ValueError("firstseed too small")
+    s = _Seed(seed, alg)
+    q, qgen_counter = _st_random_prime(n, s)
+    qseed = s.bytes()
+    p0, counter = _st_random_prime(-(-l // 2) + 1, s)
+    p, pgen_counter = _st_extend(l, p0, q, s, counter, (l << 2) + counter)
+    return p, q, seed + s.bytes() + qseed, pgen_counter, qgen_counter
+
+
+def canonical_generator(
+    p, q, domain_parameter_seed, index, alg=cryptohash.alg_sha256
+):
+    """Verifiable canonical generator g of FIPS 186-4 A.2.3 for an 8-bit index."""
+    if not 0 <= index < 256:
+        raise ValueError("index must be 8-bit")
+    e = (p - 1) // q
+    prefix = bytes(domain_parameter_seed) + b"ggen" + bytes((index,))
+    for count in range(1, 1 << 16):
+        w = int.from_bytes(alg(prefix + count.to_bytes(2, "big")), "big")
+        g = pow(w, e, p)
+        if g >= 2:
+            return g
+    raise RuntimeError("didn't get a generator")
+
+
+if __name__ == "__main__":
+    seed = bytes(range(0x80, 0xA0))
+    print("hash_randint(seed, 1, 6):", hash_randint(seed, 1, 6))
+    c, prime_seed, counter = st_random_prime(256, seed)
+    print(f"ST random prime: {c}, counter {counter}")
+    p, q, dps, pc, qc = st_domain(2048, 256, seed)
+    g = canonical_generator(p, q, dps, 1)
+    print(f"  prime test: {primes.miller_rabin(p)}, {primes.miller_rabin(q)}")
+    print(f"  (p - 1) % q == 0: {(p - 1) % q == 0}, g^q == 1: {pow(g, q, p) == 1}")
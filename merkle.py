@@ -0,0 +1,117 @@
+"""Merkle hash tree of RFC 6962 (RFC 9162 section 2.1) over any hash algorithm.
+
+Leaves are hashed as H(0x00 || leaf), nodes as H(0x01 || left || right). The
+tree is built a level at a time: every level is one bytearray of consecutive
+node hashes, and the next level is hashed from it by one C call, with the
+prefix byte absorbed once instead of copied into every message. A node
+without a sibling moves up unchanged, which gives the same root as the split
+of RFC 6962.
+"""
+import cryptohash
+from common import *
+
+
+class MerkleTree:
+    """Merkle tree over leaves, byte strings, with alg an ASN1_HashAlg.
+
+    levels[0] holds the leaf hashes and levels[-1] the root. Changing a leaf
+    rehashes one node per level.
+    """
+
+    def __init__(self, leaves, alg=cryptohash.alg_sha256, threads=0):
+        self.alg = alg
+        self.hlen = alg.hlen
+        # threads of hash_chunks for the internal levels, 0 for one per CPU
+        self.threads = threads
+        level = bytearray(len(leaves) * self.hlen)
+        cryptohash.hash_many(alg, leaves, level, prefix=b"\x00")
+        self.levels = [level]
+        while len(level) > self.hlen:
+            level = self._next_level(level)
+            self.levels.append(level)
+
+    def _next_level(self, level):
+        h = self.hlen
+        count = len(level) // h
+        # each pair of siblings is a chunk of 2 * h bytes of the level
+        pairs = memoryview(level)[: (count & ~1) * h]
+        parent = bytearray(
+            cryptohash.hash_chunks(
+                self.alg, pairs, 2 * h, self.threads, prefix=b"\x01"
+            )
+        )
+        if count & 1:
+            parent += level[-h:]
+        return parent
+
+    def __len__(self):
+        return len(self.levels[0]) // self.hlen
+
+    def root(self):
+        if not self.levels[0]:
+            # hash of the empty string for the empty tree
+            return self.alg(b"")
+        return bytes(self.levels[-1])
+
+    def node(self, depth, index):
+        """Hash of node index at depth levels above the leaves."""
+        h = self.hlen
+        return bytes(self.levels[depth][index * h : (index + 1) * h])
+
+    def update(self, index, leaf):
+        """Replace leaf index, rehashing its path to the root."""
+        h = self.hlen
+        if not 0 <= index < len(self):
+            raise IndexError("leaf index out of range")
+        self.levels[0][index * h : (index + 1) * h] = self.alg(b"\x00" + leaf)
+        for depth in range(len(self.levels) - 1):
+            level = self.levels[depth]
+            left = index & ~1
+            if (left + 1) * h < len(level):
+                node = self.alg(b"\x01" + level[left * h : (left + 2) * h])
+            else:
+                node = level[left * h : (left + 1) * h]
+            index >>= 1
+            self.levels[depth + 1][index * h : (index + 1) * h] = node
+
+    def proof(self, index):
+        """Audit path of leaf index: sibling hashes from the leaf level up."""
+        if not 0 <= index < len(self):
+            raise IndexError("leaf index out of range")
+        path = []
+        for depth in range(len(self.levels) - 1):
+            sibling = index ^ 1
+            if sibling * self.hlen < len(self.levels[depth]):
+                path.append(self.node(depth, sibling))
+            index >>= 1
+        return path
+
+
+def verify_proof(root, index, size, leaf, path, alg=cryptohash.alg_sha256):
+    """Check the audit path of leaf index in a tree of size leaves."""
+    if not 0 <= index < size:
+        return False
+    node = alg(b"\x00" + leaf)
+    count = size
+    it = iter(path)
+    while count > 1:
+        if index ^ 1 < count:
+            sibling = next(it, None)
+            if sibling is None:
+                return False
+            if index & 1:
+                node = alg(b"\x01" + sibling + node)
+            else:
+                node = alg(b"\x01" + node + sibling)
+        index >>= 1
+        count = (count + 1) >> 1
+    return next(it, None) is None and node == root
+
+
+if __name__ == "__main__":
+    leaves = [b"", b"\x00", b"\x10", b"\x20\x21", b"\x30\x31"]
+    tree = MerkleTree(leaves)
+    print("root:", tree.root().hex())
+    path = tree.proof(3)
+    print("proof of leaf 3:", [p.hex() for p in path])
+    print("verified:", verify_proof(tree.root(), 3, len(tree), leaves[3], path))
@@ -1,52 +1,116 @@
-"""Mask generation function MGF1."""
+"""Mask generation functions: MGF1, and SHAKE128/SHAKE256 as in RFC 8702.
+
+MGF1 hashes seed || counter once per block of the mask. SHAKE absorbs the
+seed once and squeezes the whole mask from one sponge, and its
+AlgorithmIdentifier has no parameters.
+"""
 import cryptohash
 from common import *
 import asn1
 
 
 def mgf1(seed, masklen, hashalg: cryptohash.ASN1_HashAlg):
-    if masklen > hashalg.hlen << 32:
+    y = bytearray(masklen)
+    mgf1_xor(seed, y, hashalg)
+    return y
+
+
+def mgf1_xor(seed, target, hashalg: cryptohash.ASN1_HashAlg):
+    """XOR the mask of len(target) bytes into target, generated in C."""
+    if len(target) > hashalg.hlen << 32:
         raise CryptoError("mask too long")
-    t = (masklen + hashalg.hlen - 1) // hashalg.hlen
-    counter = bytearray(4)
-    y = bytearray()
-    for i in range(t):
-        for j in range(3, -1, -1):
-            if counter[j] != 255:
-                counter[j] += 1
-                break
-            else:
-                counter[j] = 0
-        y += hashalg(seed + counter)
-    return y[:masklen]
+    cryptohash.mgf1_xor(hashalg, seed, target)
+
+
+def _xor(target, mask):
+    x = int.from_bytes(target, "big") ^ int.from_bytes(mask, "big")
+    target[:] = x.to_bytes(len(target), "big")
+
+
+def shake128_mgf(seed, masklen, param=None):
+    """SHAKE128(seed, 8 * masklen), param unused."""
+    return bytearray(cryptohash.shake128l(seed, masklen << 3))
+
+
+def shake256_mgf(seed, masklen, param=None):
+    return bytearray(cryptohash.shake256l(seed, masklen << 3))
+
+
+def shake128_mgf_xor(seed, target, param=None):
+    _xor(target, cryptohash.shake128l(seed, len(target) << 3))
+
+
+def shake256_mgf_xor(seed, target, param=None):
+    _xor(target, cryptohash.shake256l(seed, len(target) << 3))
 
 
 class ASN1_MGFAlg(asn1.AlgID):
-    def __init__(self, oid, hash_alg, func):
+    __slots__ = ("xor_func",)
+
+    def __init__(self, oid, hash_alg, func=mgf1, xor_func=mgf1_xor):
         self.oid = oid
         self.param = hash_alg
         self.func = func
+        # xor_func(seed, target, hash_alg) XORs the mask into the writable target
+        # in place
+        self.xor_func = xor_func
+
+    def encode(self):
+        if self.param is None:
+            # parameters absent, RFC 8702
+            return asn1.encode_sequence([self.oid])
+        return asn1.encode_sequence([self.oid, self.param])
 
     def decode(self, octets, index=0):
-        ls = asn1.decode(octets, index)
-        if (
-            len(ls) != 2
-            or not isinstance(ls[0], asn1.OID)
-            or not isinstance(ls[1], list)
-        ):
+        ls, index = asn1.decode_sequence(octets, index)
+        if not ls or not isinstance(ls[0], asn1.OID):
             raise DecodeError
-        self.oid = ls[0]
-        self.hash_alg = cryptohash.ASN1_HashAlg.fromlist(ls[1])
+        alg = self.fromlist(ls)
+        self.oid, self.param = alg.oid, alg.param
+        self.func, self.xor_func = alg.func, alg.xor_func
+        return index
 
     @classmethod
     def fromlist(cls, ls):
+        if not isinstance(ls, list) or not ls or not isinstance(ls[0], asn1.OID):
+            raise DecodeError("mask generation function must be an AlgorithmIdentifier")
+        for alg in (alg_shake128mgf, alg_shake256mgf):
+            if ls[0].identifier == alg.oid.identifier:
+                if len(ls) != 1:
+                    raise DecodeError("SHAKE MGF parameters must be absent")
+                return cls(alg.oid, None, alg.func, alg.xor_func)
+        if ls[0].identifier != id_mgf1.identifier:
+            raise DecodeError(f"unknown mask generation function {ls[0].identifier}")
+        # the parameters of MGF1 are the AlgorithmIdentifier of its hash
+        if (
+            len(ls) != 2
+            or not isinstance(ls[1], list)
+            or not ls[1]
+            or not isinstance(ls[1][0], asn1.OID)
+        ):
+            raise DecodeError("MGF1 parameters must be a hash AlgorithmIdentifier")
         return cls(ls[0], cryptohash.ASN1_HashAlg.fromlist(ls[1]))
 
     def __call__(self, seed, masklen):
         return self.func(seed, masklen, self.param)
 
+    def xor(self, seed, target):
+        """XOR the mask of seed into bytearray target, as long as target."""
+        if self.xor_func is not None:
+            self.xor_func(seed, target, self.param)
+        else:
+            _xor(target, self.func(seed, len(target), self.param))
+
 
 id_mgf1 = asn1.OID(
     "1.2.840.113549.1.1.8", "/ISO/Member-Body/US/RSADSI/PKCS/PKCS-1/MGF1"
 )
-alg_mgf1sha1 = ASN1_MGFAlg(id_mgf1, cryptohash.alg_sha1, mgf1)
+alg_mgf1sha1 = ASN1_MGFAlg(id_mgf1, cryptohash.alg_sha1, mgf1, mgf1_xor)
+alg_mgf1sha256 = ASN1_MGFAlg(id_mgf1, cryptohash.alg_sha256, mgf1, mgf1_xor)
+# the same OIDs as the hash functions
+alg_shake128mgf = ASN1_MGFAlg(
+    cryptohash.id_shake128, None, shake128_mgf, shake128_mgf_xor
+)
+alg_shake256mgf = ASN1_MGFAlg(
+    cryptohash.id_shake256, None, shake256_mgf, shake256_mgf_xor
+)
@@ -3,7 +3,7 @@ from arith import basic, mod, primes
 import mgf
 import asn1
 import warnings
-import random
+import drbg
 import textwrap
 import cryptohash
 import base64
@@ -35,6 +35,8 @@ def secure_len(strength):
 
 
 class RSAPublicKey:
+    __slots__ = ("n", "e", "bitlen", "klen")
+
     def __init__(self, n=None, e=None):
         self.n = n
         self.e = e
@@ -103,6 +105,21 @@ class RSAPublicKey:
 
 
 class RSAPrivateKey:
+    __slots__ = (
+        "n",
+        "e",
+        "d",
+        "p",
+        "q",
+        "m",
+        "dp",
+        "dq",
+        "qinv",
+        "bitlen",
+        "klen",
+        "_crt_contexts",
+    )
+
     def get_public_key(self):
         return RSAPublicKey(self.n, self.e)
 
@@ -140,11 +157,20 @@ class RSAPrivateKey:
         """Decryption using CRT."""
         if crepr < 0 or crepr >= self.n:
             raise DecryptError("ciphertext representative out of range")
+        ring_p, ring_q = self.crt_contexts()
         # msg mod p
-        mp = mod.Mod(crepr, self.p) ** self.dp
+        mp = ring_p.pow(crepr, self.dp)
         # msg mod q
-        mq = mod.Mod(crepr, self.q) ** self.dq
-        return mod.crt(mq, mp, self.qinv).value
+        mq = ring_q.pow(crepr, self.dq)
+        return ring_q.crt(mq, ring_p, mp, self.qinv)
+
+    def crt_contexts(self):
+        """ModContext of p and of q, made once per key."""
+        rings = getattr(self, "_crt_contexts", None)
+        if rings is None or rings[0].modulus != self.p or rings[1].modulus != self.q:
+            rings = mod.ModContext(self.p), mod.ModContext(self.q)
+            self._crt_contexts = rings
+        return rings
 
     rsasp = rsadp
 
@@ -187,25 +213,29 @@ class RSAPrivateKey:
             raise ValueError(f"format {fmt} not implemented")
 
 
-def keygen(bitlen=2048):
-    """Return RSA key pair (pub_key, prv_key)"""
+def keygen(bitlen=2048, rng=None):
+    """Return RSA key pair (pub_key, prv_key)
+
+    rng -- random.Random to draw from, the drbg one of the thread if None"""
+    if rng is None:
+        rng = drbg.get_rng()
     if bitlen < 1024:
         warnings.warn("bitlen less than 1024 is insecure", SecurityWarning)
     key = RSAPrivateKey()
     key.bitlen = bitlen
     key.klen = (key.bitlen + 7) >> 3
     pbit = (bitlen + 1) >> 1
-    key.p = primes.random_prime(pbit)
-    key.q = primes.random_prime(pbit)
+    key.p = primes.random_prime(pbit, rng)
+    key.q = primes.random_prime(pbit, rng)
     key.n = key.p * key.q
     while basic.intlen(key.n) != bitlen:
-        key.p = primes.random_prime(pbit)
-        key.q = primes.random_prime(pbit)
+        key.p = primes.random_prime(pbit, rng)
+        key.q = primes.random_prime(pbit, rng)
         key.n = key.p * key.q
     key.m = basic.lcm(key.p - 1, key.q - 1)
     key.d = None
     while key.d is None:
-        key.e = random.randint(1 << 16, 1 << 256)
+        key.e = rng.randint(1 << 16, 1 << 256)
         if key.e & 1 == 0:
             key.e += 1
         try:
@@ -222,11 +252,13 @@ id_pspecified = id_pkcs1.subnode("9", "PSpecified")
 
 
 class ASN1_PSpecified(asn1.AlgID):
-    """Get constant label."""
+    """Get constant label, an OCTET STRING; a str is taken in UTF-8."""
+
+    __slots__ = ()
 
-    def __init__(self, s=""):
+    def __init__(self, s=b""):
         self.oid = id_pspecified
-        self.param = s
+        self.param = bytes(s, "utf-8") if isinstance(s, str) else bytes(s)
         self.func = None
 
     def __call__(self):
@@ -236,7 +268,9 @@ class ASN1_PSpecified(asn1.AlgID):
     def fromlist(cls, ls):
         if len(ls) != 2:
             raise ValueError(f"expect length 2, get {len(ls)}")
-        if not isinstance(ls[0], asn1.OID) or not isinstance(ls[1], str):
+        if not isinstance(ls[0], asn1.OID) or not isinstance(
+            ls[1], (bytes, bytearray)
+        ):
             raise TypeError
         return cls(ls[1])
 
@@ -247,6 +281,8 @@ id_rsassa_pss = id_pkcs1.subnode("10", "RSASSA-PSS")
 
 
 class ASN1_RSASSA_PSS(asn1.AlgID):
+    __slots__ = ()
+
     def __init__(
         self, hash_alg=cryptohash.alg_sha1, mgf_alg=mgf.alg_mgf1sha1, saltlen=20
     ):
@@ -254,21 +290,21 @@ class ASN1_RSASSA_PSS(asn1.AlgID):
         self.param = [hash_alg, mgf_alg, saltlen, 1]
         self.func = None
 
-    def sign(self, prv_key: RSAPrivateKey, msg):
+    def sign(self, prv_key: RSAPrivateKey, msg, rng=None):
         emlen = (prv_key.bitlen + 6) >> 3
         hm = self.param[0](msg)
         hlen = self.param[0].hlen
         saltlen = self.param[2]
         if emlen < hlen + saltlen + 2:
             raise EncodeError("key too short, message too long, or salt too long")
-        salt = i2osp(random.getrandbits(saltlen << 3), saltlen)
+        if rng is None:
+            rng = drbg.get_rng()
+        salt = rng.randbytes(saltlen)
         hh = self.param[0](bytearray(8) + hm + salt)
         em = bytearray(emlen - saltlen - hlen - 2)
         em.append(0x01)
         em += salt
-        mask = self.param[1](hh, emlen - hlen - 1)
-        for i in range(len(em)):
-            em[i] ^= mask[i]
+        self.param[1].xor(hh, em)
         mov = (emlen << 3) - prv_key.bitlen + 1
         em[0] &= (1 << (8 - mov)) - 1
         em += hh
@@ -297,9 +333,7 @@ class ASN1_RSASSA_PSS(asn1.AlgID):
         db = em[: emlen - hlen - 1]
         if em[0] >> (8 - mov) != 0:
             return False
-        mask = self.param[1](em[offset:-1], emlen - hlen - 1)
-        for i in range(len(db)):
-            db[i] ^= mask[i]
+        self.param[1].xor(em[offset:-1], db)
         db[0] &= (1 << (8 - mov)) - 1
         for i in range(emlen - hlen - saltlen - 2):
             if db[i] != 0:
@@ -321,6 +355,9 @@ class ASN1_RSASSA_PSS(asn1.AlgID):
 
     def decode(self, octets, index=0):
         ls, index = asn1.decode(octets, index)
+        if len(ls) == 3:
+            # trailerField DEFAULT 1
+            ls.append([1])
         if len(ls) != 4:
             raise DecodeError(f"expect length 4, get {len(ls)}")
         self.param = []
@@ -339,6 +376,8 @@ id_rsaes_oaep = id_pkcs1.subnode("7", "RSAES-OAEP")
 
 
 class ASN1_RSAES_OAEP(asn1.AlgID):
+    __slots__ = ()
+
     def __init__(
         self,
         hash_alg=cryptohash.alg_sha1,
@@ -349,7 +388,7 @@ class ASN1_RSAES_OAEP(asn1.AlgID):
         self.param = [hash_alg, mgf_alg, psource_alg]
         self.func = None
 
-    def encrypt(self, pub_key: RSAPublicKey, msg):
+    def encrypt(self, pub_key: RSAPublicKey, msg, rng=None):
         mlen = len(msg)
         hlen = self.param[0].hlen
         if mlen > pub_key.klen - 2 * hlen - 2:
@@ -360,13 +399,11 @@ class ASN1_RSAES_OAEP(asn1.AlgID):
             + bytearray([0x01])
             + msg
         )
-        seed = i2osp(random.getrandbits(hlen << 3), hlen)
-        mask = self.param[1](seed, pub_key.klen - hlen - 1)
-        for i in range(len(db)):
-            db[i] ^= mask[i]
-        mask = self.param[1](db, hlen)
-        for i in range(hlen):
-            seed[i] ^= mask[i]
+        if rng is None:
+            rng = drbg.get_rng()
+        seed = bytearray(rng.randbytes(hlen))
+        self.param[1].xor(seed, db)
+        self.param[1].xor(db, seed)
         em = bytearray(1) + seed + db
         return pub_key.encrypt_basic(em)
 
@@ -381,12 +418,8 @@ class ASN1_RSAES_OAEP(asn1.AlgID):
             raise DecryptError
         seed = em[1 : hlen + 1]
         db = em[hlen + 1 :]
-        mask = self.param[1](db, hlen)
-        for i in range(hlen):
-            seed[i] ^= mask[i]
-        mask = self.param[1](seed, prv_key.klen - hlen - 1)
-        for i in range(len(db)):
-            db[i] ^= mask[i]
+        self.param[1].xor(db, seed)
+        self.param[1].xor(seed, db)
         lhash = self.param[0](self.param[2]())
         for i in range(hlen):
             if lhash[i] != db[i]:
@@ -421,6 +454,23 @@ class ASN1_RSAES_OAEP(asn1.AlgID):
 if __name__ == "__main__":
     wrapper = textwrap.TextWrapper()
 
+    print("Test AlgorithmIdentifier round trip...")
+    for hash_alg, mgf_alg in (
+        (cryptohash.alg_sha256, mgf.alg_mgf1sha256),
+        (cryptohash.alg_sha256, mgf.alg_shake128mgf),
+        (cryptohash.alg_sha512, mgf.alg_shake256mgf),
+    ):
+        for alg in (
+            ASN1_RSAES_OAEP(hash_alg, mgf_alg, ASN1_PSpecified(b"label")),
+            ASN1_RSASSA_PSS(hash_alg, mgf_alg, hash_alg.hlen),
+        ):
+            octets = alg.encode()
+            decoded = type(alg)()
+            decoded.decode(octets)
+            assert decoded.encode() == octets, type(alg).__name__
+            assert decoded.param[1].func is mgf_alg.func
+    assert ASN1_RSAES_OAEP().param[2]() == b""
+
     #  print("\nTest 2048...")
     #  pub, prv = keygen(2048)
     #  pub.print(wrapper)
@@ -0,0 +1,186 @@
+"""SHA-3 derived functions (NIST SP 800-185) and KangarooTwelve (RFC 9861).
+
+cSHAKE, KMAC and TupleHash absorb their encoded prefix and message into one
+keccak_diy sponge, without joining them into a copy of the message.
+ParallelHash and KangarooTwelve hash their leaf chunks with
+cryptohash.hash_chunks, in C on several threads without the GIL, then the
+chaining values in one more sponge.
+
+Output lengths l are in bit, like shake128l.
+"""
+import cryptohash
+from common import *
+
+# rate in byte of the sponge of each security level
+_rate = {128: 168, 256: 136}
+_kt_chunk = 8192
+
+
+def _octets(s):
+    if isinstance(s, str):
+        return bytes(s, "utf-8")
+    return s
+
+
+def left_encode(x):
+    n = max(1, (x.bit_length() + 7) >> 3)
+    return bytes((n,)) + x.to_bytes(n, "big")
+
+
+def right_encode(x):
+    n = max(1, (x.bit_length() + 7) >> 3)
+    return x.to_bytes(n, "big") + bytes((n,))
+
+
+def encode_string(s):
+    s = _octets(s)
+    return left_encode(len(s) << 3) + s
+
+
+def bytepad(x, w):
+    z = left_encode(w) + x
+    return z + bytes(-len(z) % w)
+
+
+def _cshake_new(level, l, n, s):
+    """Hash object of cSHAKE with the prefix of n and s absorbed."""
+    if not n and not s:
+        return cryptohash.new("keccak_diy", None, l, level, 0x1F)
+    prefix = bytepad(encode_string(n) + encode_string(s), _rate[level])
+    return cryptohash.new("keccak_diy", prefix, l, level, 0x04)
+
+
+def cshake128(message, l, n=b"", s=b""):
+    """cSHAKE128 with function name n and customization string s."""
+    h = _cshake_new(128, l, n, s)
+    h.update(_octets(message))
+    return h.digest()
+
+
+def cshake256(message, l, n=b"", s=b""):
+    h = _cshake_new(256, l, n, s)
+    h.update(_octets(message))
+    return h.digest()
+
+
+def _kmac(level, key, message, l, s, xof):
+    h = _cshake_new(level, l, b"KMAC", s)
+    h.update(bytepad(encode_string(key), _rate[level]))
+    h.update(_octets(message))
+    h.update(right_encode(0 if xof else l))
+    return h.digest()
+
+
+def kmac128(key, message, l, s=b"", xof=False):
+    """KMAC128, or KMACXOF128 if xof."""
+    return _kmac(128, key, message, l, s, xof)
+
+
+def kmac256(key, message, l, s=b"", xof=False):
+    return _kmac(256, key, message, l, s, xof)
+
+
+def _tuplehash(level, messages, l, s, xof):
+    h = _cshake_new(level, l, b"TupleHash", s)
+    for x in messages:
+        x = _octets(x)
+        h.update(left_encode(len(x) << 3))
+        h.update(x)
+    h.update(right_encode(0 if xof else l))
+    return h.digest()
+
+
+def tuplehash128(messages, l, s=b"", xof=False):
+    """TupleHash128 of a sequence of strings, or TupleHashXOF128 if xof."""
+    return _tuplehash(128, messages, l, s, xof)
+
+
+def tuplehash256(messages, l, s=b"", xof=False):
+    return _tuplehash(256, messages, l, s, xof)
+
+
+def _parallelhash(level, message, b, l, s, xof, threads):
+    if b <= 0:
+        raise ValueError("block size must be positive")
+    # leaf i is cSHAKE(X_i, 2 * level, "", ""), that is SHAKE
+    leaves = cryptohash.hash_chunks(
+        "shake%dl" % level, message, b, threads, level << 1
+    )
+    h = _cshake_new(level, l, b"ParallelHash", s)
+    h.update(left_encode(b))
+    h.update(leaves)
+    h.update(right_encode(len(leaves) // (level >> 2)))
+    h.update(right_encode(0 if xof else l))
+    return h.digest()
+
+
+def parallelhash128(message, b, l, s=b"", xof=False, threads=0):
+    """ParallelHash128 with blocks of b bytes, or ParallelHashXOF128 if xof.
+
+    threads -- most threads hashing the blocks, 0 for one per CPU
+    """
+    return _parallelhash(128, message, b, l, s, xof, threads)
+
+
+def parallelhash256(message, b, l, s=b"", xof=False, threads=0):
+    return _parallelhash(256, message, b, l, s, xof, threads)
+
+
+def turboshake128(message, d, l):
+    """TurboSHAKE128 with domain separation byte d in [0x01, 0x7f]."""
+    return cryptohash.keccak12_diy(message, l, 128, d)
+
+
+def turboshake256(message, d, l):
+    return cryptohash.keccak12_diy(message, l, 256, d)
+
+
+def _length_encode(x):
+    n = (x.bit_length() + 7) >> 3
+    return x.to_bytes(n, "big") + bytes((n,))
+
+
+def _kt(level, message, l, custom, threads):
+    custom = _octets(custom)
+    suffix = custom + _length_encode(len(custom))
+    m = memoryview(_octets(message)).cast("B")
+    if len(m) < _kt_chunk:
+        s = bytes(m) + suffix
+        if len(s) <= _kt_chunk:
+            return cryptohash.keccak12_diy(s, l, level, 0x07)
+        first, body, tail = s[:_kt_chunk], b"", s[_kt_chunk:]
+    else:
+        # S = M || suffix, only the last partial chunk of M is copied
+        end = len(m) - (len(m) - _kt_chunk) % _kt_chunk
+        first, body = m[:_kt_chunk], m[_kt_chunk:end]
+        tail = bytes(m[end:]) + suffix
+    cvbit = level << 1
+    cvs = cryptohash.hash_chunks(
+        "keccak12_diy", body, _kt_chunk, threads, cvbit, level, 0x0B
+    ) + cryptohash.hash_chunks(
+        "keccak12_diy", tail, _kt_chunk, 1, cvbit, level, 0x0B
+    )
+    h = cryptohash.new("keccak12_diy", first, l, level, 0x06)
+    h.update(b"\x03" + bytes(7))
+    h.update(cvs)
+    h.update(_length_encode(len(cvs) // (cvbit >> 3)) + b"\xff\xff")
+    return h.digest()
+
+
+def kt128(message, l, custom=b"", threads=0):
+    """KangarooTwelve KT128 with customization string custom.
+
+    threads -- most threads hashing the 8 KiB chunks, 0 for one per CPU
+    """
+    return _kt(128, message, l, custom, threads)
+
+
+def kt256(message, l, custom=b"", threads=0):
+    return _kt(256, message, l, custom, threads)
+
+
+if __name__ == "__main__":
+    print(cshake128(bytes(range(4)), 256, b"", b"Email Signature").hex())
+    print(kmac128(bytes(range(0x40, 0x60)), bytes(range(4)), 256).hex())
+    print(parallelhash128(bytes(range(8)) * 3, 8, 256).hex())
+    print(kt128(b"", 256).hex())